@@ -163,8 +163,8 @@ const AdminFAQ = () => {
         
         // Since we don't have a specific FAQ API endpoint yet, 
         // we'll use existing API endpoints to populate our data
-        const [usersResponse, trendsResponse, symbolsResponse] = await Promise.all([
-          API.admin.getUsers(),
+        const [summaryResponse, trendsResponse, symbolsResponse] = await Promise.all([
+          API.admin.getSummary(),
           API.admin.getMarketTrends(),
           API.admin.getFavoriteSymbols()
         ]);
@@ -180,7 +180,7 @@ const AdminFAQ = () => {
             { 
               id: 'user-2', 
               question: 'How many users are currently registered?', 
-              answer: `There are currently ${usersResponse.data.users ? usersResponse.data.users.length : 'N/A'} users registered in the system.`
+              answer: `There are currently ${summaryResponse.data?.data?.users ? summaryResponse.data.data.users.total : 'N/A'} users registered in the system.`
             },
             { 
               id: 'user-3', 
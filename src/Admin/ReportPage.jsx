@@ -167,8 +167,8 @@ const ReportPage = () => {
     
     try {
       // Use real API endpoints instead of mock data
-      const [usersResponse, growthResponse, symbolsResponse, trendsResponse] = await Promise.all([
-        API.admin.getUsers(),
+      const [summaryResponse, growthResponse, symbolsResponse, trendsResponse] = await Promise.all([
+        API.admin.getSummary(),
         API.admin.getUserGrowth(),
         API.admin.getFavoriteSymbols(),
         API.admin.getMarketTrends()
@@ -233,9 +233,9 @@ const ReportPage = () => {
         }
       ];
       
-      // Calculate summary stats from the real data
-      const users = usersResponse.data?.users || [];
-      const currentUserCount = users.length;
+      // User totals come from the summary, which counts every account
+      const summaryUsers = summaryResponse.data?.data?.users || {};
+      const currentUserCount = summaryUsers.total || 0;
       
       // Try to calculate growth rate from the growth data if available
       let growthRate = 0;
@@ -249,19 +249,8 @@ const ReportPage = () => {
         }
       }
       
-      // Calculate active users (this might come from a different endpoint in a real app)
-      // For now, we're estimating based on user data
-      const activeUserCount = users.filter(user => {
-        // Consider a user active if they have logged in within the last month
-        // This is a placeholder logic - in a real app, you'd use actual login data
-        if (user.last_login) {
-          const lastLoginDate = new Date(user.last_login);
-          const oneMonthAgo = new Date();
-          oneMonthAgo.setMonth(oneMonthAgo.getMonth() - 1);
-          return lastLoginDate > oneMonthAgo;
-        }
-        return false;
-      }).length;
+      // A user is active if they have logged in within the last 30 days
+      const activeUserCount = summaryUsers.logged_in_last_30_days || 0;
       
       setStats({
         totalUsers: currentUserCount,
@@ -72,8 +72,13 @@ const MainContent = styled('div')({
   marginLeft: '250px' // Match sidebar width
 });
 
+// Rows requested per page from /api/admin/users
+const USER_PAGE_SIZE = 100;
+
 const UserManagement = () => {
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
@@ -104,37 +109,49 @@ const UserManagement = () => {
     }
   };
 
+  // Search and filters are applied by the server so every matching user is reachable
+  const buildUserParams = (cursor) => ({
+    limit: USER_PAGE_SIZE,
+    cursor: cursor || undefined,
+    search: searchTerm.trim() || undefined,
+    role: filterRole !== 'all' ? filterRole : undefined,
+    status: filterStatus !== 'all' ? filterStatus : undefined
+  });
+
+  // If this is the current admin user, update the last_login to now
+  const withCurrentAdminLogin = (pageUsers) => pageUsers.map(user => (
+    user.user_id === currentAdminId
+      ? { ...user, last_login: new Date().toISOString() }
+      : user
+  ));
+
+  // Totals cover every user, not just the loaded pages
+  const fetchStats = async () => {
+    try {
+      const response = await API.admin.getSummary();
+      const summaryUsers = response.data?.data?.users || {};
+      setStats({
+        totalUsers: summaryUsers.total || 0,
+        activeUsers: summaryUsers.by_status?.active || 0,
+        admins: summaryUsers.by_role?.admin || 0,
+        recentLogins: summaryUsers.logged_in_last_day || 0,
+        newUsers: summaryUsers.new_last_7_days || 0
+      });
+    } catch (error) {
+      console.error('Error fetching user stats:', error);
+    }
+  };
+
   const fetchUsers = async () => {
     try {
       setLoading(true);
-      const response = await API.admin.getUsers();
-      
-      // Update users with current login time for the admin user
-      const usersData = response.data.users.map(user => {
-        // If this is the current admin user, update the last_login to now
-        if (user.user_id === currentAdminId) {
-          return {
-            ...user,
-            last_login: new Date().toISOString() // Set to current time
-          };
-        }
-        return user;
-      });
-      
-      setUsers(usersData);
+      const [response] = await Promise.all([
+        API.admin.getUsers(buildUserParams()),
+        fetchStats()
+      ]);
       
-      // Calculate stats
-      const now = new Date();
-      const dayAgo = new Date(now.getTime() - 24 * 60 * 60 * 1000);
-      const weekAgo = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000);
-      
-      setStats({
-        totalUsers: usersData.length,
-        activeUsers: usersData.filter(user => user.account_status === 'active').length,
-        admins: usersData.filter(user => user.role === 'admin').length,
-        recentLogins: usersData.filter(user => new Date(user.last_login) > dayAgo).length,
-        newUsers: usersData.filter(user => new Date(user.created_at) > weekAgo).length
-      });
+      setUsers(withCurrentAdminLogin(response.data.users || []));
+      setNextCursor(response.data.has_more ? response.data.next_cursor : null);
       
       setLastRefresh(Date.now());
       setLoading(false);
@@ -145,6 +162,21 @@ const UserManagement = () => {
     }
   };
 
+  const loadMoreUsers = async () => {
+    if (!nextCursor || loadingMore) return;
+    try {
+      setLoadingMore(true);
+      const response = await API.admin.getUsers(buildUserParams(nextCursor));
+      setUsers(prevUsers => [...prevUsers, ...withCurrentAdminLogin(response.data.users || [])]);
+      setNextCursor(response.data.has_more ? response.data.next_cursor : null);
+    } catch (error) {
+      console.error('Error loading more users:', error);
+      setError('Failed to load more users');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Initialize component and fetch current admin
   useEffect(() => {
     fetchCurrentAdmin();
@@ -157,17 +189,29 @@ const UserManagement = () => {
     }
   }, [currentAdminId, navigate]);
 
+  // Reload from the first page when the search or filters change
+  useEffect(() => {
+    if (!currentAdminId) return;
+    const searchTimer = setTimeout(fetchUsers, 300);
+    return () => clearTimeout(searchTimer);
+  }, [searchTerm, filterRole, filterStatus]);
+
   // Set up periodic refresh
   useEffect(() => {
     const refreshInterval = setInterval(() => {
       // Only refresh if not already refreshing and not loading
       if (!refreshing && !loading) {
-        fetchUsers();
+        // Keep extra loaded pages in place; only the stats are refreshed then
+        if (users.length > USER_PAGE_SIZE) {
+          fetchStats();
+        } else {
+          fetchUsers();
+        }
       }
     }, 60000); // Refresh every 60 seconds
     
     return () => clearInterval(refreshInterval);
-  }, [refreshing, loading]);
+  }, [refreshing, loading, users.length, searchTerm, filterRole, filterStatus]);
 
   useEffect(() => {
     fetchUsers();
@@ -275,7 +319,7 @@ const UserManagement = () => {
     return { color: colors.buyGreen, text: 'Active' };
   };
 
-  // Filter users based on search, role and status
+  // The server already filtered; this keeps rows consistent after a local status change
   const filteredUsers = users.filter(user => {
     const matchesSearch = 
       user.username?.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -693,6 +737,18 @@ const UserManagement = () => {
               </TableBody>
             </Table>
           </TableContainer>
+          {nextCursor && (
+            <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+              <Button
+                variant="outlined"
+                onClick={loadMoreUsers}
+                disabled={loadingMore}
+                sx={{ color: colors.primary, borderColor: colors.primary }}
+              >
+                {loadingMore ? <CircularProgress size={20} sx={{ color: colors.primary }} /> : 'Load more users'}
+              </Button>
+            </Box>
+          )}
         </Paper>
       </MainContent>
     </DashboardContainer>
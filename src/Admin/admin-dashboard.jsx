@@ -334,24 +334,15 @@ const AdminDashboard = () => {
         const userResponse = await API.auth.me();
         setUser(userResponse.data.user);
         
-        // Get all users
-        const usersResponse = await API.admin.getUsers();
-        const userData = usersResponse.data.users || [];
-        setUsers(userData);
-        setUserCount(userData.length);
+        // User counts, growth, popular symbols and market trends in one request
+        const summaryResponse = await API.admin.getSummary();
+        const summary = summaryResponse.data?.data || {};
+        setUserCount(summary.users?.total || 0);
+        setUsers(summary.recent_users || []);
+        setUserGrowthData(summary.user_growth || []);
+        setFavoriteSymbolsData(summary.favorite_symbols || []);
         
-        // Get user growth stats
-        const growthResponse = await API.admin.getUserGrowth();
-        setUserGrowthData(growthResponse.data?.data || []);
-        
-        // Get popular symbols/pairs
-        const symbolsResponse = await API.admin.getFavoriteSymbols();
-        const symbolsData = symbolsResponse.data?.data || [];
-        setFavoriteSymbolsData(symbolsData);
-        
-        // Get current market trends
-        const trendsResponse = await API.admin.getMarketTrends();
-        const trendsData = trendsResponse.data?.data || {
+        const trendsData = summary.market_trends || {
           overall_trend: 'neutral',
           bullish_percentage: 33,
           bearish_percentage: 33,
@@ -211,8 +211,9 @@ const AdminSettings = () => {
         return;
       }
 
-      // Use a general users endpoint instead of admin-specific endpoint
-      const response = await API.admin.getUsers();
+      // Use a general users endpoint instead of admin-specific endpoint;
+      // the role filter runs on the server so admins past the first page are included
+      const response = await API.admin.getUsers({ role: 'admin', limit: 500 });
       
       // Filter only admin users if the response includes a role or is_admin field
       let adminUsers = response.data.users || [];
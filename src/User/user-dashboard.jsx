@@ -193,7 +193,7 @@ const UserDashboard = () => {
       }
       
       try {
-        // Fetch favorite markets
+        // Fetch favorite markets with their latest price, trend and indicators
         const favoritesResponse = await API.favorites.getAll();
         console.log('UserDashboard - Got favorites:', favoritesResponse.data);
         setFavoriteMarkets(favoritesResponse.data.favorites || []);
@@ -592,7 +592,9 @@ const UserDashboard = () => {
                 favoriteMarkets.map((market) => (
                   <Chip
                     key={market.symbol}
-                    label={market.symbol}
+                    label={market.market
+                      ? `${market.symbol} ${Number(market.market.current_price).toFixed(4)} (${market.market.trend})`
+                      : market.symbol}
                     icon={
                       <StarIcon 
                         sx={{ 
@@ -745,7 +745,7 @@ export const API = {
   
   // Favorites endpoints
   favorites: {
-    getAll: () => axiosInstance.get('/api/favorites'),
+    getAll: (params) => axiosInstance.get('/api/favorites', { params }),
     toggle: (data) => {
       try {
         // Clean the symbol as a precaution
@@ -782,10 +782,11 @@ export const API = {
   
   // Admin endpoints
   admin: {
-    getUsers: () => axiosInstance.get('/api/admin/users'),
+    getUsers: (params) => axiosInstance.get('/api/admin/users', { params }),
     getUserGrowth: () => axiosInstance.get('/api/admin/user-growth'),
     getFavoriteSymbols: () => axiosInstance.get('/api/admin/favorite-symbols'),
     getMarketTrends: () => axiosInstance.get('/api/market-trends'),
+    getSummary: (params) => axiosInstance.get('/api/admin/summary', { params }),
     updateUserStatus: (userId, status) => 
       axiosInstance.put(`/api/admin/users/${userId}/status`, { status }),
     getProfile: () => axiosInstance.get('/api/admin/profile'),
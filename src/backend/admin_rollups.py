@@ -0,0 +1,196 @@
+"""
+Precomputed admin dashboard statistics.
+
+A background thread in each gunicorn worker calls refresh_rollups() every
+ADMIN_ROLLUP_INTERVAL seconds. The refresh runs in one transaction under a
+Postgres advisory lock, so only one process rebuilds at a time, and it is
+skipped when another process refreshed within the interval. Readers
+(GET /api/admin/summary) therefore only touch a few small tables
+(src/sql/admin_rollups.sql) and market_trend_breadth.
+
+Signups per day are recomputed for the last ADMIN_ROLLUP_SIGNUP_DAYS days on
+every refresh and in full once per day; user and favorite counts are rebuilt
+on every refresh.
+
+Environment:
+    ADMIN_ROLLUPS_REFRESHER     Run the refresh thread in this process (default true)
+    ADMIN_ROLLUP_INTERVAL       Seconds between refreshes (default 60)
+    ADMIN_ROLLUP_SIGNUP_DAYS    Trailing days of signups recomputed each refresh (default 2)
+"""
+from db_connection import db_manager
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ROLLUP_INTERVAL = float(os.environ.get('ADMIN_ROLLUP_INTERVAL', 60))
+ADMIN_ROLLUP_SIGNUP_DAYS = int(os.environ.get('ADMIN_ROLLUP_SIGNUP_DAYS', 2))
+
+# Arbitrary application-wide key for pg_try_advisory_xact_lock
+ROLLUP_LOCK_KEY = 740049
+
+def refresh_rollups(force=False):
+    """
+    Rebuild the admin rollup tables
+
+    Args:
+        force (bool): Refresh even if another process did so within the interval
+
+    Returns:
+        bool: True if this call refreshed, False if skipped
+    """
+    conn = db_manager.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (ROLLUP_LOCK_KEY,))
+            if not cursor.fetchone()[0]:
+                conn.rollback()
+                return False
+
+            cursor.execute("SELECT name, refreshed_at, LOCALTIMESTAMP FROM admin_rollup_state")
+            state = {name: (refreshed_at, now) for name, refreshed_at, now in cursor.fetchall()}
+            summary = state.get('summary')
+            if not force and summary and (summary[1] - summary[0]).total_seconds() < ADMIN_ROLLUP_INTERVAL:
+                conn.rollback()
+                return False
+            full_signups = 'signups_full' not in state or (state['signups_full'][1] - state['signups_full'][0]).days >= 1
+
+            cursor.execute("DELETE FROM admin_user_counts")
+            cursor.execute("""
+                INSERT INTO admin_user_counts (account_status, role, users)
+                SELECT COALESCE(account_status, 'unknown'), role, COUNT(*)
+                FROM login
+                GROUP BY 1, 2
+            """)
+
+            if full_signups:
+                cursor.execute("DELETE FROM admin_signups_daily")
+                cursor.execute("""
+                    INSERT INTO admin_signups_daily (day, signups)
+                    SELECT created_at::date, COUNT(*)
+                    FROM login
+                    GROUP BY 1
+                """)
+            else:
+                # Uses idx_login_created_at_user_id; older days only change through deletions
+                cursor.execute("""
+                    WITH recent AS (
+                        SELECT created_at::date AS day, COUNT(*) AS signups
+                        FROM login
+                        WHERE created_at >= CURRENT_DATE - %s
+                        GROUP BY 1
+                    ),
+                    cleared AS (
+                        DELETE FROM admin_signups_daily
+                        WHERE day >= CURRENT_DATE - %s AND day NOT IN (SELECT day FROM recent)
+                    )
+                    INSERT INTO admin_signups_daily (day, signups)
+                    SELECT day, signups FROM recent
+                    ON CONFLICT (day) DO UPDATE SET signups = EXCLUDED.signups
+                """, (ADMIN_ROLLUP_SIGNUP_DAYS, ADMIN_ROLLUP_SIGNUP_DAYS))
+
+            cursor.execute("DELETE FROM admin_favorite_counts")
+            cursor.execute("""
+                INSERT INTO admin_favorite_counts (symbol, pair_name, favorites)
+                SELECT symbol, pair_name, COUNT(*)
+                FROM favorites
+                GROUP BY symbol, pair_name
+            """)
+
+            names = ['summary', 'signups_full'] if full_signups else ['summary']
+            for name in names:
+                cursor.execute("""
+                    INSERT INTO admin_rollup_state (name, refreshed_at) VALUES (%s, LOCALTIMESTAMP)
+                    ON CONFLICT (name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+                """, (name,))
+        conn.commit()
+        logger.debug("Refreshed admin rollups (full signups: %s)", full_signups)
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_manager.release_connection(conn)
+
+class RollupRefresher:
+    """Background thread calling refresh_rollups() on an interval"""
+    def __init__(self, interval=ADMIN_ROLLUP_INTERVAL):
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='admin-rollups', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                refresh_rollups()
+            except Exception as e:
+                logger.error(f"Admin rollup refresh failed: {e}")
+            self.stop_event.wait(self.interval)
+
+refresher = None
+
+def start_rollup_refresher():
+    """Start this process's refresh thread unless ADMIN_ROLLUPS_REFRESHER=false"""
+    global refresher
+    if os.environ.get('ADMIN_ROLLUPS_REFRESHER', 'true').lower() == 'false' or refresher is not None:
+        return refresher
+    refresher = RollupRefresher()
+    refresher.start()
+    return refresher
+
+def read_summary(cursor, growth_months=6, top_symbols=10, recent_users=5):
+    """
+    Everything the admin landing page shows, in one query
+
+    Returns:
+        tuple: (user counts, monthly signups, top favorites, trend breadth, refreshed_at,
+        newest users, signups in the last 7 days, logins in the last day and
+        in the last 30 days); lists
+        come from json_agg and are None when empty. The newest users and recent
+        logins are read live from login via idx_login_created_at_user_id and
+        idx_login_last_login_user_id.
+    """
+    cursor.execute("""
+        SELECT
+            (SELECT json_agg(json_build_object('status', account_status, 'role', role, 'users', users))
+             FROM admin_user_counts),
+            (SELECT json_agg(json_build_object('period', m.month, 'users', COALESCE(s.signups, 0)) ORDER BY m.month)
+             FROM generate_series(date_trunc('month', CURRENT_DATE::timestamp) - (%(months)s - 1) * INTERVAL '1 month',
+                                  date_trunc('month', CURRENT_DATE::timestamp), INTERVAL '1 month') AS m(month)
+             LEFT JOIN (
+                 SELECT date_trunc('month', day::timestamp) AS month, SUM(signups) AS signups
+                 FROM admin_signups_daily
+                 WHERE day >= date_trunc('month', CURRENT_DATE::timestamp) - (%(months)s - 1) * INTERVAL '1 month'
+                 GROUP BY 1
+             ) s ON s.month = m.month),
+            (SELECT json_agg(json_build_object('symbol', symbol, 'pair_name', pair_name, 'count', favorites)
+                             ORDER BY favorites DESC, symbol)
+             FROM (SELECT symbol, pair_name, favorites FROM admin_favorite_counts
+                   ORDER BY favorites DESC, symbol LIMIT %(top)s) f),
+            (SELECT json_agg(json_build_object('asset_class', asset_class, 'bullish', bullish_count,
+                                               'bearish', bearish_count, 'neutral', neutral_count))
+             FROM market_trend_breadth),
+            (SELECT refreshed_at FROM admin_rollup_state WHERE name = 'summary'),
+            (SELECT json_agg(json_build_object('user_id', user_id, 'username', username, 'email', email, 'role', role,
+                                               'account_status', account_status, 'created_at', created_at)
+                             ORDER BY created_at DESC, user_id DESC)
+             FROM (SELECT user_id, username, email, role, account_status, created_at FROM login
+                   ORDER BY created_at DESC, user_id DESC LIMIT %(recent)s) r),
+            (SELECT COALESCE(SUM(signups), 0) FROM admin_signups_daily WHERE day > CURRENT_DATE - 7),
+            (SELECT COUNT(*) FROM login
+             WHERE COALESCE(last_login, TIMESTAMP '1970-01-01') > LOCALTIMESTAMP - INTERVAL '1 day'),
+            (SELECT COUNT(*) FROM login
+             WHERE COALESCE(last_login, TIMESTAMP '1970-01-01') > LOCALTIMESTAMP - INTERVAL '30 days')
+    """, {'months': growth_months, 'top': top_symbols, 'recent': recent_users})
+    return cursor.fetchone()
@@ -1,22 +1,143 @@
 # admin_routes.py
 from flask import Blueprint, request, jsonify
 from db_connection import db_manager
-from auth import token_required
-from datetime import datetime, timedelta
+from auth import token_required, invalidate_principal
+from admin_analytics import user_growth_series, format_period_label
+from admin_rollups import read_summary, refresh_rollups
+from market_analysis_routes import summarize_trend_counts
+from datetime import datetime
+import base64
+import json
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+USER_LIST_DEFAULT_LIMIT = 100
+USER_LIST_MAX_LIMIT = 500
+
+# sort key -> SQL expression; keyset pagination orders by (expression, user_id).
+# last_login is coalesced so users who never logged in still have a position.
+USER_SORTS = {
+    'user_id': 'user_id',
+    'created_at': 'created_at',
+    'username': 'username',
+    'email': 'email',
+    'last_login': "COALESCE(last_login, TIMESTAMP '1970-01-01')",
+}
+TIMESTAMP_SORTS = {'created_at', 'last_login'}
+
+def encode_cursor(sort_value, user_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, user_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor_value, sort):
+    """Return (sort value, user_id) from an opaque cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if sort in TIMESTAMP_SORTS:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(user_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def estimate_total(cursor, where_sql, params):
+    """
+    Row estimate from planner statistics instead of COUNT(*)
+
+    Unfiltered listings read pg_class.reltuples; filtered ones use the row
+    estimate of the EXPLAINed query.
+    """
+    if not where_sql:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'login'::regclass")
+        row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM login {where_sql}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
 @admin_bp.route('/users', methods=['GET'])
 @token_required
 def get_all_users(current_user):
-    if current_user[4] != 'admin':
+    """
+    List users a page at a time
+    
+    Query parameters:
+        limit: Page size (default 100, max 500)
+        cursor: next_cursor from the previous page
+        search: Substring of username or email, or an exact user_id when numeric
+        status, role: Exact filters
+        sort: user_id, created_at, username, email or last_login; prefix with '-' for descending
+    """
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
+    limit = max(1, min(request.args.get('limit', default=USER_LIST_DEFAULT_LIMIT, type=int), USER_LIST_MAX_LIMIT))
+    sort_param = request.args.get('sort', default='user_id')
+    descending = sort_param.startswith('-')
+    sort = sort_param.lstrip('-')
+    if sort not in USER_SORTS:
+        return jsonify({'message': f"sort must be one of: {', '.join(USER_SORTS)}"}), 400
+    sort_expr = USER_SORTS[sort]
+    
+    conditions = []
+    params = []
+    search = request.args.get('search', '').strip()
+    if search:
+        # Served by the pg_trgm indexes in src/sql/login_listing_indexes.sql
+        pattern = f"%{escape_like(search)}%"
+        if search.isdigit() and len(search) <= 9:
+            conditions.append("(username ILIKE %s OR email ILIKE %s OR user_id = %s)")
+            params.extend([pattern, pattern, int(search)])
+        else:
+            conditions.append("(username ILIKE %s OR email ILIKE %s)")
+            params.extend([pattern, pattern])
+    if request.args.get('status'):
+        conditions.append("account_status = %s")
+        params.append(request.args['status'])
+    if request.args.get('role'):
+        conditions.append("role = %s")
+        params.append(request.args['role'])
+    filter_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    filter_params = list(params)
+    
+    if request.args.get('cursor'):
+        try:
+            after_value, after_id = decode_cursor(request.args['cursor'], sort)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        conditions.append(f"({sort_expr}, user_id) {'<' if descending else '>'} (%s, %s)")
+        params.extend([after_value, after_id])
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = 'DESC' if descending else 'ASC'
+    
+    conn = None
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT user_id, username, email, role, last_login, account_status, created_at FROM login")
+        # One extra row tells us whether there is another page
+        cursor.execute(
+            f"""
+            SELECT user_id, username, email, role, last_login, account_status, created_at, {sort_expr}
+            FROM login
+            {where_sql}
+            ORDER BY {sort_expr} {direction}, user_id {direction}
+            LIMIT %s
+            """,
+            params + [limit + 1]
+        )
         users = cursor.fetchall()
+        has_more = len(users) > limit
+        users = users[:limit]
+        estimated_total = estimate_total(cursor, filter_sql, filter_params)
+        cursor.close()
         
         # Convert tuple results to dictionaries for JSON response
         formatted_users = []
@@ -30,17 +151,26 @@ def get_all_users(current_user):
                 'account_status': user[5],
                 'created_at': user[6].isoformat() if user[6] else None
             })
-            
-        cursor.close()
-        return jsonify({'users': formatted_users})
+        
+        next_cursor = encode_cursor(users[-1][7], users[-1][0]) if has_more else None
+        return jsonify({
+            'users': formatted_users,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': limit,
+            'estimated_total': estimated_total
+        })
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({'message': 'Database error occurred'}), 500
+    finally:
+        if conn:
+            db_manager.release_connection(conn)
 
 @admin_bp.route('/users/<int:user_id>/status', methods=['PUT'])
 @token_required
 def update_user_status(current_user, user_id):
-    if current_user[4] != 'admin':
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
     data = request.get_json()
@@ -49,6 +179,7 @@ def update_user_status(current_user, user_id):
     if new_status not in ['active', 'suspended']:
         return jsonify({'message': 'Invalid status'}), 400
     
+    conn = None
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
@@ -58,90 +189,108 @@ def update_user_status(current_user, user_id):
         )
         conn.commit()
         cursor.close()
+        invalidate_principal(user_id)
         return jsonify({'message': 'User status updated successfully'})
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({'message': 'Database error occurred'}), 500
+    finally:
+        if conn:
+            db_manager.release_connection(conn)
 
 @admin_bp.route('/user-growth', methods=['GET'])
 @token_required
 def get_user_growth(current_user):
-    if current_user[4] != 'admin':
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
+    granularity = request.args.get('granularity', default='month')
+    # 'months' is the original parameter name and still accepted for monthly series
+    periods = request.args.get('periods', type=int) or request.args.get('months', type=int)
+    
+    try:
+        result = user_growth_series(granularity, periods)
+        return jsonify({
+            'success': True,
+            'data': result['data'],
+            'meta': result['meta']
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'data': []}), 400
+    except Exception as e:
+        print(f"Error in user growth endpoint: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'data': []  # Return empty data to prevent frontend errors
+        }), 500
+
+@admin_bp.route('/summary', methods=['GET'])
+@token_required
+def get_admin_summary(current_user):
+    """
+    Admin landing page statistics from the rollup tables in one query
+    
+    Replaces separate calls to /users, /user-growth, /favorite-symbols and
+    /api/market-trends. Figures are at most ADMIN_ROLLUP_INTERVAL seconds old.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Admin access required'}), 403
+    
+    months = max(1, min(request.args.get('months', default=6, type=int), 120))
+    conn = None
     try:
-        # Get optional query parameters
-        months = request.args.get('months', default=6, type=int)
-        
-        # Connect to database
         conn = db_manager.get_connection()
         cursor = conn.cursor()
+        row = read_summary(cursor, growth_months=months)
+        if row[4] is None:
+            # First request after deployment: build the rollups once
+            cursor.close()
+            db_manager.release_connection(conn)
+            conn = None
+            refresh_rollups(force=True)
+            conn = db_manager.get_connection()
+            cursor = conn.cursor()
+            row = read_summary(cursor, growth_months=months)
+        cursor.close()
         
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30*months)  # Approximate months
-        
-        # Generate chart data for each month without relying on complex SQL functions
-        chart_data = []
-        current_month = start_date.replace(day=1)  # Start from first day of month
+        user_counts, growth, favorites, breadth, refreshed_at, recent_users, new_last_week, logged_in_last_day, logged_in_last_month = row
+        by_status, by_role = {}, {}
+        for entry in user_counts or []:
+            by_status[entry['status']] = by_status.get(entry['status'], 0) + entry['users']
+            by_role[entry['role']] = by_role.get(entry['role'], 0) + entry['users']
         
-        while current_month <= end_date:
-            # Create month start and end dates
-            month_start = current_month.replace(day=1)
-            if current_month.month == 12:
-                next_month = current_month.replace(year=current_month.year + 1, month=1)
-            else:
-                next_month = current_month.replace(month=current_month.month + 1)
-            month_end = next_month - timedelta(days=1)
-            
-            # Simple query to count users created in this month period
-            try:
-                cursor.execute(
-                    "SELECT COUNT(*) FROM login WHERE created_at >= %s AND created_at <= %s",
-                    (month_start, month_end)
-                )
-                result = cursor.fetchone()
-                user_count = result[0] if result else 0
-            except Exception as query_error:
-                print(f"Error executing user count query for {month_start} to {month_end}: {query_error}")
-                user_count = 0
-            
-            # Format month name
-            month_name = current_month.strftime('%b')  # Short month name
-            year = current_month.strftime('%Y')
-            label = month_name if current_month.month != 1 else f"Jan '{year[2:]}"
-            
-            # Add to chart data
-            chart_data.append({
-                'month': label,
-                'users': user_count
-            })
-            
-            # Move to next month
-            if current_month.month == 12:
-                current_month = current_month.replace(year=current_month.year + 1, month=1)
-            else:
-                current_month = current_month.replace(month=current_month.month + 1)
+        user_growth = []
+        for entry in growth or []:
+            label = format_period_label(datetime.fromisoformat(entry['period']), 'month')
+            user_growth.append({'period': entry['period'][:10], 'label': label, 'month': label, 'users': entry['users']})
         
-        cursor.close()
-        db_manager.release_connection(conn)
+        market_trends = {}
+        for entry in breadth or []:
+            market_trends[entry['asset_class']] = summarize_trend_counts(entry['bullish'], entry['bearish'], entry['neutral'])
         
         return jsonify({
             'success': True,
-            'data': chart_data,
-            'meta': {
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d'),
-                'months': months
+            'data': {
+                'users': {
+                    'total': sum(by_status.values()),
+                    'by_status': by_status,
+                    'by_role': by_role,
+                    'new_last_7_days': int(new_last_week),
+                    'logged_in_last_day': logged_in_last_day,
+                    'logged_in_last_30_days': logged_in_last_month
+                },
+                'user_growth': user_growth,
+                'favorite_symbols': favorites or [],
+                'recent_users': recent_users or [],
+                'market_trends': market_trends.get('all', summarize_trend_counts(0, 0, 0)),
+                'market_trends_by_class': market_trends,
+                'refreshed_at': refreshed_at.isoformat() if refreshed_at else None
             }
         })
-        
     except Exception as e:
-        print(f"Error in user growth endpoint: {e}")
-        if 'conn' in locals() and conn:
+        print(f"Error in admin summary endpoint: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
             db_manager.release_connection(conn)
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'data': []  # Return empty data to prevent frontend errors
-        }), 500
\ No newline at end of file
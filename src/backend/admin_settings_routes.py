@@ -1,14 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, check_password, HashingBusyError, busy_response
 import jwt
 import datetime
 from functools import wraps
 from db_connection import db_manager
-from auth import token_required  # Import the token_required decorator from auth.py
+from auth import token_required, invalidate_principal, fetch_password_hash  # Import the token_required decorator from auth.py
 
 admin_settings_bp = Blueprint('admin_settings', __name__)
 
-# Now using the token_required decorator from auth.py which returns current_user as a tuple
+# Now using the token_required decorator from auth.py which returns current_user as a UserPrincipal
 # Removing the local token_required decorator
 
 # Get current admin profile
@@ -16,16 +16,7 @@ admin_settings_bp = Blueprint('admin_settings', __name__)
 @token_required
 def get_admin_profile(current_user):
     try:
-        # Convert tuple to dictionary for the response
-        user_data = {
-            'user_id': current_user[0],
-            'username': current_user[1],
-            'email': current_user[2],
-            'role': current_user[4],
-            'last_login': current_user[5].isoformat() if current_user[5] else None,
-            'account_status': current_user[6],
-            'created_at': current_user[7].isoformat() if current_user[7] else None
-        }
+        user_data = current_user.to_dict()
             
         return jsonify({
             'status': 'success',
@@ -38,6 +29,7 @@ def get_admin_profile(current_user):
 @admin_settings_bp.route('/api/admin/update-profile', methods=['PUT'])
 @token_required
 def update_admin_profile(current_user):
+    conn = None
     try:
         data = request.get_json()
         
@@ -52,56 +44,61 @@ def update_admin_profile(current_user):
         if not username or not email:
             return jsonify({'message': 'Username and email are required'}), 400
             
+        # If changing password, verify the current one and hash the new one
+        # before taking a pool connection
+        hashed_password = None
+        if new_password:
+            if not current_password:
+                return jsonify({'message': 'Current password is required to change password'}), 400
+                
+            stored_hash = fetch_password_hash(current_user.user_id)
+            if not stored_hash or not check_password(stored_hash, current_password):
+                return jsonify({'message': 'Current password is incorrect'}), 400
+                
+            hashed_password = hash_password(new_password)
+            
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
         # Check if username or email already exists (excluding current user)
         cursor.execute('SELECT * FROM login WHERE (username = %s OR email = %s) AND user_id != %s', 
-                      (username, email, current_user[0]))  # user_id is at index 0
+                      (username, email, current_user.user_id))
         existing_user = cursor.fetchone()
         
         if existing_user:
             cursor.close()
             return jsonify({'message': 'Username or email already exists'}), 400
             
-        # If changing password, verify current password
-        if new_password:
-            if not current_password:
-                cursor.close()
-                return jsonify({'message': 'Current password is required to change password'}), 400
-                
-            # Verify current password
-            cursor.execute('SELECT pass FROM login WHERE user_id = %s', (current_user[0],))  # user_id is at index 0
-            user = cursor.fetchone()
-            
-            if not check_password_hash(user[0], current_password):  # password hash is the first column in the result
-                cursor.close()
-                return jsonify({'message': 'Current password is incorrect'}), 400
-                
+        if hashed_password:
             # Update with new password
-            hashed_password = generate_password_hash(new_password)
             cursor.execute('UPDATE login SET username = %s, email = %s, pass = %s WHERE user_id = %s',
-                          (username, email, hashed_password, current_user[0]))  # user_id is at index 0
+                          (username, email, hashed_password, current_user.user_id))
         else:
             # Update without changing password
             cursor.execute('UPDATE login SET username = %s, email = %s WHERE user_id = %s',
-                          (username, email, current_user[0]))  # user_id is at index 0
+                          (username, email, current_user.user_id))
             
         conn.commit()
         cursor.close()
+        invalidate_principal(current_user.user_id)
         
         return jsonify({
             'status': 'success',
             'message': 'Profile updated successfully'
         }), 200
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'message': str(e)}), 500
+    finally:
+        if conn:
+            db_manager.release_connection(conn)
 
 # Get all admin accounts
 @admin_settings_bp.route('/api/admin/admins', methods=['GET'])
 @token_required
 def get_all_admins(current_user):
-    if current_user[4] != 'admin':  # Check if user is admin using index 4 (role)
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
     try:
@@ -136,9 +133,10 @@ def get_all_admins(current_user):
 @admin_settings_bp.route('/api/admin/add-admin', methods=['POST'])
 @token_required
 def add_admin(current_user):
-    if current_user[4] != 'admin':  # Check if user is admin using index 4 (role)
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
+    conn = None
     try:
         data = request.get_json()
         
@@ -159,12 +157,18 @@ def add_admin(current_user):
         cursor.execute('SELECT * FROM login WHERE username = %s OR email = %s', (username, email))
         existing_user = cursor.fetchone()
         
+        cursor.close()
+        # Release the connection while the password is hashed
+        db_manager.release_connection(conn)
+        conn = None
+        
         if existing_user:
-            cursor.close()
             return jsonify({'message': 'Username or email already exists'}), 400
             
         # Create new admin account
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
         cursor.execute(
             'INSERT INTO login (username, email, pass, role, account_status, created_at) VALUES (%s, %s, %s, %s, %s, NOW())',
             (username, email, hashed_password, 'admin', 'active')
@@ -177,19 +181,24 @@ def add_admin(current_user):
             'status': 'success',
             'message': 'Admin account created successfully'
         }), 201
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'message': str(e)}), 500
+    finally:
+        if conn:
+            db_manager.release_connection(conn)
 
 # Delete admin account
 @admin_settings_bp.route('/api/admin/delete-admin/<int:admin_id>', methods=['DELETE'])
 @token_required
 def delete_admin(current_user, admin_id):
-    if current_user[4] != 'admin':  # Check if user is admin using index 4 (role)
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
     try:
         # Prevent self-deletion
-        if admin_id == current_user[0]:  # user_id is at index 0
+        if admin_id == current_user.user_id:
             return jsonify({'message': 'Cannot delete your own account'}), 400
             
         conn = db_manager.get_connection()
@@ -218,6 +227,7 @@ def delete_admin(current_user, admin_id):
         
         conn.commit()
         cursor.close()
+        invalidate_principal(admin_id)
         
         return jsonify({
             'status': 'success',
@@ -231,9 +241,10 @@ def delete_admin(current_user, admin_id):
 @admin_settings_bp.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @token_required
 def update_admin_user(current_user, user_id):
-    if current_user[4] != 'admin':  # Check if user is admin using index 4 (role)
+    if current_user.role != 'admin':
         return jsonify({'message': 'Admin access required'}), 403
     
+    conn = None
     try:
         data = request.get_json()
         
@@ -248,6 +259,22 @@ def update_admin_user(current_user, user_id):
         if not username or not email:
             return jsonify({'message': 'Username and email are required'}), 400
             
+        # If changing password, verify and hash before taking a pool connection
+        hashed_password = None
+        if new_password:
+            # Only the user themselves should provide current password for verification
+            # Admin can reset other admin passwords without verification
+            if user_id == current_user.user_id and not current_password:
+                return jsonify({'message': 'Current password is required to change your own password'}), 400
+                
+            # If changing own password, verify current password
+            if user_id == current_user.user_id and current_password:
+                stored_hash = fetch_password_hash(user_id)
+                if not stored_hash or not check_password(stored_hash, current_password):
+                    return jsonify({'message': 'Current password is incorrect'}), 400
+            
+            hashed_password = hash_password(new_password)
+            
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
@@ -268,25 +295,8 @@ def update_admin_user(current_user, user_id):
             cursor.close()
             return jsonify({'message': 'Username or email already exists'}), 400
             
-        # If changing password
-        if new_password:
-            # Only the user themselves should provide current password for verification
-            # Admin can reset other admin passwords without verification
-            if user_id == current_user[0] and not current_password:  # user_id is at index 0
-                cursor.close()
-                return jsonify({'message': 'Current password is required to change your own password'}), 400
-                
-            # If changing own password, verify current password
-            if user_id == current_user[0] and current_password:
-                cursor.execute('SELECT pass FROM login WHERE user_id = %s', (user_id,))
-                user = cursor.fetchone()
-                
-                if not check_password_hash(user[0], current_password):  # password hash is the first column
-                    cursor.close()
-                    return jsonify({'message': 'Current password is incorrect'}), 400
-            
+        if hashed_password:
             # Update with new password
-            hashed_password = generate_password_hash(new_password)
             cursor.execute('UPDATE login SET username = %s, email = %s, pass = %s WHERE user_id = %s',
                           (username, email, hashed_password, user_id))
         else:
@@ -296,11 +306,17 @@ def update_admin_user(current_user, user_id):
             
         conn.commit()
         cursor.close()
+        invalidate_principal(user_id)
         
         return jsonify({
             'status': 'success',
             'message': 'Admin user updated successfully'
         }), 200
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"Error updating admin user: {e}")
-        return jsonify({'message': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'message': str(e)}), 500
+    finally:
+        if conn:
+            db_manager.release_connection(conn) 
\ No newline at end of file
@@ -5,6 +5,120 @@ import os
 import json
 import time
 from pathlib import Path
+import threading
+from concurrent.futures import Future
+import numpy as np
+from requests.adapters import HTTPAdapter
+from instrumentation import span, record_cache
+from urllib3.util.retry import Retry
+
+try:
+    import fcntl  # Cross-process locking, unavailable on Windows
+except ImportError:
+    fcntl = None
+
+# Key holding the time series in each Alpha Vantage function's response
+SERIES_KEYS = {
+    'TIME_SERIES_DAILY': 'Time Series (Daily)',
+    'FX_DAILY': 'Time Series FX (Daily)'
+}
+
+def parse_time_series(payload, series_key):
+    """
+    Parse an Alpha Vantage time series payload into a typed DataFrame
+    
+    Works for every series type: column names are taken from the first bar
+    ('1. open' -> 'open') and all values are converted in one NumPy call.
+    
+    Parameters:
+    - payload: Decoded JSON response
+    - series_key: Key holding the series, e.g. 'Time Series (Daily)'
+    
+    Returns:
+    - Pandas DataFrame indexed by date, sorted ascending (empty if no series)
+    """
+    series = payload.get(series_key)
+    if not series:
+        return pd.DataFrame()
+    
+    raw_columns = list(next(iter(series.values())).keys())
+    columns = [c.split('. ', 1)[-1] for c in raw_columns]
+    values = np.array([[bar[c] for c in raw_columns] for bar in series.values()], dtype=np.float64)
+    index = pd.to_datetime(list(series.keys()), format='%Y-%m-%d')
+    
+    return pd.DataFrame(values, index=index, columns=columns).sort_index()
+
+class SharedRateLimiter:
+    """
+    Sliding-window rate limiter shared by threads and worker processes
+    
+    Call timestamps live in a small JSON file guarded by an exclusive flock, so
+    every gunicorn worker on the host draws from the same budget. Threads in one
+    process are serialized with a regular lock first. Without fcntl (Windows)
+    the limiter only covers the current process.
+    """
+    def __init__(self, state_path, max_calls=5, period=60.0, min_interval=0.5):
+        self.state_path = Path(state_path)
+        self.lock_path = self.state_path.with_suffix('.lock')
+        self.max_calls = max_calls
+        self.period = period
+        self.min_interval = min_interval
+        self.thread_lock = threading.Lock()
+        self.call_times = []  # Used when fcntl is unavailable
+    
+    def _read_times(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    def _write_times(self, call_times):
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(call_times, f)
+        os.replace(tmp_path, self.state_path)
+    
+    def _try_acquire(self, now):
+        """Record a call if the budget allows it, otherwise return seconds to wait"""
+        if fcntl is None:
+            call_times = self.call_times
+        else:
+            call_times = self._read_times()
+        
+        call_times = [t for t in call_times if t > now - self.period]
+        wait = 0.0
+        if call_times:
+            wait = max(wait, call_times[-1] + self.min_interval - now)
+        if len(call_times) >= self.max_calls:
+            wait = max(wait, call_times[0] + self.period - now)
+        
+        if wait <= 0:
+            call_times.append(now)
+        
+        if fcntl is None:
+            self.call_times = call_times
+        else:
+            self._write_times(call_times)
+        return wait
+    
+    def acquire(self):
+        """Block until a call is allowed, then record it"""
+        while True:
+            with self.thread_lock:
+                if fcntl is None:
+                    wait = self._try_acquire(time.time())
+                else:
+                    with open(self.lock_path, 'a') as lock_file:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                        try:
+                            wait = self._try_acquire(time.time())
+                        finally:
+                            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            if wait <= 0:
+                return
+            print(f"Alpha Vantage rate limit reached, waiting {wait:.2f} seconds")
+            time.sleep(wait)
 
 class AlphaVantageAPI:
     """
@@ -19,11 +133,35 @@ class AlphaVantageAPI:
         self.cache_dir = Path("cache/alpha_vantage")
         self.default_cache_expiry = 24 * 60 * 60  # 24 hours in seconds
         self.request_delay = 0.5  # Delay between API calls to prevent rate limiting
-        self.last_request_time = 0
+        self.request_timeout = (
+            float(os.environ.get('ALPHA_VANTAGE_CONNECT_TIMEOUT', 5)),
+            float(os.environ.get('ALPHA_VANTAGE_READ_TIMEOUT', 30))
+        )
         
         # Ensure cache directory exists
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
+        # Free tier allows 5 calls per minute across all workers on this host
+        self.rate_limiter = SharedRateLimiter(
+            self.cache_dir / 'rate_limit.json',
+            max_calls=int(os.environ.get('ALPHA_VANTAGE_CALLS_PER_MINUTE', 5)),
+            period=60.0,
+            min_interval=self.request_delay
+        )
+        
+        # Pooled connections. Retries happen in _fetch, not in the adapter, so
+        # every attempt goes through the shared rate limiter.
+        self.session = requests.Session()
+        self.max_retries = int(os.environ.get('ALPHA_VANTAGE_RETRIES', 2))
+        self.retry_backoff = 1.0  # Seconds before the first retry, doubled after each one
+        adapter = HTTPAdapter(max_retries=Retry(total=0), pool_connections=4, pool_maxsize=10)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # Identical requests in flight share one upstream call
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        
         # Memory cache for frequent requests
         self.memory_cache = {}
         
@@ -53,42 +191,156 @@ class AlphaVantageAPI:
         with open(cache_path, 'r') as f:
             return json.load(f)
     
+    def _get_tmp_path(self, path):
+        """Per-process, per-thread temp path so concurrent writers never collide"""
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    
     def _write_cache(self, cache_path, data):
         """Write data to cache file"""
-        with open(cache_path, 'w') as f:
+        tmp_path = self._get_tmp_path(cache_path)
+        with open(tmp_path, 'w') as f:
             json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+    
+    def _get_frame_path(self, cache_path):
+        """Path of the parsed binary frame stored next to a raw JSON cache file"""
+        return cache_path.with_suffix('.npy')
+    
+    def _write_frame(self, cache_path, df):
+        """Store a parsed frame as a structured NumPy array that can be memory-mapped"""
+        dtype = [('date', 'datetime64[ns]')] + [(col, 'f8') for col in df.columns]
+        records = np.empty(len(df), dtype=dtype)
+        records['date'] = df.index.values
+        for col in df.columns:
+            records[col] = df[col].values
+        
+        # Write to a temp file first so readers never see a partial frame
+        frame_path = self._get_frame_path(cache_path)
+        tmp_path = self._get_tmp_path(frame_path)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, frame_path)
+    
+    def _read_frame(self, cache_path):
+        """Memory-map a parsed frame, or return None if it is missing or older than the JSON"""
+        frame_path = self._get_frame_path(cache_path)
+        if not frame_path.exists() or frame_path.stat().st_mtime < cache_path.stat().st_mtime:
+            return None
+        
+        records = np.load(frame_path, mmap_mode='r')
+        columns = [name for name in records.dtype.names if name != 'date']
+        return pd.DataFrame(
+            {col: np.asarray(records[col]) for col in columns},
+            index=pd.DatetimeIndex(np.asarray(records['date']))
+        )
+    
+    def _load_cached_frame(self, cache_path, series_key):
+        """Load a cached series, parsing the raw JSON only if no binary frame exists yet"""
+        df = self._read_frame(cache_path)
+        if df is None:
+            df = parse_time_series(self._read_cache(cache_path), series_key)
+            if not df.empty:
+                self._write_frame(cache_path, df)
+        return df
+    
+    def _filter_days(self, df, days):
+        """Filter a frame to the requested number of days"""
+        if days > 0 and not df.empty:
+            start_date = datetime.now().date() - timedelta(days=days)
+            df = df[df.index >= pd.Timestamp(start_date)]
+        return df
     
     def _rate_limit_request(self):
         """Apply rate limiting to prevent exceeding API limits"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
+        self.rate_limiter.acquire()
+    
+    def _fetch(self, params):
+        """
+        Make a rate-limited API call and return the decoded JSON
         
-        if time_since_last_request < self.request_delay:
-            time.sleep(self.request_delay - time_since_last_request)
-            
-        self.last_request_time = time.time()
+        Connection errors, timeouts and 5xx responses are retried up to
+        max_retries times with exponential backoff. Each attempt takes its own
+        slot from the shared rate limiter. A 429 is not retried: the budget is
+        already spent, possibly by callers outside this host.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._rate_limit_request()
+            try:
+                with span('upstream', 'alpha_vantage', function=params.get('function')):
+                    response = self.session.get(
+                        self.base_url,
+                        params=dict(params, apikey=self.api_key),
+                        timeout=self.request_timeout
+                    )
+                if response.status_code < 500 or attempt == self.max_retries:
+                    break
+                print(f"Alpha Vantage returned HTTP {response.status_code}, retrying")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"Alpha Vantage request failed ({e}), retrying")
+            time.sleep(self.retry_backoff * 2 ** attempt)
+        
+        response.raise_for_status()  # Raise exception for HTTP errors
+        data = response.json()
+        
+        # Throttled responses come back as HTTP 200 with a Note/Information message;
+        # raise so they are never cached and the expired cache is used instead
+        if 'Note' in data or 'Information' in data:
+            raise Exception(f"Alpha Vantage throttled the request: {data.get('Note') or data.get('Information')}")
+        
+        return data
     
-    def get_daily_data(self, symbol, days=30, outputsize="compact", force_refresh=False):
+    def _request(self, params):
         """
-        Get daily time series data for a symbol with caching
+        Fetch params from the API, merging identical concurrent requests
         
-        Parameters:
-        - symbol: Stock or forex symbol (e.g., 'EURUSD')
-        - days: Number of days of historical data needed
-        - outputsize: 'compact' (last 100 data points) or 'full' (all available data)
-        - force_refresh: If True, ignore cache and fetch new data
+        The first caller for a given set of params performs the request; callers
+        arriving while it is pending wait for and share its result (or error).
+        """
+        key = tuple(sorted(params.items()))
+        
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self.inflight[key] = future
+        
+        if not is_leader:
+            return future.result()
+        
+        try:
+            data = self._fetch(params)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+    
+    def _get_time_series(self, function, symbol, params, days, force_refresh, memory_cache_key):
+        """
+        Shared fetch pipeline for all time series functions
+        
+        Lookup order is memory cache, binary frame cache, Alpha Vantage, and
+        finally an expired file cache if the request fails. Memory holds the full
+        parsed frame so the days filter can differ between callers.
         
         Returns:
-        - Pandas DataFrame with date, open, high, low, close, volume columns
+        - Pandas DataFrame filtered to the requested days (empty on error)
         """
-        function = "TIME_SERIES_DAILY"
+        series_key = SERIES_KEYS[function]
         
         # Check memory cache first (fastest)
-        memory_cache_key = f"{symbol}_{function}_{outputsize}"
         if not force_refresh and memory_cache_key in self.memory_cache:
             cache_item = self.memory_cache[memory_cache_key]
             if (time.time() - cache_item['timestamp']) < 3600:  # 1 hour memory cache
-                return cache_item['data']
+                record_cache('alpha_vantage', 'memory', hit=True)
+                return self._filter_days(cache_item['data'], days)
+        record_cache('alpha_vantage', 'memory', hit=False)
         
         # Check file cache next
         cache_path = self._get_cache_path(function, symbol)
@@ -100,86 +352,43 @@ class AlphaVantageAPI:
         # Use cache if valid and not forcing refresh
         if not force_refresh and self._is_cache_valid(cache_path, cache_expiry):
             print(f"Using cached data for {symbol}")
-            cached_data = self._read_cache(cache_path)
-            
-            # Convert to DataFrame
-            if 'Time Series (Daily)' in cached_data:
-                df = pd.DataFrame.from_dict(cached_data['Time Series (Daily)'], orient='index')
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                
-                # Rename columns
-                df.columns = [c.split('. ')[1] for c in df.columns]
-                
-                # Convert to numeric
-                for col in df.columns:
-                    df[col] = pd.to_numeric(df[col])
-                
-                # Filter to requested days
-                if days > 0:
-                    start_date = datetime.now().date() - timedelta(days=days)
-                    df = df[df.index >= pd.Timestamp(start_date)]
-                
-                # Store in memory cache
-                self.memory_cache[memory_cache_key] = {
-                    'data': df,
-                    'timestamp': time.time()
-                }
-                
-                return df
+            try:
+                df = self._load_cached_frame(cache_path, series_key)
+                if not df.empty:
+                    self.memory_cache[memory_cache_key] = {
+                        'data': df,
+                        'timestamp': time.time()
+                    }
+                    record_cache('alpha_vantage', 'file', hit=True)
+                    return self._filter_days(df, days)
+            except Exception as e:
+                print(f"Error reading cache for {symbol}: {e}")
+        record_cache('alpha_vantage', 'file', hit=False)
         
-        # Apply rate limiting
-        self._rate_limit_request()
-        
-        # Make API request
+        # Make API request (rate limited, shared with identical pending requests)
         print(f"Fetching fresh data from Alpha Vantage for {symbol}")
-        params = {
-            'function': function,
-            'symbol': symbol,
-            'outputsize': outputsize,
-            'apikey': self.api_key
-        }
         
         try:
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            data = response.json()
+            data = self._request(params)
             
             # Check for error messages
             if 'Error Message' in data:
                 print(f"Alpha Vantage API error: {data['Error Message']}")
                 return pd.DataFrame()  # Return empty DataFrame on error
-                
-            # Cache the raw response
-            self._write_cache(cache_path, data)
             
-            # Convert to DataFrame
-            if 'Time Series (Daily)' in data:
-                df = pd.DataFrame.from_dict(data['Time Series (Daily)'], orient='index')
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                
-                # Rename columns
-                df.columns = [c.split('. ')[1] for c in df.columns]
-                
-                # Convert to numeric
-                for col in df.columns:
-                    df[col] = pd.to_numeric(df[col])
-                
-                # Filter to requested days
-                if days > 0:
-                    start_date = datetime.now().date() - timedelta(days=days)
-                    df = df[df.index >= pd.Timestamp(start_date)]
-                
-                # Store in memory cache
+            df = parse_time_series(data, series_key)
+            
+            # Cache the raw response and the parsed frame; unparseable payloads are
+            # not cached so they cannot shadow a good expired copy
+            if not df.empty:
+                self._write_cache(cache_path, data)
+                self._write_frame(cache_path, df)
                 self.memory_cache[memory_cache_key] = {
                     'data': df,
                     'timestamp': time.time()
                 }
-                
-                return df
             
-            return pd.DataFrame()  # Return empty DataFrame if no data
+            return self._filter_days(df, days)
             
         except Exception as e:
             print(f"Error fetching data from Alpha Vantage: {e}")
@@ -188,30 +397,33 @@ class AlphaVantageAPI:
             if cache_path.exists():
                 print(f"Using expired cache as fallback for {symbol}")
                 try:
-                    cached_data = self._read_cache(cache_path)
-                    if 'Time Series (Daily)' in cached_data:
-                        df = pd.DataFrame.from_dict(cached_data['Time Series (Daily)'], orient='index')
-                        df.index = pd.to_datetime(df.index)
-                        df = df.sort_index()
-                        
-                        # Rename columns
-                        df.columns = [c.split('. ')[1] for c in df.columns]
-                        
-                        # Convert to numeric
-                        for col in df.columns:
-                            df[col] = pd.to_numeric(df[col])
-                        
-                        # Filter to requested days
-                        if days > 0:
-                            start_date = datetime.now().date() - timedelta(days=days)
-                            df = df[df.index >= pd.Timestamp(start_date)]
-                        
-                        return df
+                    return self._filter_days(self._load_cached_frame(cache_path, series_key), days)
                 except:
                     pass
             
             return pd.DataFrame()  # Return empty DataFrame on error
     
+    def get_daily_data(self, symbol, days=30, outputsize="compact", force_refresh=False):
+        """
+        Get daily time series data for a symbol with caching
+        
+        Parameters:
+        - symbol: Stock or forex symbol (e.g., 'EURUSD')
+        - days: Number of days of historical data needed
+        - outputsize: 'compact' (last 100 data points) or 'full' (all available data)
+        - force_refresh: If True, ignore cache and fetch new data
+        
+        Returns:
+        - Pandas DataFrame with date, open, high, low, close, volume columns
+        """
+        function = "TIME_SERIES_DAILY"
+        params = {
+            'function': function,
+            'symbol': symbol,
+            'outputsize': outputsize
+        }
+        return self._get_time_series(function, symbol, params, days, force_refresh, f"{symbol}_{function}_{outputsize}")
+    
     def get_forex_data(self, from_currency, to_currency, days=30, force_refresh=False):
         """
         Get forex time series data with caching
@@ -227,136 +439,13 @@ class AlphaVantageAPI:
         """
         function = "FX_DAILY"
         symbol = f"{from_currency}{to_currency}"
-        
-        # Check memory cache first (fastest)
-        memory_cache_key = f"{symbol}_{function}"
-        if not force_refresh and memory_cache_key in self.memory_cache:
-            cache_item = self.memory_cache[memory_cache_key]
-            if (time.time() - cache_item['timestamp']) < 3600:  # 1 hour memory cache
-                return cache_item['data']
-        
-        # Check file cache next
-        cache_path = self._get_cache_path(function, symbol)
-        
-        # Determine appropriate cache expiry based on days needed
-        # For recent data (< 7 days), use shorter cache
-        cache_expiry = 3600 if days <= 7 else self.default_cache_expiry
-        
-        # Use cache if valid and not forcing refresh
-        if not force_refresh and self._is_cache_valid(cache_path, cache_expiry):
-            print(f"Using cached forex data for {symbol}")
-            cached_data = self._read_cache(cache_path)
-            
-            # Convert to DataFrame
-            if 'Time Series FX (Daily)' in cached_data:
-                df = pd.DataFrame.from_dict(cached_data['Time Series FX (Daily)'], orient='index')
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                
-                # Rename columns
-                df.columns = [c.split('. ')[1] for c in df.columns]
-                
-                # Convert to numeric
-                for col in df.columns:
-                    df[col] = pd.to_numeric(df[col])
-                
-                # Filter to requested days
-                if days > 0:
-                    start_date = datetime.now().date() - timedelta(days=days)
-                    df = df[df.index >= pd.Timestamp(start_date)]
-                
-                # Store in memory cache
-                self.memory_cache[memory_cache_key] = {
-                    'data': df,
-                    'timestamp': time.time()
-                }
-                
-                return df
-        
-        # Apply rate limiting
-        self._rate_limit_request()
-        
-        # Make API request
-        print(f"Fetching fresh forex data from Alpha Vantage for {symbol}")
         params = {
             'function': function,
             'from_symbol': from_currency,
             'to_symbol': to_currency,
-            'outputsize': 'full',
-            'apikey': self.api_key
+            'outputsize': 'full'
         }
-        
-        try:
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            data = response.json()
-            
-            # Check for error messages
-            if 'Error Message' in data:
-                print(f"Alpha Vantage API error: {data['Error Message']}")
-                return pd.DataFrame()  # Return empty DataFrame on error
-                
-            # Cache the raw response
-            self._write_cache(cache_path, data)
-            
-            # Convert to DataFrame
-            if 'Time Series FX (Daily)' in data:
-                df = pd.DataFrame.from_dict(data['Time Series FX (Daily)'], orient='index')
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                
-                # Rename columns
-                df.columns = [c.split('. ')[1] for c in df.columns]
-                
-                # Convert to numeric
-                for col in df.columns:
-                    df[col] = pd.to_numeric(df[col])
-                
-                # Filter to requested days
-                if days > 0:
-                    start_date = datetime.now().date() - timedelta(days=days)
-                    df = df[df.index >= pd.Timestamp(start_date)]
-                
-                # Store in memory cache
-                self.memory_cache[memory_cache_key] = {
-                    'data': df,
-                    'timestamp': time.time()
-                }
-                
-                return df
-            
-            return pd.DataFrame()  # Return empty DataFrame if no data
-            
-        except Exception as e:
-            print(f"Error fetching forex data from Alpha Vantage: {e}")
-            
-            # If we have cached data, use it as fallback even if expired
-            if cache_path.exists():
-                print(f"Using expired cache as fallback for {symbol}")
-                try:
-                    cached_data = self._read_cache(cache_path)
-                    if 'Time Series FX (Daily)' in cached_data:
-                        df = pd.DataFrame.from_dict(cached_data['Time Series FX (Daily)'], orient='index')
-                        df.index = pd.to_datetime(df.index)
-                        df = df.sort_index()
-                        
-                        # Rename columns
-                        df.columns = [c.split('. ')[1] for c in df.columns]
-                        
-                        # Convert to numeric
-                        for col in df.columns:
-                            df[col] = pd.to_numeric(df[col])
-                        
-                        # Filter to requested days
-                        if days > 0:
-                            start_date = datetime.now().date() - timedelta(days=days)
-                            df = df[df.index >= pd.Timestamp(start_date)]
-                        
-                        return df
-                except:
-                    pass
-            
-            return pd.DataFrame()  # Return empty DataFrame on error
+        return self._get_time_series(function, symbol, params, days, force_refresh, f"{symbol}_{function}")
 
 
 # Create a singleton instance for use across the application
@@ -1,12 +1,124 @@
 # auth_routes.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 import jwt
 import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import time
+import os
+from password_hashing import hash_password, check_password, HashingBusyError, busy_response
 from functools import wraps
 from db_connection import db_manager
+import logging
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
+logger = logging.getLogger(__name__)
+
+# Columns loaded for the authenticated user; never the password hash or profile image
+PRINCIPAL_COLUMNS = "user_id, username, email, role, last_login, account_status, created_at"
+
+class UserPrincipal:
+    """The authenticated user passed to routes as current_user"""
+    __slots__ = ('user_id', 'username', 'email', 'role', 'last_login', 'account_status', 'created_at')
+    
+    def __init__(self, user_id, username, email, role, last_login, account_status, created_at):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.last_login = last_login
+        self.account_status = account_status
+        self.created_at = created_at
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build a principal from a row selected with PRINCIPAL_COLUMNS"""
+        return cls(*row)
+    
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'email': self.email,
+            'role': self.role,
+            'account_status': self.account_status,
+            'last_login': self.last_login.isoformat() if self.last_login else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class PrincipalCache:
+    """
+    Short-lived cache of authenticated users keyed by user_id
+    
+    Each entry holds the UserPrincipal and the decoded token claims, so
+    token_required can skip the login lookup for repeat requests. Entries are
+    invalidated when an account is changed or deleted; the TTL bounds how long
+    other gunicorn workers (which keep their own cache) can serve a stale row.
+    """
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry['expires']:
+                del self.entries[user_id]
+                return None
+            return entry
+    
+    def put(self, user_id, user, claims):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest ones
+                now = time.monotonic()
+                self.entries = {k: v for k, v in self.entries.items() if v['expires'] > now}
+                while len(self.entries) >= self.max_entries:
+                    self.entries.pop(next(iter(self.entries)))
+            self.entries[user_id] = {
+                'user': user,
+                'claims': claims,
+                'role': user.role,
+                'expires': time.monotonic() + self.ttl
+            }
+    
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+principal_cache = PrincipalCache(ttl=float(os.environ.get('AUTH_CACHE_TTL', 60)))
+
+def invalidate_principal(user_id):
+    """Drop a cached principal after its login row changed"""
+    principal_cache.invalidate(user_id)
+
+def fetch_password_hash(user_id):
+    """
+    Stored password hash for a user, read on a connection that is released
+    before returning so callers can verify or hash without holding the pool
+
+    Returns:
+        str: The hash, or None if the user does not exist
+    """
+    conn = db_manager.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pass FROM login WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        db_manager.release_connection(conn)
 
 def token_required(f):
     @wraps(f)
@@ -14,7 +126,7 @@ def token_required(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            print("Auth header missing in request")
+            logger.debug("Auth header missing in request")
             return jsonify({'message': 'Token is missing!'}), 401
         
         conn = None    
@@ -27,34 +139,44 @@ def token_required(f):
             else:
                 token = auth_header  # If no space, use the whole header
             
-            print(f"Attempting to decode token: {token[:20]}...")
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            print(f"Token decoded successfully, user_id: {data.get('user_id')}")
-            
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM login WHERE user_id = %s", (data['user_id'],))
-            current_user = cursor.fetchone()
-            cursor.close()
+            logger.debug("Token decoded successfully, user_id: %s", data.get('user_id'))
             
-            if not current_user:
-                print(f"User not found for user_id: {data.get('user_id')}")
+            # The signature and expiry are always verified; only the login lookup is cached
+            cached = principal_cache.get(data['user_id'])
+            if cached is not None:
+                current_user = cached['user']
+            else:
+                conn = db_manager.get_connection()
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT {PRINCIPAL_COLUMNS} FROM login WHERE user_id = %s", (data['user_id'],))
+                row = cursor.fetchone()
+                cursor.close()
+                
+                if not row:
+                    logger.info("User not found for user_id: %s", data.get('user_id'))
+                    db_manager.release_connection(conn)
+                    return jsonify({'message': 'User not found!'}), 401
+                
                 db_manager.release_connection(conn)
-                return jsonify({'message': 'User not found!'}), 401
+                conn = None
+                current_user = UserPrincipal.from_row(row)
+                principal_cache.put(data['user_id'], current_user, data)
             
-            db_manager.release_connection(conn)
+            # Decoded claims are available to the route for the rest of the request
+            g.auth_claims = data
         except jwt.ExpiredSignatureError:
-            print("Token has expired")
+            logger.debug("Token has expired")
             if conn:
                 db_manager.release_connection(conn)
             return jsonify({'message': 'Token has expired!', 'expired': True}), 401
         except jwt.InvalidTokenError:
-            print("Invalid token format")
+            logger.debug("Invalid token format")
             if conn:
                 db_manager.release_connection(conn)
             return jsonify({'message': 'Invalid token format!'}), 401
         except Exception as e:
-            print(f"Authentication error: {str(e)}")
+            logger.error(f"Authentication error: {str(e)}")
             if conn:
                 db_manager.release_connection(conn)
             return jsonify({'message': 'Token validation failed!'}), 401
@@ -79,27 +201,30 @@ def login():
         cursor.execute("SELECT * FROM login WHERE email = %s", (email,))
         user = cursor.fetchone()
         
+        cursor.close()
+        # Don't hold a pool connection while the password hash is checked
+        db_manager.release_connection(conn)
+        conn = None
+        
         if not user:
-            cursor.close()
-            db_manager.release_connection(conn)
             return jsonify({'message': 'User not found'}), 404
         
         # In PostgreSQL, results are returned as tuples, so we need to access by index
         # Assuming column order: user_id, username, email, pass, role, last_login, account_status, created_at
-        if not check_password_hash(user[3], password):  # user[3] is the password hash
-            cursor.close()
-            db_manager.release_connection(conn)
+        if not check_password(user[3], password):  # user[3] is the password hash
             return jsonify({'message': 'Invalid credentials'}), 401
         
         if user[6] != 'active':  # user[6] is account_status
-            cursor.close()
-            db_manager.release_connection(conn)
             return jsonify({'message': 'Account is not active'}), 403
         
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
         cursor.execute("UPDATE login SET last_login = NOW() WHERE user_id = %s", (user[0],))
         conn.commit()
+        invalidate_principal(user[0])
         cursor.close()
         db_manager.release_connection(conn)
+        conn = None
         
         # Increase token expiration to 7 days for better usability
         token = jwt.encode({
@@ -115,7 +240,7 @@ def login():
         if isinstance(token, bytes):
             token = token.decode('utf-8')
             
-        print(f"Generated token for user {user[1]}, expires in 7 days")
+        logger.debug("Generated token for user %s, expires in 7 days", user[1])
         
         return jsonify({
             'token': token,
@@ -126,8 +251,10 @@ def login():
                 'role': user[4]
             }
         })
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error(f"Login error: {str(e)}")
         if conn:
             db_manager.release_connection(conn)
         return jsonify({'message': f'Login error: {str(e)}'}), 500
@@ -135,19 +262,8 @@ def login():
 @auth_bp.route('/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
-    # Convert the tuple current_user to a dictionary for consistent response format
-    # Assuming column order: user_id, username, email, pass, role, last_login, account_status, created_at
     if current_user:
-        user_data = {
-            'user_id': current_user[0],
-            'username': current_user[1],
-            'email': current_user[2],
-            'role': current_user[4],
-            'account_status': current_user[6],
-            'last_login': current_user[5].isoformat() if current_user[5] else None,
-            'created_at': current_user[7].isoformat() if current_user[7] else None
-        }
-        return jsonify({'user': user_data})
+        return jsonify({'user': current_user.to_dict()})
     else:
         return jsonify({'message': 'User not found'}), 404
 
@@ -164,6 +280,9 @@ def register():
     
     conn = None
     try:
+        # Hash before taking a pool connection; the hashing pool may make us wait
+        hashed_password = hash_password(password)
+        
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM login WHERE email = %s", (email,))
@@ -174,7 +293,6 @@ def register():
             db_manager.release_connection(conn)  # Return connection to pool
             return jsonify({'message': 'User already exists'}), 400
         
-        hashed_password = generate_password_hash(password)
         cursor.execute(
             "INSERT INTO login (username, email, pass, role, account_status, created_at) VALUES (%s, %s, %s, %s, 'active', NOW()) RETURNING user_id",
             (username, email, hashed_password, role)
@@ -185,8 +303,10 @@ def register():
         db_manager.release_connection(conn)  # Return connection to pool
         
         return jsonify({'message': 'User registered successfully', 'user_id': user_id}), 201
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"Database error: {e}")
+        logger.error(f"Database error: {e}")
         if conn:
             db_manager.release_connection(conn)  # Return connection to pool even on error
         return jsonify({'message': f'Database error occurred: {str(e)}'}), 500
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Backfill price_history for a list of symbols over a date range.
+
+Symbols are fetched in batches: one rate-limited Yahoo Finance download per
+batch, with per-symbol fallback through the provider router (Alpha Vantage)
+for anything the batch download missed. Each batch is bulk-loaded with COPY
+into a temporary staging table and merged into price_history, then recorded
+in a checkpoint file so an interrupted run resumes where it stopped. Symbols
+that returned no data are recorded as failed and retried on the next run.
+
+Requires the unique index from src/sql/price_history_unique.sql.
+
+Usage:
+    python backfill_prices.py AAPL MSFT EURUSD --start 2023-01-01
+    python backfill_prices.py --symbols-file symbols.txt --dsn postgresql://localhost/finals2
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import io
+import os
+import sys
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk-load historical prices into price_history")
+    parser.add_argument('symbols', nargs='*', help="Symbols to backfill (e.g. AAPL EURUSD)")
+    parser.add_argument('--symbols-file', help="File with one symbol per line ('#' starts a comment)")
+    parser.add_argument('--start', default=(datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d'),
+                        help="Start date YYYY-MM-DD (default: one year ago)")
+    parser.add_argument('--end', default=datetime.now().strftime('%Y-%m-%d'),
+                        help="End date YYYY-MM-DD (default: today)")
+    parser.add_argument('--batch-size', type=int, default=20, help="Symbols per download and COPY batch")
+    parser.add_argument('--checkpoint', default='backfill_checkpoint.json',
+                        help="Checkpoint file used to resume interrupted runs")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--dsn', help="PostgreSQL DSN (overrides DATABASE_URL), e.g. postgresql://localhost/finals2")
+    return parser.parse_args()
+
+def load_symbols(args):
+    """Collect symbols from the command line and symbols file, keeping order and dropping duplicates"""
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        with open(args.symbols_file, 'r') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    symbols.append(line)
+    return list(dict.fromkeys(s.upper() for s in symbols))
+
+def load_checkpoint(path, start, end):
+    """Return the checkpoint for this date range, or a fresh one"""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('start') == start and checkpoint.get('end') == end:
+            checkpoint.setdefault('failed', [])
+            return checkpoint
+        print(f"Checkpoint {path} is for {checkpoint.get('start')}..{checkpoint.get('end')}, starting over")
+    return {'start': start, 'end': end, 'completed': [], 'failed': [], 'bars': 0}
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def download_batch(symbols, start, end):
+    """
+    Fetch history for a batch of symbols
+
+    Args:
+        symbols (list): Symbols as stored in price_history
+        start (str): Start date in YYYY-MM-DD format
+        end (str): End date in YYYY-MM-DD format
+
+    Returns:
+        dict: symbol -> DataFrame with Open/High/Low/Close columns (missing symbols omitted)
+    """
+    import yfinance as yf
+    from market_analysis import format_symbol_for_yahoo, rate_limiter, market_data_router, logger
+
+    yahoo_symbols = {symbol: format_symbol_for_yahoo(symbol) for symbol in symbols}
+    end_exclusive = (datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    frames = {}
+
+    # One download covers the whole batch and counts as a single call against the limiter
+    rate_limiter.wait_if_needed()
+    try:
+        data = yf.download(list(yahoo_symbols.values()), start=start, end=end_exclusive,
+                           group_by='ticker', auto_adjust=True, progress=False, threads=True)
+    except Exception as e:
+        logger.error(f"Batch download failed: {e}")
+        data = None
+
+    for symbol, yahoo_symbol in yahoo_symbols.items():
+        df = None
+        if data is not None and not data.empty:
+            if hasattr(data.columns, 'levels') and yahoo_symbol in data.columns.get_level_values(0):
+                df = data[yahoo_symbol]
+            elif not hasattr(data.columns, 'levels') and len(yahoo_symbols) == 1:
+                df = data
+        if df is not None:
+            df = df.dropna(subset=['Close'])
+
+        # Fall back to the provider router for symbols the batch download missed
+        if df is None or df.empty:
+            df, provider = market_data_router.fetch_history(yahoo_symbol, start, end)
+            if df is not None:
+                logger.info(f"Fetched {symbol} from {provider}")
+
+        if df is not None and not df.empty:
+            frames[symbol] = df
+        else:
+            logger.warning(f"No history available for {symbol}")
+
+    return frames
+
+def copy_batch(conn, frames):
+    """
+    Bulk-load a batch with COPY into a staging table, then merge into price_history
+
+    Returns:
+        int: Number of bars loaded
+    """
+    buffer = io.StringIO()
+    bars = 0
+    for symbol, df in frames.items():
+        dates = df.index.strftime('%Y-%m-%d')
+        for date, o, h, l, c in zip(dates, df['Open'], df['High'], df['Low'], df['Close']):
+            buffer.write(f"{symbol},{o},{h},{l},{c},{date}\n")
+            bars += 1
+    if bars == 0:
+        return 0
+    buffer.seek(0)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS price_history_staging (
+                symbol VARCHAR(20),
+                open_price DECIMAL(20,8),
+                high_price DECIMAL(20,8),
+                low_price DECIMAL(20,8),
+                close_price DECIMAL(20,8),
+                timestamp TIMESTAMP
+            ) ON COMMIT DELETE ROWS
+        """)
+        cursor.copy_expert("""
+            COPY price_history_staging
+            (symbol, open_price, high_price, low_price, close_price, timestamp)
+            FROM STDIN WITH (FORMAT csv, NULL 'nan')
+        """, buffer)
+        cursor.execute("""
+            INSERT INTO price_history
+            (symbol, open_price, high_price, low_price, close_price, timestamp)
+            SELECT DISTINCT ON (symbol, timestamp)
+                symbol, open_price, high_price, low_price, close_price, timestamp
+            FROM price_history_staging
+            ORDER BY symbol, timestamp
+            ON CONFLICT (symbol, timestamp) DO UPDATE SET
+            open_price = EXCLUDED.open_price,
+            high_price = EXCLUDED.high_price,
+            low_price = EXCLUDED.low_price,
+            close_price = EXCLUDED.close_price,
+            created_at = NOW()
+        """)
+        conn.commit()
+        return bars
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def main():
+    args = parse_args()
+
+    # db_connection reads DATABASE_URL at import time, so set it before importing
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+    from db_connection import db_manager
+
+    symbols = load_symbols(args)
+    if not symbols:
+        print("No symbols given; pass symbols or --symbols-file")
+        return 1
+
+    checkpoint = {'start': args.start, 'end': args.end, 'completed': [], 'failed': [], 'bars': 0}
+    if not args.restart:
+        checkpoint = load_checkpoint(args.checkpoint, args.start, args.end)
+    completed = set(checkpoint['completed'])
+    remaining = [s for s in symbols if s not in completed]
+    if completed:
+        print(f"Resuming: {len(symbols) - len(remaining)} of {len(symbols)} symbols already loaded")
+    if checkpoint['failed']:
+        print(f"Retrying {len(checkpoint['failed'])} symbols that returned no data last run")
+
+    started = time.perf_counter()
+    bars_total = 0
+    conn = db_manager.get_connection()
+    try:
+        for i in range(0, len(remaining), args.batch_size):
+            batch = remaining[i:i + args.batch_size]
+            batch_started = time.perf_counter()
+
+            frames = download_batch(batch, args.start, args.end)
+            bars = copy_batch(conn, frames)
+
+            # Only checkpoint after the batch is committed. Symbols that returned no
+            # data are recorded as failed, not completed, so a resumed run retries them
+            checkpoint['completed'].extend(s for s in batch if s in frames)
+            failed = set(checkpoint['failed']).union(batch).difference(frames)
+            checkpoint['failed'] = [s for s in symbols if s in failed]
+            checkpoint['bars'] += bars
+            save_checkpoint(args.checkpoint, checkpoint)
+
+            bars_total += bars
+            elapsed = time.perf_counter() - started
+            batch_elapsed = time.perf_counter() - batch_started
+            done = len(symbols) - len(remaining) + i + len(batch)
+            print(f"[{done}/{len(symbols)}] {bars} bars for {len(frames)}/{len(batch)} symbols "
+                  f"in {batch_elapsed:.1f}s ({bars / max(batch_elapsed, 1e-9):.0f} bars/s, "
+                  f"overall {bars_total / max(elapsed, 1e-9):.0f} bars/s)")
+    finally:
+        db_manager.release_connection(conn)
+
+    elapsed = time.perf_counter() - started
+    print(f"Backfill complete: {bars_total} bars for {len(remaining)} symbols in {elapsed:.1f}s "
+          f"({bars_total / max(elapsed, 1e-9):.0f} bars/s)")
+    if checkpoint['failed']:
+        print(f"No data for {len(checkpoint['failed'])} symbols, rerun to retry: {' '.join(checkpoint['failed'])}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
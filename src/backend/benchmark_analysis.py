@@ -0,0 +1,297 @@
+"""
+Benchmark the market analysis hot path against recorded fixtures.
+
+Yahoo Finance and NewsAPI calls are replayed from fixtures (see
+fixture_replay.py), so runs need no network, only a local Postgres with the
+finals.sql schema and the migrations in src/sql. Every stage reports latency
+percentiles, peak allocations and database query counts; results can be
+saved as a baseline and later runs compared against it.
+
+Usage:
+    python benchmark_analysis.py --dsn postgresql://localhost/finals2 --generate-fixtures
+    python benchmark_analysis.py --dsn postgresql://localhost/finals2 --save-baseline
+    python benchmark_analysis.py --dsn postgresql://localhost/finals2 --compare
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import shutil
+import json
+import time
+import sys
+import os
+
+DEFAULT_SYMBOLS = ['AAPL', 'MSFT', 'GOOGL', 'EURUSD']
+
+class QueryStats:
+    """Counts statements and database time for every cursor handed out by db_manager"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+class CountingCursor:
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._stats.queries += 1
+            self._stats.seconds += time.perf_counter() - started
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, *args, **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        return self._timed(self._cursor.copy_expert, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class CountingConnection:
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def install_query_counter(db_manager):
+    """Wrap db_manager so every connection it hands out counts its queries"""
+    stats = QueryStats()
+    get_connection = db_manager.get_connection
+    release_connection = db_manager.release_connection
+
+    def counting_get_connection():
+        return CountingConnection(get_connection(), stats)
+
+    def unwrapping_release_connection(connection):
+        if isinstance(connection, CountingConnection):
+            connection = connection._conn
+        return release_connection(connection)
+
+    db_manager.get_connection = counting_get_connection
+    db_manager.release_connection = unwrapping_release_connection
+    return stats
+
+def summarize(timings, queries, db_seconds, peaks):
+    """Percentiles in milliseconds plus per-call query and allocation figures"""
+    t = np.array(timings) * 1000.0
+    return {
+        'n': len(timings),
+        'p50_ms': round(float(np.percentile(t, 50)), 3),
+        'p95_ms': round(float(np.percentile(t, 95)), 3),
+        'p99_ms': round(float(np.percentile(t, 99)), 3),
+        'mean_ms': round(float(t.mean()), 3),
+        'queries_per_call': round(float(np.mean(queries)), 2),
+        'db_ms_per_call': round(float(np.mean(db_seconds)) * 1000.0, 3),
+        'peak_kib': round(float(np.max(peaks)) / 1024.0, 1) if peaks else None
+    }
+
+def run_stage(name, fn, symbols, iterations, stats, setup=None, alloc_iterations=3):
+    """
+    Time fn(symbol) for every symbol and iteration
+
+    Timing and allocation tracking run in separate passes so tracemalloc
+    overhead does not distort the latency numbers.
+    """
+    timings, queries, db_seconds, peaks = [], [], [], []
+
+    # Warm-up call so imports and lazy initialization are not measured
+    if setup:
+        setup(symbols[0])
+    fn(symbols[0])
+
+    for _ in range(iterations):
+        for symbol in symbols:
+            if setup:
+                setup(symbol)
+            stats.reset()
+            started = time.perf_counter()
+            fn(symbol)
+            timings.append(time.perf_counter() - started)
+            queries.append(stats.queries)
+            db_seconds.append(stats.seconds)
+
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            for symbol in symbols:
+                if setup:
+                    setup(symbol)
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                fn(symbol)
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    result = summarize(timings, queries, db_seconds, peaks)
+    print(f"{name:<34} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+          f"p99 {result['p99_ms']:>9.2f}ms  queries {result['queries_per_call']:>6.1f}  "
+          f"db {result['db_ms_per_call']:>8.2f}ms  peak {result['peak_kib']:>9.1f}KiB")
+    return result
+
+def compare(results, baseline, threshold):
+    """Print per-stage change against a baseline; return the stages that regressed"""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('created')} (threshold {threshold:.0%})")
+    for name, current in results.items():
+        previous = baseline.get('stages', {}).get(name)
+        if not previous:
+            print(f"{name:<34} new stage")
+            continue
+        changes = []
+        regressed = False
+        for key in ('p50_ms', 'p95_ms', 'queries_per_call', 'peak_kib'):
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes.append(f"{key} {change:+.1%}")
+            if change > threshold:
+                regressed = True
+        marker = 'REGRESSION' if regressed else 'ok'
+        print(f"{name:<34} {marker:<10} " + ', '.join(changes))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the market analysis hot path")
+    parser.add_argument('--dsn', help="PostgreSQL DSN (overrides DATABASE_URL)")
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_fixtures'),
+                        help="Fixture directory")
+    parser.add_argument('--generate-fixtures', action='store_true', help="Write deterministic fixtures first (no network)")
+    parser.add_argument('--record', action='store_true', help="Record fixtures from the real upstreams first")
+    parser.add_argument('--symbols', nargs='+', default=DEFAULT_SYMBOLS)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--stages', nargs='+', help="Only run stages whose name contains one of these")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="Baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="Save this run as the baseline")
+    parser.add_argument('--compare', action='store_true', help="Compare this run with the baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown reported as a regression")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # db_connection reads DATABASE_URL at import time, so set it before importing
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+
+    from db_connection import db_manager
+    import market_analysis
+    import fixture_replay
+    from market_analysis import get_ticker_data, analyze_stock, store_price_data, generate_synthetic_data, format_symbol_for_yahoo
+    from main import app
+
+    yahoo_symbols = [format_symbol_for_yahoo(s) for s in args.symbols]
+    if args.generate_fixtures:
+        fixture_replay.generate_fixtures(args.fixtures, yahoo_symbols)
+    if args.record:
+        with fixture_replay.record(args.fixtures):
+            end = datetime.now()
+            for symbol in args.symbols:
+                get_ticker_data(format_symbol_for_yahoo(symbol), (end - timedelta(days=30)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+                market_analysis.analyze_sentiment(symbol)
+
+    # Isolate the Yahoo disk cache and lift the hourly limiter for the run
+    cache_dir = tempfile.mkdtemp(prefix='benchmark_cache_')
+    original_cache_dir = market_analysis.CACHE_DIR
+    market_analysis.CACHE_DIR = cache_dir
+    market_analysis.rate_limiter.max_calls = 10 ** 9
+
+    def clear_ticker_cache(symbol):
+        market_analysis.memory_cache.clear()
+        for name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, name))
+
+    stats = install_query_counter(db_manager)
+    client = app.test_client()
+    end = datetime.now()
+    start_str = (end - timedelta(days=30)).strftime('%Y-%m-%d')
+    end_str = end.strftime('%Y-%m-%d')
+    payloads = {}
+
+    def analyze_and_keep(symbol):
+        payloads[symbol] = analyze_stock(symbol)
+
+    stages = [
+        ('get_ticker_data.cold', lambda s: get_ticker_data(format_symbol_for_yahoo(s), start_str, end_str), clear_ticker_cache),
+        ('get_ticker_data.memory', lambda s: get_ticker_data(format_symbol_for_yahoo(s), start_str, end_str), None),
+        ('generate_synthetic_data', lambda s: generate_synthetic_data(s), None),
+        ('analyze_stock.cold', analyze_and_keep, clear_ticker_cache),
+        ('store_price_data', lambda s: store_price_data(s, payloads[s]), None),
+        ('route.market_analysis', lambda s: client.get(f'/api/market-analysis/{s}'), None),
+        ('route.market_analysis.history', lambda s: client.get(f'/api/market-analysis/{s}/history?days=30'), None),
+        ('route.market_trends', lambda s: client.get('/api/market-trends'), None),
+        ('route.batch', lambda s: client.post('/api/market-analysis/batch', json={'symbols': args.symbols}), None),
+    ]
+    if args.stages:
+        stages = [stage for stage in stages if any(f in stage[0] for f in args.stages)]
+    # store_price_data replays payloads produced by analyze_stock
+    if any(name == 'store_price_data' for name, _, _ in stages) and not any(name == 'analyze_stock.cold' for name, _, _ in stages):
+        stages.insert(0, ('analyze_stock.cold', analyze_and_keep, clear_ticker_cache))
+
+    print(f"Benchmarking {len(args.symbols)} symbols x {args.iterations} iterations\n")
+    results = {}
+    try:
+        with fixture_replay.replay(args.fixtures):
+            for name, fn, setup in stages:
+                results[name] = run_stage(name, fn, args.symbols, args.iterations, stats, setup=setup)
+    finally:
+        market_analysis.CACHE_DIR = original_cache_dir
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            exit_code = 1
+        else:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+            if compare(results, baseline, args.threshold):
+                exit_code = 1
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'symbols': args.symbols,
+                'iterations': args.iterations,
+                'stages': results
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from auth import token_required
 from db_connection import db_manager
 import logging
+import os
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -9,25 +10,51 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
 
+# Upper bound for ?sparkline= on GET /api/favorites
+FAVORITES_SPARKLINE_MAX = int(os.environ.get('FAVORITES_SPARKLINE_MAX', 90))
+
 @dashboard_bp.route('/favorites', methods=['GET'])
 @token_required
 def get_favorites(current_user):
-    """Get all favorites for the current user"""
+    """
+    Get all favorites for the current user with their latest market snapshot
+
+    The stored market_data and technical_indicators rows are joined in the
+    same query, so the watchlist renders without a /api/market-analysis call
+    per symbol. Symbols that have never been analyzed come back with
+    market and technical_indicators set to null.
+
+    Query params:
+        sparkline (int): Also return the last N close prices from price_history,
+            oldest first (default 0, max FAVORITES_SPARKLINE_MAX)
+    """
     conn = None
     try:
+        sparkline = max(0, min(request.args.get('sparkline', default=0, type=int), FAVORITES_SPARKLINE_MAX))
+        
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Extract user_id from current_user tuple
-        # current_user[0] is the user_id based on the schema
-        user_id = current_user[0]
-        
-        cursor.execute("""
-            SELECT f.id, f.symbol, f.pair_name, f.created_at
+        user_id = current_user.user_id
+        
+        # Each sparkline is a backward scan of idx_price_history_symbol_timestamp
+        sparkline_column = """,
+                (SELECT array_agg(p.close_price::float8 ORDER BY p.timestamp)
+                 FROM (SELECT close_price, timestamp FROM price_history
+                       WHERE symbol = f.symbol
+                       ORDER BY timestamp DESC
+                       LIMIT %(sparkline)s) p)""" if sparkline else ""
+        cursor.execute(f"""
+            SELECT f.id, f.symbol, f.pair_name, f.created_at,
+                md.current_price::float8, md.change_percentage::float8, md.trend, md.updated_at,
+                ti.rsi::float8, ti.macd::float8, ti.macd_signal::float8, ti.macd_hist::float8,
+                ti.sma20::float8, ti.sma50::float8, ti.sma200::float8, ti.updated_at{sparkline_column}
             FROM favorites f
-            WHERE f.user_id = %s
+            LEFT JOIN market_data md ON md.symbol = f.symbol
+            LEFT JOIN technical_indicators ti ON ti.symbol = f.symbol
+            WHERE f.user_id = %(user_id)s
             ORDER BY f.created_at DESC
-        """, (user_id,))
+        """, {'user_id': user_id, 'sparkline': sparkline})
         
         # Fetch all results
         favorites_rows = cursor.fetchall()
@@ -35,19 +62,38 @@ def get_favorites(current_user):
         # Convert tuple rows to dictionaries
         favorites = []
         for row in favorites_rows:
-            favorites.append({
+            favorite = {
                 'id': row[0],
                 'symbol': row[1],
                 'pair_name': row[2],
-                'created_at': row[3].isoformat() if row[3] else None
-            })
+                'created_at': row[3].isoformat() if row[3] else None,
+                'market': {
+                    'current_price': row[4],
+                    'change_percentage': row[5],
+                    'trend': row[6] or 'Neutral',
+                    'updated_at': row[7].isoformat() if row[7] else None
+                } if row[7] else None,
+                'technical_indicators': {
+                    'rsi': row[8],
+                    'macd': row[9],
+                    'macd_signal': row[10],
+                    'macd_hist': row[11],
+                    'sma20': row[12],
+                    'sma50': row[13],
+                    'sma200': row[14],
+                    'updated_at': row[15].isoformat() if row[15] else None
+                } if row[15] else None
+            }
+            if sparkline:
+                favorite['sparkline'] = row[16] or []
+            favorites.append(favorite)
         
         cursor.close()
         db_manager.release_connection(conn)
         
         return jsonify({'favorites': favorites})
     except Exception as e:
-        logger.error(f"Error fetching favorites for user {current_user[0]}: {e}")
+        logger.error(f"Error fetching favorites for user {current_user.user_id}: {e}")
         if conn:
             db_manager.release_connection(conn)
         return jsonify({'message': 'Failed to retrieve favorites', 'error': str(e)}), 500
@@ -69,8 +115,7 @@ def toggle_favorite(current_user):
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Extract user_id from current_user tuple
-        user_id = current_user[0]
+        user_id = current_user.user_id
         
         # Check if already favorited
         cursor.execute("""
@@ -106,7 +151,7 @@ def toggle_favorite(current_user):
             'message': message
         }), 200
     except Exception as e:
-        logger.error(f"Error toggling favorite for user {current_user[0]}: {e}")
+        logger.error(f"Error toggling favorite for user {current_user.user_id}: {e}")
         if conn:
             db_manager.release_connection(conn)
         return jsonify({
@@ -121,8 +166,7 @@ def check_favorite(current_user, symbol):
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Extract user_id from current_user tuple
-        user_id = current_user[0]
+        user_id = current_user.user_id
         
         cursor.execute("""
             SELECT * FROM favorites 
@@ -137,7 +181,7 @@ def check_favorite(current_user, symbol):
             'isFavorite': is_favorite
         }), 200
     except Exception as e:
-        logger.error(f"Error checking favorite for user {current_user[0]}: {e}")
+        logger.error(f"Error checking favorite for user {current_user.user_id}: {e}")
         if conn:
             db_manager.release_connection(conn)
         return jsonify({
@@ -150,7 +194,7 @@ def get_favorite_symbols(current_user):
     conn = None
     try:
         # Check if user is admin
-        if current_user[4] != 'admin':  # current_user[4] is the role
+        if current_user.role != 'admin':
             return jsonify({
                 'message': 'Unauthorized access'
             }), 403
@@ -2,6 +2,7 @@
 import psycopg2
 from psycopg2 import Error
 from psycopg2 import pool
+from instrumentation import TracingCursor
 import logging
 import os
 import time
@@ -26,6 +27,11 @@ class DatabaseConnection:
         )
         self.logger = logging.getLogger(__name__)
         
+        # Pool size per process (gunicorn workers each get their own pool)
+        self.min_connections = int(os.environ.get('DB_POOL_MIN', 1))
+        self.max_connections = int(os.environ.get('DB_POOL_MAX', 10))
+        self.exhausted_count = 0  # Times getconn found every connection in use
+        
         # Initialize connection pool
         self.connection_pool = None
         self._initialize_pool()
@@ -38,19 +44,21 @@ class DatabaseConnection:
             
             if database_url:
                 self.connection_pool = pool.ThreadedConnectionPool(
-                    minconn=1,  # Minimum number of connections
-                    maxconn=10, # Maximum number of connections
-                    dsn=database_url
+                    minconn=self.min_connections,  # Minimum number of connections
+                    maxconn=self.max_connections, # Maximum number of connections
+                    dsn=database_url,
+                    cursor_factory=TracingCursor  # Times every statement for request traces
                 )
             else:
                 self.connection_pool = pool.ThreadedConnectionPool(
-                    minconn=1,
-                    maxconn=10,
+                    minconn=self.min_connections,
+                    maxconn=self.max_connections,
                     host=self.config['host'],
                     user=self.config['user'],
                     password=self.config['password'],
                     database=self.config['database'],
-                    port=self.config['port']
+                    port=self.config['port'],
+                    cursor_factory=TracingCursor
                 )
                 
             self.logger.info("Successfully initialized PostgreSQL connection pool")
@@ -68,11 +76,17 @@ class DatabaseConnection:
                 
             connection = self.connection_pool.getconn()
             if connection:
-                self.logger.info("Successfully obtained connection from pool")
+                self.logger.debug("Successfully obtained connection from pool")
                 return connection
             else:
                 self.logger.error("Failed to get connection from pool")
                 raise Exception("Failed to get database connection from pool")
+        except pool.PoolError as e:
+            # Every connection is checked out; re-initializing would orphan the
+            # busy connections and open a second pool, so fail this request instead
+            self.exhausted_count += 1
+            self.logger.error(f"Connection pool exhausted ({self.max_connections} connections in use)")
+            raise Exception(f"Failed to establish database connection: {e}")
         except Error as e:
             self.logger.error(f"Error getting connection from pool: {e}")
             # Re-initialize pool if there's an error
@@ -91,10 +105,20 @@ class DatabaseConnection:
         if self.connection_pool and connection:
             try:
                 self.connection_pool.putconn(connection)
-                self.logger.info("Released connection back to pool")
+                self.logger.debug("Released connection back to pool")
             except Error as e:
                 self.logger.error(f"Error releasing connection: {e}")
                 
+    def pool_status(self):
+        """Snapshot of pool usage for this process"""
+        if not self.connection_pool:
+            return {'in_use': 0, 'idle': 0, 'max': self.max_connections, 'exhausted': self.exhausted_count, 'closed': True}
+        # ThreadedConnectionPool keeps checked-out connections in _used and idle ones in _pool
+        with self.connection_pool._lock:
+            in_use = len(self.connection_pool._used)
+            idle = len(self.connection_pool._pool)
+        return {'in_use': in_use, 'idle': idle, 'max': self.max_connections, 'exhausted': self.exhausted_count, 'closed': False}
+    
     def close_all_connections(self):
         """Close all connections in the pool"""
         if self.connection_pool:
@@ -0,0 +1,223 @@
+"""
+Durable outbound email queue.
+
+Request handlers call enqueue_email(), which only inserts a row into
+email_outbox (src/sql/email_outbox.sql), so the response does not wait for
+SMTP. A background OutboxSender in each gunicorn worker claims due rows in
+batches with FOR UPDATE SKIP LOCKED and sends them over one reused SMTP
+connection. Failed sends are retried with exponential backoff until
+EMAIL_MAX_ATTEMPTS, then marked 'failed'. Rows left in 'sending' by a worker
+that died are reclaimed after EMAIL_CLAIM_TIMEOUT.
+
+For local runs point SMTP_SERVER/SMTP_PORT at smtp_sink.py and set
+SMTP_STARTTLS=false.
+
+Environment:
+    EMAIL_OUTBOX_SENDER     Run the sender thread in this process (default true)
+    EMAIL_BATCH_SIZE        Rows claimed per batch (default 20)
+    EMAIL_POLL_INTERVAL     Seconds between polls when idle (default 5)
+    EMAIL_MAX_ATTEMPTS      Attempts before a row is marked failed (default 6)
+    EMAIL_RETRY_BASE        First retry delay in seconds, doubled per attempt (default 30)
+    EMAIL_CLAIM_TIMEOUT     Seconds before a stuck 'sending' row is reclaimed (default 300)
+"""
+from db_connection import db_manager
+from email_service import SMTPConnection, build_message
+from instrumentation import Counter, METRICS
+import threading
+import logging
+import random
+import os
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+EMAIL_POLL_INTERVAL = float(os.environ.get('EMAIL_POLL_INTERVAL', 5))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 6))
+EMAIL_RETRY_BASE = float(os.environ.get('EMAIL_RETRY_BASE', 30))
+EMAIL_CLAIM_TIMEOUT = int(os.environ.get('EMAIL_CLAIM_TIMEOUT', 300))
+
+emails_processed = Counter('marketpulse_emails_total', 'Outbox emails by outcome', ('outcome',))
+METRICS.append(emails_processed)
+
+# Set when new mail is queued so the sender does not wait for the next poll
+_wakeup = threading.Event()
+
+def enqueue_email(to_email, subject, html_body, text_body=None, from_email=None, cursor=None):
+    """
+    Queue an email for background delivery
+
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        html_body (str): HTML body
+        text_body (str, optional): Plain-text body; derived from the HTML when omitted
+        from_email (str, optional): Sender address. Defaults to DEFAULT_FROM_EMAIL.
+        cursor (optional): Cursor of an open transaction. The row is then
+            committed with the caller's own changes and the caller should call
+            wake_sender() after committing.
+
+    Returns:
+        int: The outbox row id
+    """
+    query = """
+        INSERT INTO email_outbox (to_email, from_email, subject, html_body, text_body)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """
+    params = (to_email, from_email, subject, html_body, text_body)
+    if cursor is not None:
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
+
+    conn = db_manager.get_connection()
+    try:
+        with conn.cursor() as own_cursor:
+            own_cursor.execute(query, params)
+            email_id = own_cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_manager.release_connection(conn)
+    wake_sender()
+    return email_id
+
+def wake_sender():
+    _wakeup.set()
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at one hour"""
+    delay = min(EMAIL_RETRY_BASE * (2 ** max(attempts - 1, 0)), 3600)
+    return delay * random.uniform(0.8, 1.2)
+
+class OutboxSender:
+    """Background thread that drains email_outbox over a persistent SMTP connection"""
+    def __init__(self, connection=None, batch_size=EMAIL_BATCH_SIZE, poll_interval=EMAIL_POLL_INTERVAL):
+        self.connection = connection or SMTPConnection()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='email-outbox', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        _wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+        self.connection.close()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                sent = self.process_batch()
+            except Exception as e:
+                logger.error(f"Email outbox batch failed: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                # Queue drained (or erroring); sleep until woken or the next poll
+                self.connection.close_if_idle()
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+    def claim_batch(self):
+        """Mark a batch of due rows as 'sending' and return them"""
+        conn = db_manager.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE email_outbox o
+                    SET status = 'sending', claimed_at = NOW(), attempts = o.attempts + 1
+                    FROM (
+                        SELECT id FROM email_outbox
+                        WHERE (status = 'pending' AND next_attempt_at <= NOW())
+                           OR (status = 'sending' AND claimed_at < NOW() - make_interval(secs => %s))
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ) due
+                    WHERE o.id = due.id
+                    RETURNING o.id, o.to_email, o.from_email, o.subject, o.html_body, o.text_body, o.attempts
+                """, (EMAIL_CLAIM_TIMEOUT, self.batch_size))
+                rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_manager.release_connection(conn)
+
+    def process_batch(self):
+        """Send one claimed batch; returns the number of rows claimed"""
+        rows = self.claim_batch()
+        if not rows:
+            return 0
+
+        sent, retries, failed = [], [], []
+        for email_id, to_email, from_email, subject, html_body, text_body, attempts in rows:
+            try:
+                msg = build_message(to_email, subject, html_body, from_email, text_body=text_body)
+                self.connection.send(msg)
+                sent.append(email_id)
+            except Exception as e:
+                error = str(e)[:500]
+                if attempts >= EMAIL_MAX_ATTEMPTS:
+                    logger.error(f"Giving up on email {email_id} to {to_email} after {attempts} attempts: {e}")
+                    failed.append((error, email_id))
+                else:
+                    logger.warning(f"Email {email_id} attempt {attempts} failed, retrying: {e}")
+                    retries.append((retry_delay(attempts), error, email_id))
+
+        self.record_results(sent, retries, failed)
+        emails_processed.inc('sent', amount=len(sent))
+        emails_processed.inc('retry', amount=len(retries))
+        emails_processed.inc('failed', amount=len(failed))
+        logger.debug("Email outbox batch: %s sent, %s retrying, %s failed", len(sent), len(retries), len(failed))
+        return len(rows)
+
+    def record_results(self, sent, retries, failed):
+        conn = db_manager.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                if sent:
+                    cursor.execute(
+                        "UPDATE email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL WHERE id = ANY(%s)",
+                        (sent,)
+                    )
+                if retries:
+                    cursor.executemany(
+                        """
+                        UPDATE email_outbox
+                        SET status = 'pending', next_attempt_at = NOW() + make_interval(secs => %s), last_error = %s
+                        WHERE id = %s
+                        """,
+                        retries
+                    )
+                if failed:
+                    cursor.executemany(
+                        "UPDATE email_outbox SET status = 'failed', last_error = %s WHERE id = %s",
+                        failed
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_manager.release_connection(conn)
+
+sender = None
+
+def start_sender():
+    """Start this process's sender thread unless EMAIL_OUTBOX_SENDER=false"""
+    global sender
+    if os.environ.get('EMAIL_OUTBOX_SENDER', 'true').lower() == 'false' or sender is not None:
+        return sender
+    sender = OutboxSender()
+    sender.start()
+    return sender
@@ -3,8 +3,10 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+import threading
 import logging
-import datetime
+import time
+from email_templates import render_template, html_to_text
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +17,10 @@ SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
 EMAIL_USERNAME = os.getenv('EMAIL_USERNAME')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@marketpulse.com')
+# Set to false for servers without TLS, such as the local smtp_sink
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() != 'false'
+# Seconds an idle persistent connection is kept open
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,90 +37,11 @@ def get_password_reset_template(username, reset_url):
     Returns:
         str: HTML email body
     """
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Password Reset</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                margin: 0;
-                padding: 0;
-            }}
-            .container {{
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background-color: #1a67df;
-                padding: 20px;
-                text-align: center;
-                color: white;
-                border-radius: 5px 5px 0 0;
-            }}
-            .content {{
-                padding: 20px;
-                background-color: #f9f9f9;
-                border: 1px solid #ddd;
-                border-top: none;
-                border-radius: 0 0 5px 5px;
-            }}
-            .button {{
-                display: inline-block;
-                padding: 10px 20px;
-                margin: 20px 0;
-                background-color: #1a67df;
-                color: white;
-                text-decoration: none;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            .footer {{
-                margin-top: 20px;
-                text-align: center;
-                font-size: 12px;
-                color: #777;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>MarketPulse Password Reset</h1>
-            </div>
-            <div class="content">
-                <p>Hello {username},</p>
-                
-                <p>We received a request to reset your password for your MarketPulse account.</p>
-                
-                <p>Please click the button below to reset your password. This link will expire in 24 hours.</p>
-                
-                <div style="text-align: center;">
-                    <a href="{reset_url}" class="button">Reset My Password</a>
-                </div>
-                
-                <p>If you did not request a password reset, please ignore this email or contact support if you have concerns.</p>
-                
-                <p>Best regards,<br>The MarketPulse Team</p>
-            </div>
-            <div class="footer">
-                <p>&copy; {datetime.datetime.now().year} MarketPulse. All rights reserved.</p>
-                <p>This is an automated email, please do not reply.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    return render_template('password_reset', username=username, reset_url=reset_url).html
 
-def send_email(to_email, subject, body, from_email=None, is_html=True):
+def build_message(to_email, subject, body, from_email=None, is_html=True, text_body=None):
     """
-    Send an email using SMTP
+    Build a multipart message with a plain-text alternative
     
     Args:
         to_email (str): Recipient email address
@@ -122,14 +49,11 @@ def send_email(to_email, subject, body, from_email=None, is_html=True):
         body (str): Email body (HTML or plain text)
         from_email (str, optional): Sender email address. Defaults to DEFAULT_FROM_EMAIL.
         is_html (bool, optional): Whether the body is HTML. Defaults to True.
+        text_body (str, optional): Plain-text alternative. Derived from the HTML when omitted.
         
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        MIMEMultipart: The message, ready for SMTP.send_message
     """
-    if not EMAIL_USERNAME or not EMAIL_PASSWORD:
-        logger.error("Email credentials not configured. Set EMAIL_USERNAME and EMAIL_PASSWORD in .env file")
-        return False
-    
     from_email = from_email or DEFAULT_FROM_EMAIL
     
     # Create message
@@ -138,31 +62,111 @@ def send_email(to_email, subject, body, from_email=None, is_html=True):
     msg['To'] = to_email
     msg['Subject'] = subject
     
-    # Create plain text version (simple fallback)
-    plain_text = body
-    if is_html:
-        # Very basic HTML to text conversion
-        plain_text = body.replace('<p>', '').replace('</p>', '\n\n')
-        plain_text = plain_text.replace('<br>', '\n').replace('<br/>', '\n')
-        plain_text = plain_text.replace('</div>', '\n').replace('</h1>', '\n')
-        # Strip all remaining HTML tags
-        import re
-        plain_text = re.sub(r'<[^>]*>', '', plain_text)
+    # Templates supply their own text part; otherwise derive one from the HTML
+    plain_text = text_body or body
+    if is_html and not text_body:
+        plain_text = html_to_text(body)
     
     # Attach plain text and HTML versions
     msg.attach(MIMEText(plain_text, 'plain'))
     if is_html:
         msg.attach(MIMEText(body, 'html'))
+    return msg
+
+class SMTPConnection:
+    """
+    One authenticated SMTP session reused across messages
     
-    try:
-        # Connect to SMTP server
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+    The connection is opened on first use, checked with NOOP after it has
+    been idle, reopened once if the server dropped it, and closed after
+    SMTP_IDLE_TIMEOUT seconds without traffic (see close_if_idle).
+    """
+    def __init__(self, server=None, port=None, username=None, password=None, starttls=None, idle_timeout=None):
+        self.server = server or SMTP_SERVER
+        self.port = port or SMTP_PORT
+        self.username = EMAIL_USERNAME if username is None else username
+        self.password = EMAIL_PASSWORD if password is None else password
+        self.starttls = SMTP_STARTTLS if starttls is None else starttls
+        self.idle_timeout = SMTP_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.smtp = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+    
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.starttls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        logger.debug("Opened SMTP connection to %s:%s", self.server, self.port)
+        return smtp
+    
+    def _ensure_open(self):
+        if self.smtp is not None and time.monotonic() - self.last_used > 5:
+            try:
+                if self.smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        if self.smtp is None:
+            self.smtp = self._connect()
+    
+    def send(self, msg):
+        """Send a message, reconnecting once if the server closed the session"""
+        with self.lock:
+            self._ensure_open()
+            try:
+                self.smtp.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._close()
+                self.smtp = self._connect()
+                self.smtp.send_message(msg)
+            self.last_used = time.monotonic()
+    
+    def close_if_idle(self):
+        with self.lock:
+            if self.smtp is not None and time.monotonic() - self.last_used > self.idle_timeout:
+                self._close()
+    
+    def close(self):
+        with self.lock:
+            self._close()
+    
+    def _close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.smtp = None
+
+def send_email(to_email, subject, body, from_email=None, is_html=True, text_body=None):
+    """
+    Send an email using SMTP
+    
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        body (str): Email body (HTML or plain text)
+        from_email (str, optional): Sender email address. Defaults to DEFAULT_FROM_EMAIL.
+        is_html (bool, optional): Whether the body is HTML. Defaults to True.
+        text_body (str, optional): Plain-text alternative, e.g. from email_templates. Derived from the HTML when omitted.
         
-        # Send email
-        server.send_message(msg)
-        server.quit()
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    if not EMAIL_USERNAME or not EMAIL_PASSWORD:
+        logger.error("Email credentials not configured. Set EMAIL_USERNAME and EMAIL_PASSWORD in .env file")
+        return False
+    
+    msg = build_message(to_email, subject, body, from_email, is_html, text_body)
+    
+    try:
+        # One-off connection; queued mail goes through email_outbox instead
+        connection = SMTPConnection()
+        connection.send(msg)
+        connection.close()
         
         logger.info(f"Email sent successfully to {to_email}")
         return True
@@ -0,0 +1,201 @@
+"""
+Email templates compiled once and rendered to both HTML and plain text.
+
+A template source uses {{ name }} placeholders. At registration it is split
+into literal segments and field names, and its plain-text alternative is
+derived from the HTML once, so rendering is only string joins. Values are
+HTML-escaped in the HTML part and inserted as-is in the text part.
+
+    rendered = render_template('password_reset', username='ana', reset_url=url)
+    rendered.subject, rendered.html, rendered.text
+
+    for rendered in render_many('price_alert', contexts): ...   # bulk sends
+"""
+from collections import namedtuple
+import datetime
+import html
+import re
+
+PLACEHOLDER_RE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+# HTML to text conversion, applied once per template
+HIDDEN_BLOCK_RE = re.compile(r'<(head|style|script)\b[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+LINK_RE = re.compile(r'<a\b[^>]*\bhref="([^"]*)"[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+BREAK_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+BLOCK_END_RE = re.compile(r'</(p|div|h[1-6]|li|tr|table)>', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]*>')
+LINE_INDENT_RE = re.compile(r'^[ \t]+|[ \t]+$', re.MULTILINE)
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+RenderedEmail = namedtuple('RenderedEmail', ['subject', 'html', 'text'])
+
+def html_to_text(source):
+    """Plain-text version of an HTML body; links keep their URL"""
+    text = HIDDEN_BLOCK_RE.sub('', source)
+    text = LINK_RE.sub(lambda m: f"{TAG_RE.sub('', m.group(2)).strip()} ({m.group(1)})", text)
+    text = BREAK_RE.sub('\n', text)
+    text = BLOCK_END_RE.sub('\n\n', text)
+    text = TAG_RE.sub('', text)
+    text = LINE_INDENT_RE.sub('', text)
+    text = BLANK_LINES_RE.sub('\n\n', text)
+    return html.unescape(text).strip() + '\n'
+
+def _compile(source):
+    """Split a source into alternating literals and field names: [lit, field, lit, ...]"""
+    return PLACEHOLDER_RE.split(source)
+
+def _render(parts, values):
+    out = list(parts)
+    for i in range(1, len(out), 2):
+        out[i] = values[out[i]]
+    return ''.join(out)
+
+class CompiledTemplate:
+    """
+    A subject, HTML and text template parsed once
+
+    Args:
+        name (str): Registry name
+        subject (str): Subject template
+        html_source (str): HTML template
+        text_source (str, optional): Text template; derived from the HTML when omitted
+    """
+    def __init__(self, name, subject, html_source, text_source=None):
+        self.name = name
+        self.subject_parts = _compile(subject)
+        self.html_parts = _compile(html_source)
+        self.text_parts = _compile(text_source if text_source is not None else html_to_text(html_source))
+        self.fields = set(self.subject_parts[1::2]) | set(self.html_parts[1::2]) | set(self.text_parts[1::2])
+
+    def _values(self, context):
+        missing = self.fields - context.keys()
+        if missing:
+            raise KeyError(f"Template {self.name} is missing values for: {', '.join(sorted(missing))}")
+        raw = {name: str(context[name]) for name in self.fields}
+        escaped = {name: html.escape(value) for name, value in raw.items()}
+        return raw, escaped
+
+    def render(self, **context):
+        """Render subject, HTML and text for one recipient"""
+        raw, escaped = self._values(_with_defaults(context))
+        return RenderedEmail(
+            _render(self.subject_parts, raw),
+            _render(self.html_parts, escaped),
+            _render(self.text_parts, raw)
+        )
+
+    def render_many(self, contexts, **shared):
+        """
+        Render one email per context
+
+        Args:
+            contexts (iterable of dict): Per-recipient values
+            **shared: Values common to every recipient
+
+        Returns:
+            generator of RenderedEmail
+        """
+        shared = _with_defaults(shared)
+        for context in contexts:
+            yield self.render(**{**shared, **context})
+
+def _with_defaults(context):
+    if 'year' not in context:
+        context = {**context, 'year': datetime.date.today().year}
+    return context
+
+TEMPLATES = {}
+
+def register_template(name, subject, html_source, text_source=None):
+    TEMPLATES[name] = CompiledTemplate(name, subject, html_source, text_source)
+    return TEMPLATES[name]
+
+def get_template(name):
+    return TEMPLATES[name]
+
+def render_template(name, **context):
+    return TEMPLATES[name].render(**context)
+
+def render_many(name, contexts, **shared):
+    return TEMPLATES[name].render_many(contexts, **shared)
+
+register_template('password_reset', 'MarketPulse Password Reset', """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Password Reset</title>
+        <style>
+            body {
+                font-family: Arial, sans-serif;
+                line-height: 1.6;
+                color: #333;
+                margin: 0;
+                padding: 0;
+            }
+            .container {
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+            }
+            .header {
+                background-color: #1a67df;
+                padding: 20px;
+                text-align: center;
+                color: white;
+                border-radius: 5px 5px 0 0;
+            }
+            .content {
+                padding: 20px;
+                background-color: #f9f9f9;
+                border: 1px solid #ddd;
+                border-top: none;
+                border-radius: 0 0 5px 5px;
+            }
+            .button {
+                display: inline-block;
+                padding: 10px 20px;
+                margin: 20px 0;
+                background-color: #1a67df;
+                color: white;
+                text-decoration: none;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            .footer {
+                margin-top: 20px;
+                text-align: center;
+                font-size: 12px;
+                color: #777;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>MarketPulse Password Reset</h1>
+            </div>
+            <div class="content">
+                <p>Hello {{ username }},</p>
+
+                <p>We received a request to reset your password for your MarketPulse account.</p>
+
+                <p>Please click the button below to reset your password. This link will expire in 24 hours.</p>
+
+                <div style="text-align: center;">
+                    <a href="{{ reset_url }}" class="button">Reset My Password</a>
+                </div>
+
+                <p>If you did not request a password reset, please ignore this email or contact support if you have concerns.</p>
+
+                <p>Best regards,<br>The MarketPulse Team</p>
+            </div>
+            <div class="footer">
+                <p>&copy; {{ year }} MarketPulse. All rights reserved.</p>
+                <p>This is an automated email, please do not reply.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """)
@@ -0,0 +1,219 @@
+"""
+Record and replay upstream responses (Yahoo Finance, NewsAPI) for offline runs.
+
+Fixtures are plain JSON files under a fixture directory:
+    yahoo/<SYMBOL>.json      daily OHLCV bars, filtered by date range on replay
+    newsapi/<key>.json       NewsAPI response keyed by the 'q' parameter
+
+Use record() once with network access to capture real responses, replay()
+for benchmarks and load tests, or generate_fixtures() to build deterministic
+fixtures without any network at all.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+import requests
+import hashlib
+import json
+import os
+
+def _safe_name(symbol):
+    return symbol.replace('^', '_').replace('=', '_').replace('/', '_')
+
+def _news_key(params):
+    query = (params or {}).get('q', '')
+    return hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+
+class FixtureStore:
+    """Reads and writes fixture files in one directory"""
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+        os.makedirs(os.path.join(fixture_dir, 'yahoo'), exist_ok=True)
+        os.makedirs(os.path.join(fixture_dir, 'newsapi'), exist_ok=True)
+
+    def yahoo_path(self, symbol):
+        return os.path.join(self.fixture_dir, 'yahoo', f"{_safe_name(symbol)}.json")
+
+    def news_path(self, params):
+        return os.path.join(self.fixture_dir, 'newsapi', f"{_news_key(params)}.json")
+
+    def save_history(self, symbol, df):
+        data = {
+            'dates': [d.strftime('%Y-%m-%d') for d in df.index],
+            'columns': {col: df[col].astype(float).tolist() for col in df.columns}
+        }
+        with open(self.yahoo_path(symbol), 'w') as f:
+            json.dump(data, f)
+
+    def load_history(self, symbol):
+        path = self.yahoo_path(symbol)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return pd.DataFrame(data['columns'], index=pd.DatetimeIndex(data['dates'], name='Date'))
+
+    def save_news(self, params, payload):
+        with open(self.news_path(params), 'w') as f:
+            json.dump(payload, f)
+
+    def load_news(self, params):
+        path = self.news_path(params)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        # Fall back to any recorded response so unknown queries still get realistic data
+        news_dir = os.path.join(self.fixture_dir, 'newsapi')
+        files = sorted(os.listdir(news_dir))
+        if files:
+            with open(os.path.join(news_dir, files[0]), 'r') as f:
+                return json.load(f)
+        return {'status': 'ok', 'totalResults': 0, 'articles': []}
+
+class _FixtureResponse:
+    """Minimal stand-in for requests.Response"""
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+class _RequestsShim:
+    """Replaces a module's `requests` reference; only NewsAPI GETs are intercepted"""
+    def __init__(self, store, record=False):
+        self.store = store
+        self.record = record
+
+    def get(self, url, params=None, **kwargs):
+        if 'newsapi.org' not in url:
+            return requests.get(url, params=params, **kwargs)
+        if self.record:
+            response = requests.get(url, params=params, **kwargs)
+            self.store.save_news(params, response.json())
+            return response
+        return _FixtureResponse(self.store.load_news(params))
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+class _TickerShim:
+    def __init__(self, store, symbol, record, real_yf):
+        self.store = store
+        self.symbol = symbol
+        self.record = record
+        self.real_yf = real_yf
+
+    def history(self, start=None, end=None, **kwargs):
+        if self.record:
+            df = self.real_yf.Ticker(self.symbol).history(start=start, end=end, **kwargs)
+            if not df.empty:
+                self.store.save_history(self.symbol, df)
+            return df
+        df = self.store.load_history(self.symbol)
+        if df.empty:
+            return df
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df.index < pd.Timestamp(end)]
+        return df
+
+class _YFinanceShim:
+    """Replaces a module's `yf` reference with fixture-backed tickers"""
+    def __init__(self, store, record, real_yf):
+        self.store = store
+        self.record = record
+        self.real_yf = real_yf
+
+    def Ticker(self, symbol):
+        return _TickerShim(self.store, symbol, self.record, self.real_yf)
+
+    def __getattr__(self, name):
+        return getattr(self.real_yf, name)
+
+@contextmanager
+def _patched(fixture_dir, record):
+    import yfinance
+    import market_analysis
+    import sentiment_analysis
+    import news_routes
+
+    store = FixtureStore(fixture_dir)
+    requests_shim = _RequestsShim(store, record=record)
+    patches = [
+        (market_analysis, 'yf', _YFinanceShim(store, record, yfinance)),
+        (sentiment_analysis, 'requests', requests_shim),
+        (news_routes, 'requests', requests_shim),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield store
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+
+def record(fixture_dir):
+    """Context manager: call the real upstreams and save every response as a fixture"""
+    return _patched(fixture_dir, record=True)
+
+def replay(fixture_dir):
+    """Context manager: serve Yahoo Finance and NewsAPI calls from fixtures, no network"""
+    return _patched(fixture_dir, record=False)
+
+SAMPLE_HEADLINES = [
+    "{symbol} rallies as investors cheer strong earnings",
+    "{symbol} slips after cautious guidance",
+    "Analysts see steady growth ahead for {symbol}",
+    "{symbol} shares flat in quiet trading session",
+    "Traders weigh outlook for {symbol} amid rate uncertainty",
+]
+
+def generate_fixtures(fixture_dir, symbols, days=400, seed=42):
+    """
+    Write deterministic fixtures for symbols without touching the network
+
+    Args:
+        fixture_dir (str): Target directory
+        symbols (list): Symbols in Yahoo Finance format (e.g. 'AAPL', 'EURUSD=X')
+        days (int): Calendar days of daily bars ending today
+        seed (int): Random seed for the price walk
+    """
+    store = FixtureStore(fixture_dir)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=datetime.now().date(), periods=int(days * 5 / 7))
+
+    for symbol in symbols:
+        base = 1.2 if symbol.endswith('=X') else rng.uniform(20, 400)
+        close = base * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        open_ = close * (1 + rng.normal(0, 0.003, len(dates)))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, len(dates))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, len(dates))))
+        volume = rng.integers(100000, 5000000, len(dates)).astype(float)
+        df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=dates)
+        store.save_history(symbol, df)
+
+        clean_symbol = symbol.replace('=X', '').replace('^', '')
+        published = datetime.now() - timedelta(hours=1)
+        store.save_news({'q': clean_symbol}, {
+            'status': 'ok',
+            'totalResults': len(SAMPLE_HEADLINES),
+            'articles': [
+                {
+                    'source': {'id': None, 'name': 'Fixture Wire'},
+                    'title': headline.format(symbol=clean_symbol),
+                    'description': headline.format(symbol=clean_symbol),
+                    'url': f"https://example.com/{clean_symbol.lower()}/{i}",
+                    'urlToImage': '',
+                    'publishedAt': (published - timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+                }
+                for i, headline in enumerate(SAMPLE_HEADLINES)
+            ]
+        })
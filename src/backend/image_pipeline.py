@@ -0,0 +1,363 @@
+"""
+Content-addressed storage and background processing for profile images.
+
+Uploads are stored under the SHA-256 of their stored bytes (<digest>.<ext>),
+so the same picture uploaded twice is kept once. Every name is immutable: a
+file is never rewritten once it has its final name, and a new picture gets a
+new name, which lets the serving route send year-long cache headers with the
+name as ETag.
+
+When Pillow is installed, the upload is re-encoded without EXIF/metadata
+before it is hashed and named, so the unstripped bytes are never served. A
+background worker then writes square JPEG thumbnails (<digest>-<size>.jpg)
+for every size in THUMBNAIL_SIZES. Without Pillow, originals are kept as
+uploaded and thumbnail requests fall back to the original.
+
+Environment:
+    THUMBNAIL_SIZES     Comma separated edge lengths in pixels (default 64,256)
+    AVATAR_SIZE         Thumbnail size stored as the user's profile image (default 256)
+    IMAGE_MAX_PIXELS    Largest width x height decoded; bigger images are refused (default 40000000)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NeedData
+from werkzeug.exceptions import RequestEntityTooLarge
+import threading
+import tempfile
+import hashlib
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Pillow not installed; profile images are stored without thumbnails or metadata stripping")
+
+THUMBNAIL_SIZES = tuple(int(s) for s in os.environ.get('THUMBNAIL_SIZES', '64,256').split(',') if s.strip())
+AVATAR_SIZE = int(os.environ.get('AVATAR_SIZE', 256))
+# A few MB of compressed PNG can decode to hundreds of MB, so bound the pixel count
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+if PIL_AVAILABLE:
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+CHUNK_SIZE = 64 * 1024
+# Combined size of the non-file form fields and part count accepted alongside an upload
+FORM_FIELDS_MAX_BYTES = 64 * 1024
+FORM_MAX_PARTS = 16
+
+# <digest>.<ext> or <digest>-<size>.jpg
+STORED_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})(?:-(?P<size>\d+))?\.(?P<ext>png|jpg|jpeg|gif)$')
+
+def original_name(digest, ext):
+    return f"{digest}.{ext}"
+
+def thumbnail_name(digest, size):
+    return f"{digest}-{size}.jpg"
+
+def avatar_name(digest, ext):
+    """Name to store as the profile image: the avatar thumbnail when thumbnails are produced"""
+    if PIL_AVAILABLE and AVATAR_SIZE in THUMBNAIL_SIZES:
+        return thumbnail_name(digest, AVATAR_SIZE)
+    return original_name(digest, ext)
+
+# Leading bytes of each accepted format; the extension is taken from here, not the filename
+MAGIC_NUMBERS = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = 8
+
+class UploadRejected(Exception):
+    """An upload refused while it was being read"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def sniff_image_type(head):
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    return None
+
+class HashingWriter:
+    """
+    Write chunks to a temporary file in the storage folder while hashing them
+
+    Enforces max_bytes as data arrives and sniffs the image type from the
+    first bytes, so an oversized or non-image upload is abandoned early.
+    commit() strips metadata and moves the file to its content-addressed name.
+    """
+    def __init__(self, folder, max_bytes=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.ext = None
+        fd, self.tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+        self.out = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadRejected(f"File is larger than {self.max_bytes / (1024 * 1024):g} MB", 413)
+        if self.ext is None:
+            self.head += chunk[:SNIFF_BYTES]
+            if len(self.head) >= SNIFF_BYTES:
+                self.ext = sniff_image_type(self.head)
+                if self.ext is None:
+                    raise UploadRejected("File is not a PNG, JPEG or GIF image", 415)
+        self.digest.update(chunk)
+        self.out.write(chunk)
+
+    def commit(self):
+        """
+        Returns:
+            tuple: (digest, stored filename, ext, created) where created is False for a duplicate
+        """
+        self.out.close()
+        if self.ext is None:
+            self.ext = sniff_image_type(self.head)
+            if self.ext is None:
+                self.abort()
+                raise UploadRejected("File is not a PNG, JPEG or GIF image", 415)
+        if PIL_AVAILABLE and self.ext != 'gif':
+            try:
+                self.tmp_path, hex_digest = strip_metadata(self.tmp_path, self.ext)
+            except Image.DecompressionBombError as e:
+                logger.info(f"Rejecting oversized image upload: {e}")
+                self.abort()
+                raise UploadRejected("Image dimensions are too large", 413)
+            except Exception as e:
+                logger.info(f"Rejecting undecodable image upload: {e}")
+                self.abort()
+                raise UploadRejected("File is not a valid PNG or JPEG image", 415)
+        else:
+            hex_digest = self.digest.hexdigest()
+        filename = original_name(hex_digest, self.ext)
+        final_path = os.path.join(self.folder, filename)
+        if os.path.exists(final_path):
+            os.remove(self.tmp_path)
+            return hex_digest, filename, self.ext, False
+        os.replace(self.tmp_path, final_path)
+        return hex_digest, filename, self.ext, True
+
+    def abort(self):
+        self.out.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def stream_multipart_upload(request, field_name, folder, max_bytes):
+    """
+    Store one file field of a multipart request without buffering the body
+
+    The body is read from request.stream in CHUNK_SIZE pieces and parsed
+    incrementally; the file part's bytes go straight to a HashingWriter. Do
+    not touch request.files or request.form before calling this.
+
+    The decoder itself is not given a memory limit: werkzeug applies it to its
+    internal buffer plus each incoming chunk, which rejects ordinary images.
+    The file is limited by max_bytes in HashingWriter, and every other part
+    counts towards FORM_FIELDS_MAX_BYTES.
+
+    Args:
+        request: The Flask request
+        field_name (str): Name of the file field
+        folder (str): Storage directory
+        max_bytes (int): Size limit for the file
+
+    Returns:
+        tuple: (digest, stored filename, ext, created)
+
+    Raises:
+        UploadRejected: Missing field, wrong type or too large
+    """
+    if request.mimetype != 'multipart/form-data' or 'boundary' not in request.mimetype_params:
+        raise UploadRejected("Expected a multipart/form-data upload")
+    # Reject before reading anything when the declared body is already too large
+    if request.content_length is not None and request.content_length > max_bytes + FORM_FIELDS_MAX_BYTES:
+        raise UploadRejected(f"File is larger than {max_bytes / (1024 * 1024):g} MB", 413)
+
+    decoder = MultipartDecoder(request.mimetype_params['boundary'].encode('latin-1'), max_parts=FORM_MAX_PARTS)
+    writer = None
+    in_target = False
+    other_bytes = 0
+    result = None
+    try:
+        finished = False
+        while not finished:
+            chunk = request.stream.read(CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File):
+                    in_target = event.name == field_name and result is None and bool(event.filename)
+                    if in_target:
+                        writer = HashingWriter(folder, max_bytes)
+                elif isinstance(event, Data) and in_target:
+                    writer.write(event.data)
+                    if not event.more_data:
+                        result = writer.commit()
+                        writer = None
+                        in_target = False
+                elif isinstance(event, Data):
+                    # Other fields and files are discarded but still bounded
+                    other_bytes += len(event.data)
+                    if other_bytes > FORM_FIELDS_MAX_BYTES:
+                        raise UploadRejected("Form fields are too large", 413)
+                elif isinstance(event, Epilogue):
+                    finished = True
+                    break
+                event = decoder.next_event()
+            if not chunk:
+                break
+    except RequestEntityTooLarge:
+        raise UploadRejected(f"Too many form parts (limit {FORM_MAX_PARTS})", 413)
+    except ValueError as e:
+        # Malformed body
+        raise UploadRejected(f"Invalid upload: {e}")
+    finally:
+        if writer is not None:
+            writer.abort()
+
+    if result is None:
+        raise UploadRejected("No file part")
+    return result
+
+def _atomic_save(image, path, **options):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.thumb-')
+    os.close(fd)
+    try:
+        image.save(tmp_path, **options)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _open_image(path):
+    """
+    Open an image for decoding, refusing anything over IMAGE_MAX_PIXELS
+
+    Pillow only raises past twice MAX_IMAGE_PIXELS (and warns below that), so
+    the limit is checked here from the header, before any pixel is decoded.
+    """
+    image = Image.open(path)
+    if image.width * image.height > IMAGE_MAX_PIXELS:
+        image.close()
+        raise Image.DecompressionBombError(
+            f"Image size ({image.width * image.height} pixels) exceeds limit of {IMAGE_MAX_PIXELS} pixels")
+    return image
+
+def strip_metadata(path, ext):
+    """
+    Re-encode an upload without the EXIF/ICC/text chunks the camera or editor added
+
+    The EXIF orientation is applied first so the picture keeps its rotation.
+    Runs before the file is named, so its digest covers the cleaned bytes.
+
+    Returns:
+        tuple: (path of the cleaned temporary file, its SHA-256 hex digest);
+        the input file is removed
+    """
+    fd, clean_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+    os.close(fd)
+    try:
+        with _open_image(path) as image:
+            image = ImageOps.exif_transpose(image)
+            clean = image.copy()
+            # Palette transparency is image data, not metadata
+            clean.info = {k: v for k, v in image.info.items() if k == 'transparency'}
+            save_format = 'JPEG' if ext in ('jpg', 'jpeg') else 'PNG'
+            clean.save(clean_path, format=save_format, **({'quality': 90} if save_format == 'JPEG' else {}))
+    except Exception:
+        os.remove(clean_path)
+        raise
+    os.remove(path)
+
+    digest = hashlib.sha256()
+    with open(clean_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return clean_path, digest.hexdigest()
+
+def process_image(folder, digest, ext):
+    """Write any missing thumbnails for a stored original"""
+    # Decoding the original is the expensive part, so skip it when nothing is missing
+    missing = {}
+    for size in THUMBNAIL_SIZES:
+        path = os.path.join(folder, thumbnail_name(digest, size))
+        if not os.path.exists(path):
+            missing[size] = path
+    if not missing:
+        return
+    source = os.path.join(folder, original_name(digest, ext))
+    with _open_image(source) as image:
+        image = ImageOps.exif_transpose(image)
+        rgb = image.convert('RGBA')
+        background = Image.new('RGB', rgb.size, (255, 255, 255))
+        background.paste(rgb, mask=rgb.split()[-1])
+        for size, path in missing.items():
+            thumb = ImageOps.fit(background, (size, size), Image.LANCZOS)
+            _atomic_save(thumb, path, format='JPEG', quality=85, optimize=True, progressive=True)
+
+class ImageWorker:
+    """Single background thread processing each new digest once"""
+    def __init__(self, max_workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-worker')
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def submit(self, folder, digest, ext):
+        if not PIL_AVAILABLE:
+            return None
+        with self.lock:
+            if digest in self.pending:
+                return None
+            self.pending.add(digest)
+        return self.executor.submit(self._run, folder, digest, ext)
+
+    def _run(self, folder, digest, ext):
+        try:
+            process_image(folder, digest, ext)
+            logger.debug("Processed profile image %s", digest)
+        except Exception as e:
+            logger.error(f"Failed to process profile image {digest}: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(digest)
+
+image_worker = ImageWorker()
+
+def resolve_stored_file(folder, filename):
+    """
+    Map a requested name to the file to serve
+
+    Returns:
+        tuple: (filename, immutable) or (None, False) when unknown. Stored
+        files never change, so an existing name is always immutable. A
+        thumbnail that has not been generated yet falls back to its original,
+        which is served without the immutable flag so clients pick up the
+        thumbnail later. Sizes outside THUMBNAIL_SIZES are unknown.
+    """
+    match = STORED_NAME_RE.match(filename)
+    if not match:
+        return None, False
+    if match.group('size') and int(match.group('size')) not in THUMBNAIL_SIZES:
+        return None, False
+    if os.path.exists(os.path.join(folder, filename)):
+        return filename, True
+    if match.group('size'):
+        digest = match.group('digest')
+        for ext in ('png', 'jpg', 'jpeg', 'gif'):
+            candidate = original_name(digest, ext)
+            if os.path.exists(os.path.join(folder, candidate)):
+                return candidate, False
+    return None, False
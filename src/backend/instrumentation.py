@@ -0,0 +1,318 @@
+"""
+Per-request tracing and process-wide metrics.
+
+Every Flask request gets a span tree held in a context variable. Code on the
+hot path adds to it with:
+
+    with span('stage', 'analysis.regression'): ...     # timed block
+    with span('upstream', 'yahoo'): ...                # outbound call
+    record_cache('yahoo', 'memory', hit=True)          # cache lookup result
+
+Database queries are traced automatically by TracingCursor, which
+db_connection installs as the default cursor factory. At the end of a request
+the tree is summarized into a Server-Timing header, aggregated into
+Prometheus metrics served at /metrics, logged when slower than
+TRACE_SLOW_REQUEST_MS, and exported through OpenTelemetry when
+OTEL_EXPORTER_OTLP_ENDPOINT is set and the SDK is installed.
+
+Metrics are per process; with several gunicorn workers each worker reports
+its own counters.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import psycopg2.extensions
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+TRACE_SLOW_REQUEST_MS = float(os.environ.get('TRACE_SLOW_REQUEST_MS', 2000))
+
+# Optional OpenTelemetry export
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [bucket counts..., count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, entry in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    labels = _format_labels(self.labels + ('le',), label_values + (str(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels + ('le',), label_values + ('+Inf',))
+                lines.append(f"{self.name}_bucket{labels} {entry[-2]}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_count{labels} {entry[-2]}")
+                lines.append(f"{self.name}_sum{labels} {entry[-1]:.6f}")
+        return lines
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+http_requests = Histogram('marketpulse_http_request_duration_seconds', 'HTTP request latency', ('method', 'endpoint', 'status'))
+db_queries = Histogram('marketpulse_db_query_duration_seconds', 'Database statement latency', ('statement',))
+upstream_calls = Histogram('marketpulse_upstream_request_duration_seconds', 'Outbound API call latency', ('provider', 'outcome'))
+stage_durations = Histogram('marketpulse_stage_duration_seconds', 'Analysis stage latency', ('stage',))
+cache_lookups = Counter('marketpulse_cache_lookups_total', 'Cache lookups by cache, tier and result', ('cache', 'tier', 'result'))
+METRICS = [http_requests, db_queries, upstream_calls, stage_durations, cache_lookups]
+
+class Span:
+    """One timed node in a request's span tree"""
+    __slots__ = ('kind', 'name', 'start', 'end', 'attributes', 'children')
+
+    def __init__(self, kind, name, attributes=None):
+        self.kind = kind
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attributes = attributes or {}
+        self.children = []
+
+    @property
+    def duration(self):
+        return ((self.end or time.time()) - self.start)
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def format_tree(self, depth=0):
+        attrs = ' '.join(f"{k}={v}" for k, v in self.attributes.items())
+        lines = [f"{'  ' * depth}{self.kind}:{self.name} {self.duration * 1000:.1f}ms {attrs}".rstrip()]
+        for child in self.children:
+            lines.extend(child.format_tree(depth + 1))
+        return lines
+
+_current_span = ContextVar('current_span', default=None)
+
+def current_span():
+    return _current_span.get()
+
+@contextmanager
+def span(kind, name, **attributes):
+    """
+    Time a block as a child of the current span
+
+    Args:
+        kind (str): 'stage', 'upstream', 'db' or 'cache'
+        name (str): Stage or provider name
+        **attributes: Extra attributes shown in traces
+    """
+    parent = _current_span.get()
+    node = Span(kind, name, attributes)
+    if parent is not None:
+        parent.children.append(node)
+    token = _current_span.set(node)
+    try:
+        yield node
+    except Exception:
+        node.attributes['error'] = True
+        raise
+    finally:
+        node.end = time.time()
+        _current_span.reset(token)
+        if kind == 'stage':
+            stage_durations.observe(node.end - node.start, name)
+        elif kind == 'upstream':
+            upstream_calls.observe(node.end - node.start, name, 'error' if node.attributes.get('error') else 'ok')
+
+def record_cache(cache, tier, hit):
+    """Count a cache lookup and attach it to the current span"""
+    result = 'hit' if hit else 'miss'
+    cache_lookups.inc(cache, tier, result)
+    parent = _current_span.get()
+    if parent is not None:
+        node = Span('cache', f"{cache}.{tier}", {'result': result})
+        node.end = node.start
+        parent.children.append(node)
+
+class TracingCursor(psycopg2.extensions.cursor):
+    """Cursor that times every statement and adds it to the current span tree"""
+    def _traced(self, method, query, *args, **kwargs):
+        started = time.time()
+        try:
+            return method(query, *args, **kwargs)
+        finally:
+            ended = time.time()
+            statement = _statement_type(query)
+            db_queries.observe(ended - started, statement)
+            parent = _current_span.get()
+            if parent is not None:
+                node = Span('db', statement)
+                node.start = started
+                node.end = ended
+                parent.children.append(node)
+
+    def execute(self, query, vars=None):
+        return self._traced(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._traced(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._traced(super().copy_expert, sql, file, size)
+
+def _statement_type(query):
+    if isinstance(query, bytes):
+        query = query[:32].decode('utf-8', 'ignore')
+    elif not isinstance(query, str):
+        return 'OTHER'
+    words = query.lstrip(' \n\t(').split(None, 1)
+    return words[0].upper() if words else 'OTHER'
+
+def server_timing(root):
+    """Summarize a span tree as a Server-Timing header value"""
+    totals = {}
+    counts = {}
+    cache_results = {}
+    for node in root.walk():
+        if node is root:
+            continue
+        if node.kind == 'cache':
+            result = node.attributes.get('result')
+            cache_results[result] = cache_results.get(result, 0) + 1
+            continue
+        key = node.kind if node.kind in ('db', 'upstream') else f"stage.{node.name}"
+        # Durations are summed per kind (db, upstream) or per stage name
+        totals[key] = totals.get(key, 0.0) + node.duration
+        counts[key] = counts.get(key, 0) + 1
+
+    parts = []
+    for key, total in totals.items():
+        metric = key.replace('.', '-')
+        desc = f'{counts[key]} queries' if key == 'db' else f'{counts[key]} calls' if key == 'upstream' else key[6:]
+        parts.append(f'{metric};dur={total * 1000:.1f};desc="{desc}"')
+    if cache_results:
+        desc = ' '.join(f"{k} {v}" for k, v in sorted(cache_results.items()))
+        parts.append(f'cache;desc="{desc}"')
+    parts.append(f'total;dur={root.duration * 1000:.1f}')
+    return ', '.join(parts)
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+class _OtelExporter:
+    """Replays finished span trees into OpenTelemetry"""
+    def __init__(self):
+        provider = TracerProvider(resource=Resource.create({'service.name': os.environ.get('OTEL_SERVICE_NAME', 'marketpulse-api')}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.tracer = provider.get_tracer('marketpulse')
+
+    def export(self, node, parent_context=None):
+        otel_span = self.tracer.start_span(
+            f"{node.kind} {node.name}",
+            context=parent_context,
+            start_time=int(node.start * 1e9),
+            attributes={str(k): str(v) for k, v in node.attributes.items()}
+        )
+        context = otel_trace.set_span_in_context(otel_span)
+        for child in node.children:
+            self.export(child, context)
+        otel_span.end(end_time=int((node.end or time.time()) * 1e9))
+
+def init_app(app):
+    """Install request tracing, the Server-Timing header and the /metrics endpoint"""
+    from flask import request, g, Response
+
+    exporter = None
+    if os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT'):
+        if OTEL_AVAILABLE:
+            exporter = _OtelExporter()
+        else:
+            logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk is not installed")
+
+    @app.before_request
+    def start_trace():
+        root = Span('request', f"{request.method} {request.path}")
+        g.trace_root = root
+        g.trace_token = _current_span.set(root)
+
+    @app.after_request
+    def finish_trace(response):
+        root = g.pop('trace_root', None)
+        if root is None:
+            return response
+        root.end = time.time()
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.observe(root.duration, request.method, endpoint, response.status_code)
+        response.headers['Server-Timing'] = server_timing(root)
+        response.headers['Timing-Allow-Origin'] = '*'
+
+        if root.duration * 1000 >= TRACE_SLOW_REQUEST_MS:
+            logger.warning("Slow request trace:\n" + '\n'.join(root.format_tree()))
+        if exporter is not None:
+            try:
+                exporter.export(root)
+            except Exception as e:
+                logger.error(f"OpenTelemetry export failed: {e}")
+        return response
+
+    @app.teardown_request
+    def clear_trace(exception=None):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            _current_span.reset(token)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
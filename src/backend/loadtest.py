@@ -0,0 +1,282 @@
+"""
+Load test the Flask API with simulated dashboard users.
+
+Each virtual user logs in, then loops through realistic journeys (dashboard
+favorites, market analysis pages, market trends, forex news) with random
+think time. For each gunicorn configuration the app is started from
+loadtest_wsgi (upstreams replayed from fixtures, local Postgres) and the
+report shows throughput, p50/p95/p99 latency and error rate per endpoint,
+plus connection pool usage sampled from /health.
+
+Usage:
+    python loadtest.py --dsn postgresql://localhost/finals2 --configs 1x4 2x8 4x8 --users 200
+    python loadtest.py --url http://localhost:5000 --users 50   # existing server
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import subprocess
+import threading
+import argparse
+import requests
+import random
+import json
+import time
+import sys
+import os
+
+DEFAULT_SYMBOLS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'EURUSD', 'GBPUSD']
+
+class Results:
+    """Thread-safe collection of (endpoint, latency, ok) samples"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.pool_samples = []
+
+    def add(self, name, elapsed, ok, error=None):
+        with self.lock:
+            self.samples.setdefault(name, []).append((elapsed, ok))
+            if not ok and error:
+                counts = self.errors.setdefault(name, {})
+                counts[error] = counts.get(error, 0) + 1
+
+    def report(self, duration):
+        rows = {}
+        total = errors = 0
+        for name, samples in sorted(self.samples.items()):
+            latencies = np.array([s[0] for s in samples]) * 1000.0
+            failed = sum(1 for s in samples if not s[1])
+            total += len(samples)
+            errors += failed
+            rows[name] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / duration, 2),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+                'error_rate': round(failed / len(samples), 4),
+                'errors': self.errors.get(name, {})
+            }
+        pool = {}
+        if self.pool_samples:
+            in_use = [p.get('in_use', 0) for p in self.pool_samples]
+            pool = {
+                'max_in_use': max(in_use),
+                'mean_in_use': round(float(np.mean(in_use)), 2),
+                'pool_max': self.pool_samples[-1].get('max'),
+                'exhausted': max(p.get('exhausted', 0) for p in self.pool_samples)
+            }
+        return {
+            'duration_s': round(duration, 1),
+            'requests': total,
+            'throughput_rps': round(total / duration, 2),
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'endpoints': rows,
+            'pool': pool
+        }
+
+class VirtualUser:
+    """One simulated dashboard user with its own HTTP session and token"""
+    def __init__(self, base_url, index, args, results):
+        self.base_url = base_url.rstrip('/')
+        self.email = f"{args.user_prefix}{index}@example.com"
+        self.username = f"{args.user_prefix}{index}"
+        self.password = args.password
+        self.symbols = args.symbols
+        self.think = args.think
+        self.results = results
+        self.rng = random.Random(index)
+        self.session = requests.Session()
+        self.token = None
+
+    def request(self, name, method, path, record=True, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, headers=headers, timeout=30, **kwargs)
+            ok = response.status_code < 400
+            error = None if ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            response, ok, error = None, False, type(e).__name__
+        if record:
+            self.results.add(name, time.perf_counter() - started, ok, error)
+        return response
+
+    def setup(self):
+        """Make sure the account exists and has a few favorites (not measured)"""
+        response = self.request('login', 'POST', '/api/auth/login', record=False,
+                                json={'email': self.email, 'password': self.password})
+        if response is not None and response.status_code == 404:
+            self.request('register', 'POST', '/api/auth/register', record=False,
+                         json={'username': self.username, 'email': self.email, 'password': self.password})
+        self.login(record=False)
+        if not self.token:
+            return False
+        for symbol in self.rng.sample(self.symbols, min(3, len(self.symbols))):
+            check = self.request('favorites.check', 'GET', f'/api/favorites/check/{symbol}', record=False)
+            if check is not None and check.ok and not check.json().get('isFavorite'):
+                self.request('favorites.toggle', 'POST', '/api/favorites/toggle', record=False,
+                             json={'symbol': symbol, 'pair_name': symbol})
+        return True
+
+    def login(self, record=True):
+        self.token = None
+        response = self.request('login', 'POST', '/api/auth/login', record=record,
+                                json={'email': self.email, 'password': self.password})
+        if response is not None and response.ok:
+            self.token = response.json().get('token')
+
+    def pause(self):
+        time.sleep(self.rng.expovariate(1.0 / self.think) if self.think > 0 else 0)
+
+    def journey(self):
+        """One visit: dashboard, a couple of analysis pages, trends and news"""
+        if not self.token or self.rng.random() < 0.05:
+            self.login()
+            self.pause()
+        self.request('favorites', 'GET', '/api/favorites')
+        self.request('market_trends', 'GET', '/api/market-trends')
+        self.pause()
+        for symbol in self.rng.sample(self.symbols, self.rng.randint(1, min(3, len(self.symbols)))):
+            self.request('market_analysis', 'GET', f'/api/market-analysis/{symbol}')
+            self.pause()
+        if self.rng.random() < 0.5:
+            self.request('news_forex', 'GET', '/api/news/forex', params={'page': self.rng.randint(1, 3)})
+            self.pause()
+
+    def run(self, stop_at):
+        while time.time() < stop_at:
+            self.journey()
+
+def sample_pool(base_url, results, stop_event, interval=1.0):
+    """Poll /health for pool usage (one gunicorn worker answers each poll)"""
+    while not stop_event.is_set():
+        try:
+            pool = requests.get(f"{base_url}/health", timeout=5).json().get('pool')
+            if pool:
+                with results.lock:
+                    results.pool_samples.append(pool)
+        except (requests.RequestException, ValueError):
+            pass
+        stop_event.wait(interval)
+
+def run_load(base_url, args):
+    results = Results()
+    users = [VirtualUser(base_url, i, args, results) for i in range(args.users)]
+
+    print(f"Preparing {len(users)} users")
+    with ThreadPoolExecutor(max_workers=min(32, len(users))) as executor:
+        ready = [u for u, ok in zip(users, executor.map(lambda u: u.setup(), users)) if ok]
+    if not ready:
+        print("No user could log in; check the database and --dsn")
+        return None
+
+    stop_event = threading.Event()
+    sampler = threading.Thread(target=sample_pool, args=(base_url, results, stop_event), daemon=True)
+    sampler.start()
+
+    print(f"Running {len(ready)} users for {args.duration}s (ramp-up {args.ramp}s)")
+    started = time.time()
+    stop_at = started + args.ramp + args.duration
+    threads = []
+    for i, user in enumerate(ready):
+        # Spread user start times across the ramp-up period
+        delay = args.ramp * i / len(ready)
+        thread = threading.Thread(target=lambda u=user, d=delay: (time.sleep(d), u.run(stop_at)), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    stop_event.set()
+    sampler.join()
+    return results.report(time.time() - started)
+
+def start_server(workers, threads, port, env):
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        ['gunicorn', '-w', str(workers), '--threads', str(threads), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'loadtest_wsgi:app'],
+        cwd=backend_dir, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("gunicorn did not become healthy within 60s")
+
+def print_report(label, report):
+    print(f"\n== {label}: {report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}, "
+          f"{report['requests']} requests in {report['duration_s']}s")
+    print(f"{'endpoint':<18}{'reqs':>8}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>9}")
+    for name, row in report['endpoints'].items():
+        print(f"{name:<18}{row['requests']:>8}{row['rps']:>9}{row['p50_ms']:>9}ms{row['p95_ms']:>9}ms"
+              f"{row['p99_ms']:>9}ms{row['error_rate']:>9.2%}")
+        for error, count in row['errors'].items():
+            print(f"{'':<18}  {error}: {count}")
+    if report['pool']:
+        pool = report['pool']
+        print(f"pool: max in use {pool['max_in_use']}/{pool['pool_max']}, mean {pool['mean_in_use']}, "
+              f"exhausted {pool['exhausted']} times (per worker)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the MarketPulse API")
+    parser.add_argument('--url', help="Test an already running server instead of starting gunicorn")
+    parser.add_argument('--configs', nargs='+', default=['1x4', '2x8', '4x8'],
+                        help="gunicorn WORKERSxTHREADS configurations to test")
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--dsn', help="PostgreSQL DSN for the server (overrides DATABASE_URL)")
+    parser.add_argument('--users', type=int, default=100, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=int, default=60, help="Seconds of steady load after ramp-up")
+    parser.add_argument('--ramp', type=int, default=10, help="Seconds over which users start")
+    parser.add_argument('--think', type=float, default=1.0, help="Mean think time between requests in seconds")
+    parser.add_argument('--symbols', nargs='+', default=DEFAULT_SYMBOLS)
+    parser.add_argument('--user-prefix', default='loadtest')
+    parser.add_argument('--password', default='loadtest-password')
+    parser.add_argument('--output', help="Write all reports to this JSON file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    reports = {}
+
+    if args.url:
+        report = run_load(args.url, args)
+        if report:
+            print_report(args.url, report)
+            reports[args.url] = report
+    else:
+        env = dict(os.environ)
+        if args.dsn:
+            env['DATABASE_URL'] = args.dsn
+        for config in args.configs:
+            workers, threads = (int(x) for x in config.lower().split('x'))
+            process, base_url = start_server(workers, threads, args.port, env)
+            try:
+                report = run_load(base_url, args)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            if report:
+                label = f"{workers} workers x {threads} threads"
+                print_report(label, report)
+                reports[label] = report
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nWrote {args.output}")
+    return 0 if reports else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
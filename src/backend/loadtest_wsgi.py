@@ -0,0 +1,31 @@
+"""
+WSGI entry point for load tests: the real Flask app with Yahoo Finance and
+NewsAPI replayed from fixtures, so runs never touch the network.
+
+    gunicorn -w 2 --threads 8 loadtest_wsgi:app
+
+Set LOADTEST_FIXTURES to use a specific fixture directory; deterministic
+fixtures are generated there if it is empty.
+"""
+import os
+import fixture_replay
+
+FIXTURE_DIR = os.environ.get(
+    'LOADTEST_FIXTURES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_fixtures')
+)
+LOADTEST_SYMBOLS = os.environ.get('LOADTEST_SYMBOLS', 'AAPL,MSFT,GOOGL,AMZN,TSLA,EURUSD=X,GBPUSD=X').split(',')
+
+yahoo_dir = os.path.join(FIXTURE_DIR, 'yahoo')
+if not os.path.isdir(yahoo_dir) or not os.listdir(yahoo_dir):
+    fixture_replay.generate_fixtures(FIXTURE_DIR, LOADTEST_SYMBOLS)
+
+from main import app
+import market_analysis
+
+# The hourly Yahoo limiter would otherwise dominate every run
+market_analysis.rate_limiter.max_calls = 10 ** 9
+
+# Replay stays active for the lifetime of the worker
+_replay = fixture_replay.replay(FIXTURE_DIR)
+_replay.__enter__()
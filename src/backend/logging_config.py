@@ -0,0 +1,144 @@
+"""
+Process-wide logging setup: structured output, per-module levels, a
+non-blocking queue handler and rate limiting of repetitive messages.
+
+Call configure_logging() once before the other backend modules are imported
+(main.py does this); their own logging.basicConfig calls then become no-ops.
+
+Environment:
+    LOG_LEVEL             Root level (default INFO)
+    LOG_LEVELS            Per-logger levels, e.g. "db_connection=WARNING,market_analysis=DEBUG"
+    LOG_FORMAT            'json' (default) or 'text'
+    LOG_RATE_LIMIT        Records below WARNING allowed per call site per interval (default 5, 0 disables)
+    LOG_RATE_INTERVAL     Rate limit interval in seconds (default 10)
+"""
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+import threading
+import logging
+import atexit
+import queue
+import json
+import sys
+import os
+
+# Attributes every LogRecord has; anything else was passed via extra= and is emitted as a field
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message and extra fields"""
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'line': f"{record.module}:{record.lineno}",
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most `limit` records per call site through per `interval` seconds
+
+    Applies only below WARNING, so errors are never dropped. The first record
+    after a suppressed window carries a 'suppressed' count.
+    """
+    def __init__(self, limit=5, interval=10.0):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.windows = {}  # (logger, pathname, lineno) -> [window start, count, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [record.created, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that defers formatting to the listener thread"""
+    def prepare(self, record):
+        # Resolve the message now (args may change later) but leave formatting to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block a request thread when the writer falls behind
+            pass
+
+_listener = None
+
+def parse_levels(spec):
+    """Parse "name=LEVEL,name=LEVEL" into a dict"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging():
+    """Install the queue handler on the root logger (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        formatter = JsonFormatter()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(
+        limit=int(os.environ.get('LOG_RATE_LIMIT', 5)),
+        interval=float(os.environ.get('LOG_RATE_INTERVAL', 10))
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    for name, level in parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
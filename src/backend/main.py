@@ -1,4 +1,8 @@
 # main.py
+# Configure logging before the blueprints import and call logging.basicConfig
+from logging_config import configure_logging
+configure_logging()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from auth import auth_bp
@@ -8,9 +12,16 @@ from user_settings_routes import settings_bp  # Import the settings blueprint
 from market_analysis_routes import market_analysis_bp  # Import the market analysis blueprint
 from admin_settings_routes import admin_settings_bp  # Import the admin settings blueprint
 from news_routes import news_bp  # Import the news blueprint
+from password_reset_routes import password_reset_bp
+from upload_profile_image import register_upload_routes
 from db_connection import db_manager
 from market_analysis import analyze_stock
+from instrumentation import init_app as init_instrumentation
+from password_hashing import init_app as init_password_hashing
+from email_outbox import start_sender as start_email_sender
+from admin_rollups import start_rollup_refresher
 import os
+import atexit
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,6 +29,8 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'fb4f4f255fb38f23a4d7379be97c837b')
+# Upper bound on any request body; reads past it fail with 413 instead of filling memory or disk
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 8 * 1024 * 1024))
 
 # Configure CORS to allow requests from any origin to ensure maximum compatibility
 CORS(app, 
@@ -25,7 +38,7 @@ CORS(app,
      allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Accept"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
      supports_credentials=True,
-     expose_headers=["Content-Type", "Authorization"])
+     expose_headers=["Content-Type", "Authorization", "Server-Timing"])
 
 # Additional CORS headers added to all responses
 @app.after_request
@@ -40,6 +53,18 @@ def after_request(response):
     response.headers.add('X-API-Version', '1.0')
     return response
 
+# Request tracing, Server-Timing headers and /metrics
+init_instrumentation(app)
+
+# 503 with Retry-After when the password hashing pool is saturated
+init_password_hashing(app)
+
+# Background delivery of queued emails (password resets)
+start_email_sender()
+
+# Keeps the admin summary rollup tables current
+start_rollup_refresher()
+
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp)
@@ -48,6 +73,8 @@ app.register_blueprint(settings_bp)  # Register the settings blueprint
 app.register_blueprint(market_analysis_bp)  # Register the market analysis blueprint
 app.register_blueprint(admin_settings_bp)  # Register the admin settings blueprint
 app.register_blueprint(news_bp)  # Register the news blueprint
+app.register_blueprint(password_reset_bp)
+register_upload_routes(app)  # Profile image upload and serving
 
 # Root route for testing
 @app.route('/', methods=['GET'])
@@ -75,15 +102,14 @@ def analyze_market():
     result = analyze_stock(symbol)
     return jsonify(result)
 
-@app.teardown_appcontext
-def close_db_connection(exception=None):
-    """Ensure database connection is closed when app context tears down"""
-    db_manager.close_all_connections()
+# Close the pool once at shutdown; closing it per request would drop connections
+# that concurrent requests still hold and reconnect on every request
+atexit.register(db_manager.close_all_connections)
 
 # Health check endpoint for Render
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy"}), 200
+    return jsonify({"status": "healthy", "pool": db_manager.pool_status()}), 200
 
 if __name__ == '__main__':
     # Use PORT from environment variables for Render compatibility
@@ -1,8 +1,9 @@
 from fastapi import FastAPI
-import random
 import time
+import os
+import threading
+import numpy as np
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
 
 app = FastAPI()
 
@@ -15,44 +16,163 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Simulation settings (override with environment variables for load testing)
+TICK_INTERVAL_MS = float(os.environ.get('SIM_TICK_INTERVAL_MS', 1000))  # Milliseconds between ticks
+SYNTHETIC_INSTRUMENTS = int(os.environ.get('SIM_SYNTHETIC_INSTRUMENTS', 0))  # Extra SYN0001-style instruments
+SIM_MODEL = os.environ.get('SIM_MODEL', 'gbm')  # 'gbm' or 'mean_reverting'
+SIM_CORRELATION = float(os.environ.get('SIM_CORRELATION', 0.3))  # Pairwise correlation of price shocks
+SIM_HISTORY_LENGTH = int(os.environ.get('SIM_HISTORY_LENGTH', 3600))  # Ticks of history kept per pair
+
 # Simulated forex pairs
 forex_pairs = ["EUR/USD", "GBP/USD", "USD/JPY", "AUD/USD", "USD/CAD"]
-market_data: Dict[str, Dict] = {}
-
-# Initialize market data
-def generate_initial_data():
-    for pair in forex_pairs:
-        base_price = round(random.uniform(1.0, 1.5), 5)
-        spread = round(random.uniform(0.0001, 0.0005), 5)
-        market_data[pair] = {
-            "buy": round(base_price + spread, 5),
-            "sell": base_price,
-            "spread": spread,
-            "history": [(int(time.time()), base_price)]  # Timestamp, price
-        }
-
-generate_initial_data()
+forex_pairs += [f"SYN{i:04d}" for i in range(1, SYNTHETIC_INSTRUMENTS + 1)]
+
+
+class PriceSimulator:
+    """
+    Vectorized price engine that advances every instrument in one NumPy step.
+
+    Prices follow either geometric Brownian motion ('gbm') or an Ornstein-Uhlenbeck
+    process around the starting price ('mean_reverting'). Shocks are correlated
+    either through a single common factor with constant pairwise correlation, or
+    through an explicit correlation matrix (Cholesky factorised once at start-up).
+    History is kept in a fixed-size ring buffer so memory stays flat no matter how
+    long the simulation runs.
+    """
+    def __init__(self, pairs, model='gbm', volatility=0.00015, correlation=0.3,
+                 correlation_matrix=None, mean_reversion=0.05, history_length=3600, seed=None):
+        """
+        Args:
+            pairs (list): Instrument names
+            model (str): 'gbm' or 'mean_reverting'
+            volatility (float): Relative volatility per sqrt(second)
+            correlation (float): Constant pairwise correlation used by the one-factor model
+            correlation_matrix (array, optional): Full correlation matrix, overrides correlation
+            mean_reversion (float): Reversion speed per second for the mean-reverting model
+            history_length (int): Number of ticks kept per instrument
+            seed (int, optional): Seed for reproducible runs
+        """
+        if model not in ('gbm', 'mean_reverting'):
+            raise ValueError(f"Unknown simulation model: {model}")
+
+        self.pairs = list(pairs)
+        self.index = {pair: i for i, pair in enumerate(self.pairs)}
+        self.model = model
+        self.volatility = volatility
+        self.correlation = min(max(correlation, 0.0), 1.0)
+        self.mean_reversion = mean_reversion
+        self.history_length = history_length
+        self.rng = np.random.default_rng(seed)
+
+        n = len(self.pairs)
+        self.cholesky = np.linalg.cholesky(np.asarray(correlation_matrix, dtype=float)) if correlation_matrix is not None else None
+
+        # Initial state mirrors the original random.uniform ranges
+        self.sell = np.round(self.rng.uniform(1.0, 1.5, n), 5)
+        self.mean_price = self.sell.copy()
+        self.spread = np.round(self.rng.uniform(0.0001, 0.0005, n), 5)
+
+        # Ring buffer of (timestamp, price) per instrument
+        self.history_times = np.zeros(history_length, dtype=np.float64)
+        self.history_prices = np.zeros((history_length, n), dtype=np.float64)
+        self.history_count = 0
+        self.history_pos = 0
+        self._record(round(time.time(), 3))
+
+    def _shocks(self):
+        """Draw one vector of correlated standard normal shocks"""
+        n = len(self.pairs)
+        z = self.rng.standard_normal(n)
+        if self.cholesky is not None:
+            return self.cholesky @ z
+        if self.correlation > 0:
+            common = self.rng.standard_normal()
+            return np.sqrt(self.correlation) * common + np.sqrt(1 - self.correlation) * z
+        return z
+
+    def _record(self, timestamp):
+        self.history_times[self.history_pos] = timestamp
+        self.history_prices[self.history_pos] = self.sell
+        self.history_pos = (self.history_pos + 1) % self.history_length
+        self.history_count = min(self.history_count + 1, self.history_length)
+
+    def step(self, dt):
+        """
+        Advance all instruments by dt seconds
+
+        Args:
+            dt (float): Time step in seconds
+        """
+        shocks = self._shocks() * self.volatility * np.sqrt(dt)
+        if self.model == 'gbm':
+            self.sell = self.sell * np.exp(shocks - 0.5 * (self.volatility ** 2) * dt)
+        else:
+            pull = self.mean_reversion * dt * (self.mean_price - self.sell)
+            self.sell = self.sell + pull + self.sell * shocks
+        # Prices keep full precision internally and are rounded only when served,
+        # otherwise millisecond ticks would be swallowed by the 5-decimal rounding
+        self.spread = np.round(self.rng.uniform(0.0001, 0.0005, len(self.pairs)), 5)
+        self._record(round(time.time(), 3))
+
+    def snapshot(self, include_history=False):
+        """Return the current quotes in the /markets response format"""
+        buy = np.round(self.sell + self.spread, 5).tolist()
+        sell = np.round(self.sell, 5).tolist()
+        spread = self.spread.tolist()
+        data = {}
+        for i, pair in enumerate(self.pairs):
+            data[pair] = {
+                "buy": buy[i],
+                "sell": sell[i],
+                "spread": spread[i]
+            }
+            if include_history:
+                data[pair]["history"] = self.history(pair)
+        return data
+
+    def history(self, pair):
+        """Return (timestamp, price) tuples for a pair, oldest first"""
+        i = self.index.get(pair)
+        if i is None:
+            return []
+        order = (np.arange(self.history_count) + self.history_pos - self.history_count) % self.history_length
+        return list(zip(self.history_times[order].tolist(), np.round(self.history_prices[order, i], 5).tolist()))
+
+
+simulator = PriceSimulator(
+    forex_pairs,
+    model=SIM_MODEL,
+    correlation=SIM_CORRELATION,
+    history_length=SIM_HISTORY_LENGTH
+)
+
+simulator_lock = threading.Lock()
 
 # Update prices dynamically
 def update_prices():
+    interval = TICK_INTERVAL_MS / 1000.0
+    next_tick = time.monotonic() + interval
     while True:
-        time.sleep(1)
-        for pair in forex_pairs:
-            change = round(random.uniform(-0.0003, 0.0003), 5)
-            new_price = round(market_data[pair]["sell"] + change, 5)
-            spread = round(random.uniform(0.0001, 0.0005), 5)
-            market_data[pair]["sell"] = new_price
-            market_data[pair]["buy"] = round(new_price + spread, 5)
-            market_data[pair]["spread"] = spread
-            market_data[pair]["history"].append((int(time.time()), new_price))
+        # Sleep until the next scheduled tick so the tick rate does not drift
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -interval:
+            # Fell behind (e.g. very large instrument universe); skip missed ticks
+            next_tick = time.monotonic()
+        with simulator_lock:
+            simulator.step(interval)
+        next_tick += interval
 
-import threading
 threading.Thread(target=update_prices, daemon=True).start()
 
 @app.get("/markets")
-def get_market_data():
-    return market_data
+def get_market_data(history: bool = False):
+    # History is opt-in: with thousands of instruments it dominates the payload
+    with simulator_lock:
+        return simulator.snapshot(include_history=history)
 
 @app.get("/candlestick/{pair}")
 def get_candlestick_data(pair: str):
-    return market_data.get(pair, {}).get("history", [])
+    with simulator_lock:
+        return simulator.history(pair)
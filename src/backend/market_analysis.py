@@ -5,8 +5,13 @@ from datetime import datetime, timedelta
 import pandas as pd
 from sentiment_analysis import analyze_sentiment
 from db_connection import db_manager
+from psycopg2.extras import execute_values
+from market_data_providers import ProviderRouter, YahooProvider, AlphaVantageProvider
+from instrumentation import span, record_cache
 import json
 import os
+import hashlib
+import copy
 import logging
 import time
 import requests
@@ -45,6 +50,12 @@ class RateLimiter:
             
             # Add the current call time
             self.call_times.append(now)
+    
+    def has_capacity(self):
+        """Check without waiting whether a call would go out immediately"""
+        with self.lock:
+            one_hour_ago = time.time() - 3600
+            return sum(1 for t in self.call_times if t > one_hour_ago) < self.max_calls
 
 # Initialize rate limiter - 45 calls per hour (conservative for free tier)
 rate_limiter = RateLimiter(max_calls_per_hour=45)
@@ -63,6 +74,29 @@ if not os.path.exists(CACHE_DIR):
 # Memory cache to reduce disk reads
 memory_cache = {}
 
+def ticker_cache_ttl(formatted_symbol):
+    """Cache for 4 hours (14400 seconds) for actively traded symbols, 24 hours for others"""
+    return 4 * 3600 if is_active_symbol(formatted_symbol) else 24 * 3600
+
+def has_fresh_ticker_data(symbol, start_date_str, end_date_str):
+    """
+    Whether get_ticker_data would answer from its memory or disk cache
+
+    Only looks at the memory entry and the disk file's age, without loading
+    anything, so the provider router can call it before every request.
+    """
+    formatted_symbol = format_symbol_for_yahoo(symbol)
+    cache_key = f"{formatted_symbol}_{start_date_str}_{end_date_str}"
+    cache_ttl = ticker_cache_ttl(formatted_symbol)
+    cache_entry = memory_cache.get(cache_key)
+    if cache_entry is not None and time.time() - cache_entry['timestamp'] < cache_ttl:
+        return True
+    try:
+        # The file is written right after its embedded timestamp is taken
+        return time.time() - os.path.getmtime(os.path.join(CACHE_DIR, f"{cache_key}.json")) < cache_ttl
+    except OSError:
+        return False
+
 def get_ticker_data(symbol, start_date_str, end_date_str):
     """
     Get ticker data from Yahoo Finance with disk and memory caching and rate limiting
@@ -86,12 +120,13 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
         if cache_key in memory_cache:
             cache_entry = memory_cache[cache_key]
             cache_age = time.time() - cache_entry['timestamp']
-            # Cache for 4 hours (14400 seconds) for actively traded symbols, 24 hours for others
-            cache_ttl = 4 * 3600 if is_active_symbol(formatted_symbol) else 24 * 3600
+            cache_ttl = ticker_cache_ttl(formatted_symbol)
             
             if cache_age < cache_ttl:
-                logger.info(f"Using memory-cached data for {formatted_symbol} (age: {cache_age/60:.1f} min)")
+                logger.debug("Using memory-cached data for %s (age: %.1f min)", formatted_symbol, cache_age / 60)
+                record_cache('yahoo', 'memory', hit=True)
                 return cache_entry['data']
+        record_cache('yahoo', 'memory', hit=False)
         
         # If not in memory cache, check disk cache
         cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
@@ -101,13 +136,13 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
                     cache_data = json.load(f)
                 
                 cache_age = time.time() - cache_data['timestamp']
-                cache_ttl = 4 * 3600 if is_active_symbol(formatted_symbol) else 24 * 3600
+                cache_ttl = ticker_cache_ttl(formatted_symbol)
                 
                 if cache_age < cache_ttl:
-                    logger.info(f"Using disk-cached data for {formatted_symbol} (age: {cache_age/60:.1f} min)")
+                    logger.debug("Using disk-cached data for %s (age: %.1f min)", formatted_symbol, cache_age / 60)
                     # Recreate DataFrame from cached data
                     df = pd.DataFrame(cache_data['data'])
-                    df.index = pd.DatetimeIndex(df.index)
+                    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop(cache_data.get('index', 'Date')), utc=True))
                     
                     # Update memory cache
                     memory_cache[cache_key] = {
@@ -115,12 +150,15 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
                         'timestamp': cache_data['timestamp']
                     }
                     
+                    record_cache('yahoo', 'disk', hit=True)
                     return df
                 else:
                     logger.info(f"Cached data for {formatted_symbol} expired (age: {cache_age/60:.1f} min)")
             except Exception as e:
                 logger.error(f"Error reading cache file for {formatted_symbol}: {e}")
         
+        record_cache('yahoo', 'disk', hit=False)
+        
         # Apply rate limiting before making the API call
         rate_limiter.wait_if_needed()
         
@@ -143,7 +181,8 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
                 # Add a small buffer to end date to ensure we get all data
                 end_date_buffer = end_date + timedelta(days=1)
                 
-                hist = stock.history(start=start_date, end=end_date_buffer)
+                with span('upstream', 'yahoo', symbol=formatted_symbol):
+                    hist = stock.history(start=start_date, end=end_date_buffer)
                 
                 if hist.empty:
                     logger.warning(f"No data available from Yahoo Finance for symbol: {formatted_symbol}")
@@ -153,15 +192,20 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
                 
                 # Cache the result both in memory and on disk
                 try:
-                    # Convert DataFrame to serializable format
+                    # Convert DataFrame to serializable format (dates as ISO strings)
+                    frame = hist.reset_index()
+                    index_name = frame.columns[0]
+                    frame[index_name] = frame[index_name].astype(str)
                     hist_dict = {
-                        'data': hist.reset_index().to_dict('list'),
+                        'data': frame.to_dict('list'),
+                        'index': index_name,
                         'timestamp': time.time()
                     }
                     
-                    # Cache to disk
+                    # Cache to disk (serialize first so a failure never leaves a partial file)
+                    payload = json.dumps(hist_dict)
                     with open(cache_file, 'w') as f:
-                        json.dump(hist_dict, f)
+                        f.write(payload)
                     
                     # Cache to memory
                     memory_cache[cache_key] = {
@@ -186,6 +230,17 @@ def get_ticker_data(symbol, start_date_str, end_date_str):
         logger.error(f"Error fetching Yahoo Finance data for {symbol}: {str(e)}")
         return None
 
+# Route history requests across providers: Yahoo first, Alpha Vantage as failover/hedge
+# when an API key is configured. The Alpha Vantage budget mirrors its free tier so
+# the router skips it instead of waiting on its limiter.
+market_data_providers = [YahooProvider(get_ticker_data, rate_limiter, has_fresh_ticker_data)]
+if os.environ.get('ALPHA_VANTAGE_API_KEY'):
+    market_data_providers.append(AlphaVantageProvider())
+market_data_router = ProviderRouter(
+    market_data_providers,
+    budgets={'alpha_vantage': (int(os.environ.get('ALPHA_VANTAGE_CALLS_PER_MINUTE', 5)), 60)}
+)
+
 def is_active_symbol(symbol):
     """
     Determine if a symbol is actively traded (shorter cache time for these)
@@ -252,76 +307,67 @@ def format_symbol_for_yahoo(symbol):
     return symbol
 
 def store_price_data(symbol, historical_data):
-    """Store price data in MySQL database"""
+    """Store price history, levels, predictions and indicators in bulk"""
     conn = None
     cursor = None
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Store support and resistance levels
-        support_levels = historical_data.get('support_resistance', {}).get('support', [])
-        resistance_levels = historical_data.get('support_resistance', {}).get('resistance', [])
-        
-        # Begin transaction
-        conn.begin()
-        
-        # Store price history
+        # Store price history in a single round trip
         historical_prices = historical_data.get('historical_data', {})
-        dates = historical_prices.get('dates', [])
-        opens = historical_prices.get('open', [])
-        highs = historical_prices.get('high', [])
-        lows = historical_prices.get('low', [])
-        closes = historical_prices.get('close', [])
-        
-        for i, date in enumerate(dates):
-            cursor.execute("""
+        price_rows = list(zip(
+            [symbol] * len(historical_prices.get('dates', [])),
+            historical_prices.get('open', []),
+            historical_prices.get('high', []),
+            historical_prices.get('low', []),
+            historical_prices.get('close', []),
+            historical_prices.get('dates', [])
+        ))
+        if price_rows:
+            execute_values(cursor, """
                 INSERT INTO price_history 
-                (symbol, open_price, high_price, low_price, close_price, timestamp, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                (symbol, open_price, high_price, low_price, close_price, timestamp)
+                VALUES %s
                 ON CONFLICT (symbol, timestamp) DO UPDATE SET
                 open_price = EXCLUDED.open_price,
                 high_price = EXCLUDED.high_price,
                 low_price = EXCLUDED.low_price,
                 close_price = EXCLUDED.close_price,
                 created_at = NOW()
-            """, (symbol, opens[i], highs[i], lows[i], closes[i], date))
+            """, price_rows, template="(%s, %s, %s, %s, %s, %s)")
         
-        # Update support levels
-        for level in support_levels:
-            cursor.execute("""
-                INSERT INTO support_resistance 
-                (symbol, level_type, level_value, updated_at)
-                VALUES (%s, %s, %s, NOW())
-                ON CONFLICT (symbol, level_type, level_value) DO UPDATE SET
-                updated_at = NOW()
-            """, (symbol, 'support', level))
-        
-        # Update resistance levels
-        for level in resistance_levels:
-            cursor.execute("""
+        # Replace support and resistance levels so stale levels do not accumulate
+        support_levels = historical_data.get('support_resistance', {}).get('support', [])
+        resistance_levels = historical_data.get('support_resistance', {}).get('resistance', [])
+        level_rows = [(symbol, 'support', level) for level in support_levels]
+        level_rows += [(symbol, 'resistance', level) for level in resistance_levels]
+        cursor.execute("DELETE FROM support_resistance WHERE symbol = %s", (symbol,))
+        if level_rows:
+            execute_values(cursor, """
                 INSERT INTO support_resistance 
                 (symbol, level_type, level_value, updated_at)
-                VALUES (%s, %s, %s, NOW())
+                VALUES %s
                 ON CONFLICT (symbol, level_type, level_value) DO UPDATE SET
                 updated_at = NOW()
-            """, (symbol, 'resistance', level))
+            """, level_rows, template="(%s, %s, %s, NOW())")
         
-        # Store price predictions
+        # Store price predictions, dated from today
         predictions = historical_data.get('predictions', [])
-        
-        # Update predictions
         end_date = datetime.now()
-        for i, pred in enumerate(predictions):
-            prediction_date = end_date + timedelta(days=i+1)
-            cursor.execute("""
+        prediction_rows = [
+            (symbol, (end_date + timedelta(days=i+1)).strftime('%Y-%m-%d'), pred)
+            for i, pred in enumerate(predictions)
+        ]
+        if prediction_rows:
+            execute_values(cursor, """
                 INSERT INTO price_predictions 
                 (symbol, prediction_date, predicted_price, created_at)
-                VALUES (%s, %s, %s, NOW())
+                VALUES %s
                 ON CONFLICT (symbol, prediction_date) DO UPDATE SET
                 predicted_price = EXCLUDED.predicted_price,
                 created_at = NOW()
-            """, (symbol, prediction_date.strftime('%Y-%m-%d'), pred))
+            """, prediction_rows, template="(%s, %s, %s, NOW())")
         
         # Store technical indicators
         technical_indicators = historical_data.get('technical_indicators', {})
@@ -336,7 +382,8 @@ def store_price_data(symbol, historical_data):
             macd_hist = EXCLUDED.macd_hist,
             sma20 = EXCLUDED.sma20,
             sma50 = EXCLUDED.sma50,
-            sma200 = EXCLUDED.sma200
+            sma200 = EXCLUDED.sma200,
+            updated_at = NOW()
         """, (
             symbol,
             technical_indicators.get('rsi', 0),
@@ -364,205 +411,449 @@ def store_price_data(symbol, historical_data):
             db_manager.release_connection(conn)
         return False
 
-def generate_synthetic_data(symbol):
+# Asset classes tracked by the market trend breadth aggregate, plus the 'all' total
+TREND_ASSET_CLASSES = ['forex', 'index', 'stock']
+TREND_COLUMNS = {'Bullish': 'bullish_count', 'Bearish': 'bearish_count', 'Neutral': 'neutral_count'}
+# Arbitrary application-wide key for pg_advisory_xact_lock around the breadth bootstrap
+TREND_BREADTH_LOCK_KEY = 740030
+
+def get_asset_class(symbol):
     """
-    Generate synthetic market data when Yahoo Finance data is unavailable
+    Classify a symbol for the trend breadth aggregate
     
     Args:
-        symbol (str): Stock or forex symbol
+        symbol (str): Stock, index or forex symbol
         
     Returns:
-        dict: Synthetic market data
+        str: 'forex', 'index' or 'stock'
     """
-    # Define some base prices for common forex pairs with updated values
-    base_prices = {
-        'EURUSD': 1.0853,
-        'GBPUSD': 1.2701,
-        'USDJPY': 151.68,
-        'USDCAD': 1.3642,
-        'AUDUSD': 0.6578,
-        'NZDUSD': 0.6142,
-        'USDCHF': 0.8987,
-        'EURGBP': 0.8547,
-        'EURJPY': 164.64,
-        'GBPJPY': 192.65,
-        'USDMXN': 19.87,
-        'USDZAR': 18.45,
-        'USDTRY': 32.17,
-        'USDBRL': 5.42,
-        'USDCNY': 7.24,
-        'USDRUB': 90.75,
-        'USDINR': 83.47
-    }
-    
-    # Clean symbol for lookup - remove =X or -X suffix if present
-    clean_symbol = symbol.replace('-X', '').replace('=X', '')
-    
-    # For 6-character symbols, check if they look like forex pairs
-    is_forex = False
-    if len(clean_symbol) == 6:
-        forex_currencies = ['USD', 'EUR', 'GBP', 'JPY', 'AUD', 'NZD', 'CAD', 'CHF', 'MXN', 'ZAR', 'TRY', 'BRL', 'CNY', 'RUB', 'INR']
-        first_currency = clean_symbol[:3]
-        second_currency = clean_symbol[3:]
-        
-        if first_currency in forex_currencies and second_currency in forex_currencies:
-            # This is a forex pair - ensure it has a reasonable price
-            is_forex = True
-            if clean_symbol not in base_prices:
-                # If not in our list, use a reasonable default based on similar pairs
-                if 'JPY' in clean_symbol:
-                    base_prices[clean_symbol] = 100.0 + (np.random.random() * 50)
-                elif 'GBP' in clean_symbol or 'EUR' in clean_symbol:
-                    if second_currency == 'USD':
-                        # GBP/USD or EUR/USD type pairs are typically > 1
-                        base_prices[clean_symbol] = 1.0 + (np.random.random() * 0.3)
-                    elif first_currency == 'USD':
-                        # USD/GBP or USD/EUR are typically < 1
-                        base_prices[clean_symbol] = 0.7 + (np.random.random() * 0.2)
-                    else:
-                        base_prices[clean_symbol] = 0.8 + (np.random.random() * 0.4)
-                elif second_currency == 'USD':
-                    # Other currency against USD (like AUD/USD)
-                    base_prices[clean_symbol] = 0.5 + (np.random.random() * 0.3)
-                elif first_currency == 'USD':
-                    # USD against other currency
-                    if second_currency in ['MXN', 'ZAR', 'TRY', 'BRL', 'RUB', 'INR']:
-                        # Emerging market currencies have higher USD exchange rates
-                        base_prices[clean_symbol] = 10.0 + (np.random.random() * 30.0)
-                    else:
-                        base_prices[clean_symbol] = 1.0 + (np.random.random() * 0.5)
-                else:
-                    base_prices[clean_symbol] = 1.0 + (np.random.random() * 0.2)
+    if '=X' in symbol or '-X' in symbol:
+        return 'forex'
+    if len(symbol) == 6 and symbol[:3] in SYNTHETIC_FOREX_CURRENCIES and symbol[3:] in SYNTHETIC_FOREX_CURRENCIES:
+        return 'forex'
+    if symbol.startswith('^') or symbol in ['GSPC', 'DJI', 'IXIC', 'NYA', 'XAX', 'RUT']:
+        return 'index'
+    return 'stock'
+
+def rebuild_trend_breadth(cursor):
+    """
+    Recompute the trend breadth aggregate from market_data
+    
+    Used to bootstrap the aggregate; afterwards it is maintained incrementally
+    by store_market_data. Runs inside the caller's transaction and holds the
+    bootstrap advisory lock until it ends, so concurrent rebuilds run one after
+    the other and each counts the rows committed before it. Every asset class
+    row is upserted with absolute counts.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (TREND_BREADTH_LOCK_KEY,))
+    cursor.execute("SELECT symbol, trend FROM market_data")
+    counts = {asset_class: {column: 0 for column in TREND_COLUMNS.values()} for asset_class in TREND_ASSET_CLASSES + ['all']}
+    for symbol, trend in cursor.fetchall():
+        column = TREND_COLUMNS.get(trend)
+        if column:
+            counts[get_asset_class(symbol)][column] += 1
+            counts['all'][column] += 1
+    
+    execute_values(cursor, """
+        INSERT INTO market_trend_breadth (asset_class, bullish_count, bearish_count, neutral_count, updated_at)
+        VALUES %s
+        ON CONFLICT (asset_class) DO UPDATE SET
+            bullish_count = EXCLUDED.bullish_count,
+            bearish_count = EXCLUDED.bearish_count,
+            neutral_count = EXCLUDED.neutral_count,
+            updated_at = EXCLUDED.updated_at
+    """, [
+        (asset_class, c['bullish_count'], c['bearish_count'], c['neutral_count'])
+        for asset_class, c in counts.items()
+    ], template="(%s, %s, %s, %s, NOW())")
+    _snapshot_trend_breadth(cursor)
+
+def _snapshot_trend_breadth(cursor):
+    """Copy the current aggregate into the hourly breadth history bucket"""
+    cursor.execute("""
+        INSERT INTO market_trend_breadth_history (bucket, asset_class, bullish_count, bearish_count, neutral_count)
+        SELECT date_trunc('hour', NOW()), asset_class, bullish_count, bearish_count, neutral_count
+        FROM market_trend_breadth
+        ON CONFLICT (bucket, asset_class) DO UPDATE SET
+            bullish_count = EXCLUDED.bullish_count,
+            bearish_count = EXCLUDED.bearish_count,
+            neutral_count = EXCLUDED.neutral_count
+    """)
+
+def _apply_trend_breadth_delta(cursor, symbol, old_trend, new_trend):
+    """Move one symbol between trend buckets in the breadth aggregate"""
+    cursor.execute("SELECT 1 FROM market_trend_breadth WHERE asset_class = 'all'")
+    if cursor.fetchone() is None:
+        # Aggregate not bootstrapped yet. Wait for any rebuild in progress and
+        # check again: if it finished, our change is applied as a delta below
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (TREND_BREADTH_LOCK_KEY,))
+        cursor.execute("SELECT 1 FROM market_trend_breadth WHERE asset_class = 'all'")
+        if cursor.fetchone() is None:
+            # market_data already holds the new row
+            rebuild_trend_breadth(cursor)
+            return
+    
+    delta = {column: 0 for column in TREND_COLUMNS.values()}
+    if old_trend in TREND_COLUMNS:
+        delta[TREND_COLUMNS[old_trend]] -= 1
+    if new_trend in TREND_COLUMNS:
+        delta[TREND_COLUMNS[new_trend]] += 1
     
-    # Use base price if available, otherwise use a default
-    base_price = base_prices.get(clean_symbol, 100.0)
+    execute_values(cursor, """
+        INSERT INTO market_trend_breadth (asset_class, bullish_count, bearish_count, neutral_count, updated_at)
+        VALUES %s
+        ON CONFLICT (asset_class) DO UPDATE SET
+            bullish_count = market_trend_breadth.bullish_count + EXCLUDED.bullish_count,
+            bearish_count = market_trend_breadth.bearish_count + EXCLUDED.bearish_count,
+            neutral_count = market_trend_breadth.neutral_count + EXCLUDED.neutral_count,
+            updated_at = NOW()
+    """, [
+        (asset_class, delta['bullish_count'], delta['bearish_count'], delta['neutral_count'])
+        for asset_class in (get_asset_class(symbol), 'all')
+    ], template="(%s, %s, %s, %s, NOW())")
+    _snapshot_trend_breadth(cursor)
+
+def store_market_data(symbol, analysis):
+    """
+    Insert or update the market_data summary row for a symbol
     
-    # Add some randomness
-    current_price = base_price * (1 + (np.random.random() * 0.02 - 0.01))
+    The trend breadth aggregate is updated in the same transaction whenever the
+    symbol's trend changes, so /api/market-trends never has to scan market_data.
     
-    # For forex pairs, ensure appropriate precision (typically 4-5 decimal places)
-    if is_forex:
-        if 'JPY' in clean_symbol:
-            current_price = round(current_price, 3)  # JPY pairs usually have 3 decimal places
+    Args:
+        symbol (str): Stock or forex symbol
+        analysis (dict): Analysis result with current_price, slope and trend
+        
+    Returns:
+        bool: True if the row was written
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        # Try the insert first: if it returns a row this is the symbol's first
+        # analysis. A concurrent first insert makes ours wait and then skip, so
+        # only one writer ever counts the symbol as new.
+        cursor.execute("""
+            INSERT INTO market_data (symbol, current_price, change_percentage, trend, updated_at) 
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (symbol) DO NOTHING
+            RETURNING symbol
+        """, (symbol, analysis['current_price'], analysis['slope'], analysis['trend']))
+        
+        if cursor.fetchone():
+            old_trend = None
         else:
-            current_price = round(current_price, 5)  # Other forex pairs typically have 5 decimal places
+            # The row exists and is committed; lock it so concurrent writers
+            # see a consistent previous trend
+            cursor.execute("SELECT trend FROM market_data WHERE symbol = %s FOR UPDATE", (symbol,))
+            old_trend = cursor.fetchone()[0]
+            cursor.execute("""
+                UPDATE market_data SET
+                    current_price = %s,
+                    change_percentage = %s,
+                    trend = %s,
+                    updated_at = NOW()
+                WHERE symbol = %s
+            """, (analysis['current_price'], analysis['slope'], analysis['trend'], symbol))
+        
+        if old_trend != analysis['trend']:
+            _apply_trend_breadth_delta(cursor, symbol, old_trend, analysis['trend'])
+        
+        conn.commit()
+        cursor.close()
+        db_manager.release_connection(conn)
+        return True
+    except Exception as e:
+        logger.error(f"Database error storing market data for {symbol}: {e}")
+        if cursor:
+            cursor.close()
+        if conn:
+            try:
+                conn.rollback()
+            except:
+                pass
+            db_manager.release_connection(conn)
+        return False
+
+# Reference prices for common forex pairs used by the synthetic data generator
+SYNTHETIC_BASE_PRICES = {
+    'EURUSD': 1.0853,
+    'GBPUSD': 1.2701,
+    'USDJPY': 151.68,
+    'USDCAD': 1.3642,
+    'AUDUSD': 0.6578,
+    'NZDUSD': 0.6142,
+    'USDCHF': 0.8987,
+    'EURGBP': 0.8547,
+    'EURJPY': 164.64,
+    'GBPJPY': 192.65,
+    'USDMXN': 19.87,
+    'USDZAR': 18.45,
+    'USDTRY': 32.17,
+    'USDBRL': 5.42,
+    'USDCNY': 7.24,
+    'USDRUB': 90.75,
+    'USDINR': 83.47
+}
+
+SYNTHETIC_FOREX_CURRENCIES = ['USD', 'EUR', 'GBP', 'JPY', 'AUD', 'NZD', 'CAD', 'CHF', 'MXN', 'ZAR', 'TRY', 'BRL', 'CNY', 'RUB', 'INR']
+
+# Number of uniform draws consumed per symbol before the per-day series columns
+_SYNTHETIC_SCALAR_DRAWS = 8
+_SYNTHETIC_SENTIMENT_DRAWS = 7
+
+def _synthetic_seed(clean_symbol, day):
+    """
+    Derive a stable RNG seed for a symbol and calendar day
     
-    # Generate support and resistance levels
-    support_levels = [
-        round(current_price * (1 - 0.01), 4),
-        round(current_price * (1 - 0.02), 4),
-        round(current_price * (1 - 0.03), 4)
-    ]
+    Python's built-in hash() is salted per process, so a digest is used to keep
+    the seed identical across workers and restarts.
+    """
+    digest = hashlib.sha256(f"{clean_symbol}:{day.isoformat()}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+def _synthetic_base_price(clean_symbol, draw):
+    """
+    Pick a base price for a symbol without mutating SYNTHETIC_BASE_PRICES
     
-    resistance_levels = [
-        round(current_price * (1 + 0.01), 4),
-        round(current_price * (1 + 0.02), 4),
-        round(current_price * (1 + 0.03), 4)
-    ]
+    Args:
+        clean_symbol (str): Symbol without =X / -X suffix
+        draw (float): Uniform [0, 1) draw used for unknown forex pairs
+        
+    Returns:
+        tuple: (base_price, is_forex)
+    """
+    if clean_symbol in SYNTHETIC_BASE_PRICES:
+        return SYNTHETIC_BASE_PRICES[clean_symbol], True
+    
+    if len(clean_symbol) != 6:
+        return 100.0, False
+    
+    first_currency = clean_symbol[:3]
+    second_currency = clean_symbol[3:]
+    if first_currency not in SYNTHETIC_FOREX_CURRENCIES or second_currency not in SYNTHETIC_FOREX_CURRENCIES:
+        return 100.0, False
+    
+    # If not in our list, use a reasonable default based on similar pairs
+    if 'JPY' in clean_symbol:
+        return 100.0 + (draw * 50), True
+    if 'GBP' in clean_symbol or 'EUR' in clean_symbol:
+        if second_currency == 'USD':
+            # GBP/USD or EUR/USD type pairs are typically > 1
+            return 1.0 + (draw * 0.3), True
+        if first_currency == 'USD':
+            # USD/GBP or USD/EUR are typically < 1
+            return 0.7 + (draw * 0.2), True
+        return 0.8 + (draw * 0.4), True
+    if second_currency == 'USD':
+        # Other currency against USD (like AUD/USD)
+        return 0.5 + (draw * 0.3), True
+    if first_currency == 'USD':
+        # Emerging market currencies have higher USD exchange rates
+        if second_currency in ['MXN', 'ZAR', 'TRY', 'BRL', 'RUB', 'INR']:
+            return 10.0 + (draw * 30.0), True
+        return 1.0 + (draw * 0.5), True
+    return 1.0 + (draw * 0.2), True
+
+def generate_synthetic_batch(symbols, as_of=None, days=30, prediction_days=5):
+    """
+    Generate synthetic market data for many symbols in one vectorized pass
+    
+    Every symbol gets its own RNG seeded from (symbol, day), so the same symbol
+    returns the same series for the whole day and results can be cached or
+    persisted. The function has no side effects.
+    
+    Args:
+        symbols (list): Stock or forex symbols
+        as_of (datetime, optional): Reference time, defaults to now
+        days (int): Number of historical bars per symbol
+        prediction_days (int): Number of predicted bars per symbol
+        
+    Returns:
+        dict: Synthetic market data keyed by symbol, same format as analyze_stock
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    
+    end_date = as_of or datetime.now()
+    day = end_date.date()
+    n = len(symbols)
+    
+    # Column layout of the per-symbol uniform draws
+    pred_start = _SYNTHETIC_SCALAR_DRAWS
+    hist_start = pred_start + prediction_days
+    open_start = hist_start + days
+    high_start = open_start + days
+    low_start = high_start + days
+    sentiment_start = low_start + days
+    width = sentiment_start + _SYNTHETIC_SENTIMENT_DRAWS
+    
+    clean_symbols = [symbol.replace('-X', '').replace('=X', '') for symbol in symbols]
+    draws = np.empty((n, width))
+    for row, clean_symbol in enumerate(clean_symbols):
+        draws[row] = np.random.default_rng(_synthetic_seed(clean_symbol, day)).random(width)
     
-    # Generate technical indicators
-    rsi = round(45 + np.random.random() * 20, 2)  # 45-65 range
-    macd = round(np.random.random() * 0.004 - 0.002, 5)
-    macd_signal = round(np.random.random() * 0.004 - 0.002, 5)
-    macd_hist = round(macd - macd_signal, 5)
-    
-    # Generate sma values
-    sma20 = round(current_price * (1 + (np.random.random() * 0.01 - 0.005)), 5)
-    sma50 = round(current_price * (1 + (np.random.random() * 0.015 - 0.0075)), 5)
-    sma200 = round(current_price * (1 + (np.random.random() * 0.02 - 0.01)), 5)
-    
-    # Generate predictions and historical data
-    predictions = []
-    prediction_dates = []
-    historical_dates = []
-    historical_prices = []
-    historical_opens = []
-    historical_highs = []
-    historical_lows = []
-    historical_closes = []
-    
-    # Use current date not fixed date
-    end_date = datetime.now()
-    
-    # Generate predictions for next 5 days from TODAY
-    for i in range(1, 6):
-        future_date = end_date + timedelta(days=i)
-        date_str = future_date.strftime('%Y-%m-%d')
-        
-        # Random change
-        random_change = np.random.random() * 0.02 - 0.01
-        pred_price = round(current_price * (1 + random_change), 4)
-        
-        predictions.append(pred_price)
-        prediction_dates.append(date_str)
-    
-    # Generate historical data for past 30 days from TODAY
-    for i in range(30, 0, -1):
-        past_date = end_date - timedelta(days=i)
-        date_str = past_date.strftime('%Y-%m-%d')
-        
-        # Create somewhat realistic price history
-        random_variation = np.sin(i * 0.2) * 0.02 + (np.random.random() * 0.01 - 0.005)
-        historical_price = round(current_price * (1 + random_variation), 4)
-        
-        # Slight variations for open/high/low
-        open_price = round(historical_price * (1 + (np.random.random() * 0.002 - 0.001)), 4)
-        high_price = round(max(open_price, historical_price) * (1 + np.random.random() * 0.002), 4)
-        low_price = round(min(open_price, historical_price) * (1 - np.random.random() * 0.002), 4)
-        
-        historical_dates.append(date_str)
-        historical_prices.append(historical_price)
-        historical_opens.append(open_price)
-        historical_highs.append(high_price)
-        historical_lows.append(low_price)
-        historical_closes.append(historical_price)
+    base_info = [_synthetic_base_price(clean_symbol, draws[row, 0]) for row, clean_symbol in enumerate(clean_symbols)]
+    base_prices = np.array([info[0] for info in base_info])
+    is_forex = np.array([info[1] for info in base_info])
+    
+    # Add some randomness, then use forex precision (JPY pairs 3 decimals, others 5)
+    current_prices = base_prices * (1 + (draws[:, 1] * 0.02 - 0.01))
+    decimals = np.where(['JPY' in clean_symbol for clean_symbol in clean_symbols], 3, 5)
+    scale = 10.0 ** decimals
+    current_prices = np.where(is_forex, np.round(current_prices * scale) / scale, current_prices)
+    current_col = current_prices[:, None]
+    
+    # Support and resistance levels at 1%, 2% and 3% from the current price
+    offsets = np.array([0.01, 0.02, 0.03])
+    support_levels = np.round(current_col * (1 - offsets), 4)
+    resistance_levels = np.round(current_col * (1 + offsets), 4)
+    
+    # Technical indicators
+    rsi = np.round(45 + draws[:, 2] * 20, 2)  # 45-65 range
+    macd = np.round(draws[:, 3] * 0.004 - 0.002, 5)
+    macd_signal = np.round(draws[:, 4] * 0.004 - 0.002, 5)
+    macd_hist = np.round(macd - macd_signal, 5)
+    sma20 = np.round(current_prices * (1 + (draws[:, 5] * 0.01 - 0.005)), 5)
+    sma50 = np.round(current_prices * (1 + (draws[:, 6] * 0.015 - 0.0075)), 5)
+    sma200 = np.round(current_prices * (1 + (draws[:, 7] * 0.02 - 0.01)), 5)
+    
+    # Predictions for the next days from TODAY
+    predictions = np.round(current_col * (1 + (draws[:, pred_start:hist_start] * 0.02 - 0.01)), 4)
+    prediction_dates = [(end_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1, prediction_days + 1)]
+    
+    # Somewhat realistic price history for the past days from TODAY
+    offsets_back = np.arange(days, 0, -1)
+    variation = np.sin(offsets_back * 0.2) * 0.02 + (draws[:, hist_start:open_start] * 0.01 - 0.005)
+    closes = np.round(current_col * (1 + variation), 4)
+    opens = np.round(closes * (1 + (draws[:, open_start:high_start] * 0.002 - 0.001)), 4)
+    highs = np.round(np.maximum(opens, closes) * (1 + draws[:, high_start:low_start] * 0.002), 4)
+    lows = np.round(np.minimum(opens, closes) * (1 - draws[:, low_start:sentiment_start] * 0.002), 4)
+    historical_dates = [(end_date - timedelta(days=int(i))).strftime('%Y-%m-%d') for i in offsets_back]
     
     # Determine trend based on last 5 days
-    recent_prices = historical_prices[-5:]
-    slope = 0
-    if len(recent_prices) >= 2:
-        slope = (recent_prices[-1] - recent_prices[0]) / len(recent_prices)
-    trend = "Bullish" if slope > 0 else "Bearish"
-    
-    # Return synthetic data in the same format as real data
-    return {
-        "symbol": symbol,
-        "current_price": round(current_price, 4),
-        "trend": trend,
-        "slope": slope,
-        "predictions": predictions,
-        "prediction_dates": prediction_dates,
-        "historical_data": {
-            "dates": historical_dates,
-            "prices": historical_prices,
-            "open": historical_opens,
-            "high": historical_highs,
-            "low": historical_lows,
-            "close": historical_closes
-        },
-        "technical_indicators": {
-            "rsi": rsi,
-            "macd": macd,
-            "macd_signal": macd_signal,
-            "macd_hist": macd_hist,
-            "sma20": sma20,
-            "sma50": sma50,
-            "sma200": sma200
-        },
-        "support_resistance": {
-            "support": support_levels,
-            "resistance": resistance_levels
-        },
-        "sentiment": {
-            "overall": "Bullish" if np.random.random() > 0.5 else "Bearish",
-            "confidence": round(np.random.random() * 30 + 50),
-            "news_sentiment": round(np.random.random() * 0.6 - 0.3, 2),
-            "social_sentiment": round(np.random.random() * 0.6 - 0.3, 2),
-            "market_mood": "Positive" if np.random.random() > 0.5 else "Negative",
-            "news_count": round(np.random.random() * 50 + 10),
-            "social_count": round(np.random.random() * 200 + 50)
+    recent = closes[:, -5:]
+    if recent.shape[1] >= 2:
+        slopes = (recent[:, -1] - recent[:, 0]) / recent.shape[1]
+    else:
+        slopes = np.zeros(n)
+    
+    sentiment = draws[:, sentiment_start:]
+    
+    # Convert to Python lists once per matrix instead of per element
+    current_list = np.round(current_prices, 4).tolist()
+    slope_list = slopes.tolist()
+    prediction_list = predictions.tolist()
+    close_list = closes.tolist()
+    open_list = opens.tolist()
+    high_list = highs.tolist()
+    low_list = lows.tolist()
+    support_list = support_levels.tolist()
+    resistance_list = resistance_levels.tolist()
+    indicator_lists = [values.tolist() for values in (rsi, macd, macd_signal, macd_hist, sma20, sma50, sma200)]
+    sentiment_list = sentiment.tolist()
+    
+    results = {}
+    for row, symbol in enumerate(symbols):
+        rsi_v, macd_v, signal_v, hist_v, sma20_v, sma50_v, sma200_v = (values[row] for values in indicator_lists)
+        s_overall, s_confidence, s_news, s_social, s_mood, s_news_count, s_social_count = sentiment_list[row]
+        results[symbol] = {
+            "symbol": symbol,
+            "current_price": current_list[row],
+            "trend": "Bullish" if slope_list[row] > 0 else "Bearish",
+            "slope": slope_list[row],
+            "predictions": prediction_list[row],
+            "prediction_dates": list(prediction_dates),
+            "historical_data": {
+                "dates": list(historical_dates),
+                "prices": close_list[row],
+                "open": open_list[row],
+                "high": high_list[row],
+                "low": low_list[row],
+                "close": list(close_list[row])
+            },
+            "technical_indicators": {
+                "rsi": rsi_v,
+                "macd": macd_v,
+                "macd_signal": signal_v,
+                "macd_hist": hist_v,
+                "sma20": sma20_v,
+                "sma50": sma50_v,
+                "sma200": sma200_v
+            },
+            "support_resistance": {
+                "support": support_list[row],
+                "resistance": resistance_list[row]
+            },
+            "sentiment": {
+                "overall": "Bullish" if s_overall > 0.5 else "Bearish",
+                "confidence": round(s_confidence * 30 + 50),
+                "news_sentiment": round(s_news * 0.6 - 0.3, 2),
+                "social_sentiment": round(s_social * 0.6 - 0.3, 2),
+                "market_mood": "Positive" if s_mood > 0.5 else "Negative",
+                "news_count": round(s_news_count * 50 + 10),
+                "social_count": round(s_social_count * 200 + 50)
+            }
         }
-    }
+    
+    return results
+
+def generate_synthetic_data(symbol, as_of=None):
+    """
+    Generate synthetic market data when Yahoo Finance data is unavailable
+    
+    Args:
+        symbol (str): Stock or forex symbol
+        as_of (datetime, optional): Reference time, defaults to now
+        
+    Returns:
+        dict: Synthetic market data, identical for the same symbol and day
+    """
+    return generate_synthetic_batch([symbol], as_of=as_of)[symbol]
+
+# Per-process cache of materialized synthetic series, keyed by (symbol, day)
+synthetic_cache = {}
+synthetic_cache_lock = threading.Lock()
+
+def get_synthetic_series(symbol):
+    """
+    Get the synthetic series for a symbol, materializing it once per day
+    
+    The first request of the day generates the series and persists it to
+    price_history (plus levels, predictions, indicators and market_data) so
+    later requests can be served from the database. Because generation is
+    seeded per symbol and day, every worker materializes the same series.
+    
+    Args:
+        symbol (str): Stock or forex symbol
+        
+    Returns:
+        dict: Synthetic market data (a copy that callers may modify)
+    """
+    key = (symbol, datetime.now().date())
+    
+    with synthetic_cache_lock:
+        entry = synthetic_cache.get(key)
+    
+    if entry is None:
+        entry = {'data': generate_synthetic_data(symbol), 'persisted': False}
+        with synthetic_cache_lock:
+            # Drop series from previous days
+            for stale_key in [k for k in synthetic_cache if k[1] != key[1]]:
+                del synthetic_cache[stale_key]
+            entry = synthetic_cache.setdefault(key, entry)
+    
+    if not entry['persisted']:
+        # Retried on the next request if the database is unavailable
+        if store_price_data(symbol, entry['data']) and store_market_data(symbol, entry['data']):
+            entry['persisted'] = True
+            logger.info(f"Materialized synthetic series for {symbol}")
+    
+    return copy.deepcopy(entry['data'])
 
 def analyze_stock(symbol):
     """
@@ -575,7 +866,7 @@ def analyze_stock(symbol):
         dict: Market analysis data
     """
     try:
-        logger.info(f"Starting analysis for symbol: {symbol}")
+        logger.debug("Starting analysis for symbol: %s", symbol)
         
         # Expanded list of problematic symbols that need synthetic data
         problematic_symbols = [
@@ -601,13 +892,13 @@ def analyze_stock(symbol):
             second_currency = clean_symbol[3:]
             if first_currency in forex_currencies and second_currency in forex_currencies:
                 is_forex_pair = True
-                logger.info(f"Detected forex pair: {symbol}")
+                logger.debug("Detected forex pair: %s", symbol)
         
         # Check if we need to use synthetic data
         # Always use synthetic data for forex pairs for consistency
         if any(ps == symbol for ps in problematic_symbols) or is_forex_pair:
-            logger.info(f"Using synthetic data for forex/problematic symbol: {symbol}")
-            return generate_synthetic_data(symbol)
+            logger.debug("Using synthetic data for forex/problematic symbol: %s", symbol)
+            return get_synthetic_series(symbol)
         
         # Get historical data for the last 30 days
         end_date = datetime.now()
@@ -620,64 +911,67 @@ def analyze_stock(symbol):
         # Format symbol correctly for Yahoo Finance
         formatted_symbol = format_symbol_for_yahoo(symbol)
         
-        # Fetch data from Yahoo Finance with caching
-        hist = get_ticker_data(formatted_symbol, start_date_str, end_date_str)
+        # Fetch data from the healthiest provider (Yahoo Finance, then Alpha Vantage)
+        with span('stage', 'analysis.fetch'):
+            hist, provider = market_data_router.fetch_history(formatted_symbol, start_date_str, end_date_str)
         
-        # If data retrieval failed, generate synthetic data
+        # If every provider failed, generate synthetic data
         if hist is None or hist.empty:
-            logger.warning(f"No data available from Yahoo Finance for {formatted_symbol}, using synthetic data")
+            logger.warning(f"No data available from any provider for {formatted_symbol}, using synthetic data")
             return generate_synthetic_data(symbol)
             
-        logger.info(f"Processing data for {formatted_symbol}, {len(hist)} data points")
-        
-        # Prepare data for linear regression
-        X = np.array(range(len(hist))).reshape(-1, 1)
-        y = hist['Close'].values
-        
-        # Create and fit the model
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        # Make predictions for next 5 days FROM TODAY
-        future_days = np.array(range(len(hist), len(hist) + 5)).reshape(-1, 1)
-        predictions = model.predict(future_days)
-        
-        # Calculate trend
-        slope = model.coef_[0]
-        trend = "Bullish" if slope > 0 else "Bearish"
-        
-        # Calculate technical indicators
-        # RSI
-        delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        # Moving Averages
-        sma20 = hist['Close'].rolling(window=20).mean()
-        sma50 = hist['Close'].rolling(window=50).mean()
-        # For sma200, we might not have enough data, so handle this case
-        if len(hist) >= 200:
-            sma200 = hist['Close'].rolling(window=200).mean()
-        else:
-            # Use what we have for sma200
-            sma200 = hist['Close'].rolling(window=min(len(hist), 50)).mean()
+        logger.info(f"Processing data for {formatted_symbol} from {provider}, {len(hist)} data points")
         
-        # MACD
-        exp1 = hist['Close'].ewm(span=12, adjust=False).mean()
-        exp2 = hist['Close'].ewm(span=26, adjust=False).mean()
-        macd = exp1 - exp2
-        signal = macd.ewm(span=9, adjust=False).mean()
-        macd_hist = macd - signal
-        
-        # Support and Resistance levels
-        recent_data = hist['Close'].tail(20)
-        support_levels = recent_data.nsmallest(3).tolist()
-        resistance_levels = recent_data.nlargest(3).tolist()
+        with span('stage', 'analysis.indicators'):
+            # Prepare data for linear regression
+            X = np.array(range(len(hist))).reshape(-1, 1)
+            y = hist['Close'].values
+            
+            # Create and fit the model
+            model = LinearRegression()
+            model.fit(X, y)
+            
+            # Make predictions for next 5 days FROM TODAY
+            future_days = np.array(range(len(hist), len(hist) + 5)).reshape(-1, 1)
+            predictions = model.predict(future_days)
+            
+            # Calculate trend
+            slope = model.coef_[0]
+            trend = "Bullish" if slope > 0 else "Bearish"
+            
+            # Calculate technical indicators
+            # RSI
+            delta = hist['Close'].diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+            rs = gain / loss
+            rsi = 100 - (100 / (1 + rs))
+            
+            # Moving Averages
+            sma20 = hist['Close'].rolling(window=20).mean()
+            sma50 = hist['Close'].rolling(window=50).mean()
+            # For sma200, we might not have enough data, so handle this case
+            if len(hist) >= 200:
+                sma200 = hist['Close'].rolling(window=200).mean()
+            else:
+                # Use what we have for sma200
+                sma200 = hist['Close'].rolling(window=min(len(hist), 50)).mean()
+            
+            # MACD
+            exp1 = hist['Close'].ewm(span=12, adjust=False).mean()
+            exp2 = hist['Close'].ewm(span=26, adjust=False).mean()
+            macd = exp1 - exp2
+            signal = macd.ewm(span=9, adjust=False).mean()
+            macd_hist = macd - signal
+            
+            # Support and Resistance levels
+            recent_data = hist['Close'].tail(20)
+            support_levels = recent_data.nsmallest(3).tolist()
+            resistance_levels = recent_data.nlargest(3).tolist()
         
         # Get sentiment analysis
-        sentiment_data = analyze_sentiment(symbol)
+        with span('stage', 'analysis.sentiment'):
+            sentiment_data = analyze_sentiment(symbol)
         
         # Handle NaN values and ensure all values are JSON-serializable
         def safe_float(value):
@@ -690,7 +984,7 @@ def analyze_stock(symbol):
         
         # Generate prediction dates starting from TODAY
         prediction_dates = [(datetime.now() + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(len(predictions))]
-        logger.info(f"Generated prediction dates: {prediction_dates}")
+        logger.debug("Generated prediction dates: %s", prediction_dates)
         
         # Prepare response with safe value handling
         response = {
@@ -725,47 +1019,15 @@ def analyze_stock(symbol):
         }
         
         # Store data in database
-        logger.info(f"Storing data for {symbol} in database")
-        store_success = store_price_data(symbol, response)
-        if not store_success:
-            logger.warning(f"Failed to store price data for {symbol}")
-        
-        # Store or update analysis results in the market_data table
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # Check if the symbol already exists
-            cursor.execute("""
-                SELECT * FROM market_data WHERE symbol = %s
-            """, (symbol,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Update existing record
-                cursor.execute("""
-                    UPDATE market_data SET 
-                        current_price = %s,
-                        change_percentage = %s,
-                        trend = %s,
-                        updated_at = NOW()
-                    WHERE symbol = %s
-                """, (response['current_price'], response['slope'], response['trend'], symbol))
-            else:
-                # Insert new record
-                cursor.execute("""
-                    INSERT INTO market_data (symbol, current_price, change_percentage, trend, updated_at) 
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, (symbol, response['current_price'], response['slope'], response['trend']))
+        logger.debug("Storing data for %s in database", symbol)
+        with span('stage', 'analysis.persist'):
+            store_success = store_price_data(symbol, response)
+            if not store_success:
+                logger.warning(f"Failed to store price data for {symbol}")
             
-            conn.commit()
-            cursor.close()
-            db_manager.release_connection(conn)
-        except Exception as e:
-            logger.error(f"Database error in analyze_stock: {e}")
-            cursor.close()
-            db_manager.release_connection(conn)
-            # Continue processing - we don't want to fail the entire analysis if DB storage fails
+            # Store or update analysis results in the market_data table
+            if not store_market_data(symbol, response):
+                logger.warning(f"Failed to store market data for {symbol}")
         
         return response
         
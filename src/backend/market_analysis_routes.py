@@ -1,7 +1,8 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from db_connection import db_manager
-from market_analysis import analyze_stock, generate_synthetic_data
+from market_analysis import analyze_stock, generate_synthetic_data, get_synthetic_series, rebuild_trend_breadth, TREND_ASSET_CLASSES
 import json
+import os
 import logging
 import concurrent.futures
 import time
@@ -32,13 +33,13 @@ def get_market_analysis(symbol):
             second_currency = clean_symbol[3:]
             if first_currency in forex_currencies and second_currency in forex_currencies:
                 is_forex = True
-                logger.info(f"Forex pair detected: {symbol}")
+                logger.debug("Forex pair detected: %s", symbol)
         
-        logger.info(f"Fetching market analysis for symbol: {symbol}, clean_symbol: {clean_symbol}")
+        logger.debug("Fetching market analysis for symbol: %s, clean_symbol: %s", symbol, clean_symbol)
         
         # For forex pairs, first check if we have CURRENT data
         if is_forex:
-            logger.info(f"Checking for current data for forex pair: {symbol}")
+            logger.debug("Checking for current data for forex pair: %s", symbol)
             # Get the most recent date from price history
             conn = db_manager.get_connection()
             cursor = conn.cursor()
@@ -65,11 +66,11 @@ def get_market_analysis(symbol):
                 data_is_stale = True
                 
             if data_is_stale:
-                logger.info(f"Data for {symbol} is stale or missing, generating fresh data")
+                logger.info(f"Data for {symbol} is stale or missing, materializing today's series")
                 cursor.close()
                 db_manager.release_connection(conn)
-                # Generate fresh synthetic data for forex pairs
-                synthetic_data = generate_synthetic_data(symbol)
+                # Materialize today's synthetic series; later requests are served from price_history
+                synthetic_data = get_synthetic_series(symbol)
                 ensure_complete_response_structure(synthetic_data)
                 return jsonify(synthetic_data), 200
                 
@@ -242,10 +243,10 @@ def get_market_analysis(symbol):
         
         # Generate fresh data for stale or missing historical data
         if data_is_stale and is_forex:
-            logger.info(f"Generating new synthetic data for stale historical data for {symbol}")
+            logger.info(f"Materializing synthetic series for stale historical data for {symbol}")
             cursor.close()
             db_manager.release_connection(conn)
-            synthetic_data = generate_synthetic_data(symbol)
+            synthetic_data = get_synthetic_series(symbol)
             ensure_complete_response_structure(synthetic_data)
             return jsonify(synthetic_data), 200
         
@@ -407,7 +408,7 @@ def get_symbol_history(symbol):
         # Clean the symbol by removing -X suffix if present
         clean_symbol = symbol.split('-X')[0] if '-X' in symbol else symbol
         
-        logger.info(f"Fetching price history for symbol: {symbol}, clean_symbol: {clean_symbol}")
+        logger.debug("Fetching price history for symbol: %s, clean_symbol: %s", symbol, clean_symbol)
         
         conn = db_manager.get_connection()
         cursor = conn.cursor()
@@ -495,91 +496,88 @@ def get_symbol_history(symbol):
             "history": []
         }), 500
 
+def summarize_trend_counts(bullish_count, bearish_count, neutral_count):
+    """Turn trend breadth counts into the /api/market-trends response fields"""
+    total_symbols = bullish_count + bearish_count + neutral_count
+    bullish_percentage = (bullish_count / total_symbols) * 100 if total_symbols > 0 else 0
+    bearish_percentage = (bearish_count / total_symbols) * 100 if total_symbols > 0 else 0
+    neutral_percentage = (neutral_count / total_symbols) * 100 if total_symbols > 0 else 100
+    
+    # Determine overall market sentiment
+    if bullish_percentage > bearish_percentage and bullish_percentage > 50:
+        overall_trend = "bullish"
+    elif bearish_percentage > bullish_percentage and bearish_percentage > 50:
+        overall_trend = "bearish"
+    else:
+        overall_trend = "neutral"
+    
+    return {
+        "overall_trend": overall_trend,
+        "bullish_percentage": round(bullish_percentage, 2),
+        "bearish_percentage": round(bearish_percentage, 2),
+        "neutral_percentage": round(neutral_percentage, 2),
+        "total_symbols": total_symbols
+    }
+
 @market_analysis_bp.route('/api/market-trends', methods=['GET'])
 def get_market_trends():
-    """Get overall market trend (bullish/bearish) based on market_data table"""
+    """
+    Get overall market trend (bullish/bearish) from the trend breadth aggregate
+    
+    Optional query parameter asset_class selects 'forex', 'index' or 'stock'
+    instead of the 'all' total.
+    """
     conn = None
+    cursor = None
+    asset_class = request.args.get('asset_class', 'all')
+    if asset_class not in TREND_ASSET_CLASSES + ['all']:
+        return jsonify({
+            "success": False,
+            "error": f"asset_class must be one of: {', '.join(TREND_ASSET_CLASSES + ['all'])}"
+        }), 400
+    
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        try:
-            # Get all symbols from market_data
+        cursor.execute("""
+            SELECT bullish_count, bearish_count, neutral_count
+            FROM market_trend_breadth
+            WHERE asset_class = %s
+        """, (asset_class,))
+        row = cursor.fetchone()
+        
+        if row is None:
+            # First read after deployment: build the aggregate once from market_data
+            logger.info("Trend breadth aggregate missing, rebuilding from market_data")
+            rebuild_trend_breadth(cursor)
+            conn.commit()
             cursor.execute("""
-                SELECT symbol, trend
-                FROM market_data
-            """)
-            market_rows = cursor.fetchall()
-            
-            if not market_rows:
-                # Return default data if no market data available
-                cursor.close()
-                db_manager.release_connection(conn)
-                return jsonify({
-                    "success": True,
-                    "data": {
-                        "overall_trend": "neutral",
-                        "bullish_percentage": 0,
-                        "bearish_percentage": 0,
-                        "neutral_percentage": 100,
-                        "total_symbols": 0
-                    }
-                }), 200
-            
-            # Convert tuples to dictionaries
-            market_data = []
-            for row in market_rows:
-                if len(row) >= 2:  # Ensure row has enough elements
-                    market_data.append({
-                        'symbol': row[0],
-                        'trend': row[1]
-                    })
-            
-            # Count bullish and bearish symbols
-            bullish_count = sum(1 for item in market_data if item['trend'] == 'Bullish')
-            bearish_count = sum(1 for item in market_data if item['trend'] == 'Bearish')
-            neutral_count = sum(1 for item in market_data if item['trend'] == 'Neutral')
-            
-            # Calculate overall trend
-            total_symbols = len(market_data)
-            bullish_percentage = (bullish_count / total_symbols) * 100 if total_symbols > 0 else 0
-            bearish_percentage = (bearish_count / total_symbols) * 100 if total_symbols > 0 else 0
-            neutral_percentage = (neutral_count / total_symbols) * 100 if total_symbols > 0 else 0
-            
-            # Determine overall market sentiment
-            if bullish_percentage > bearish_percentage and bullish_percentage > 50:
-                overall_trend = "bullish"
-            elif bearish_percentage > bullish_percentage and bearish_percentage > 50:
-                overall_trend = "bearish"
-            else:
-                overall_trend = "neutral"
-        except Exception as query_error:
-            logger.error(f"Error executing market trends query: {str(query_error)}")
-            # Return default data on query error
-            overall_trend = "neutral"
-            bullish_percentage = 0
-            bearish_percentage = 0
-            neutral_percentage = 100
-            total_symbols = 0
+                SELECT bullish_count, bearish_count, neutral_count
+                FROM market_trend_breadth
+                WHERE asset_class = %s
+            """, (asset_class,))
+            row = cursor.fetchone()
         
         cursor.close()
         db_manager.release_connection(conn)
         
+        data = summarize_trend_counts(*(row if row else (0, 0, 0)))
+        data["asset_class"] = asset_class
+        
         return jsonify({
             "success": True,
-            "data": {
-                "overall_trend": overall_trend,
-                "bullish_percentage": round(bullish_percentage, 2),
-                "bearish_percentage": round(bearish_percentage, 2),
-                "neutral_percentage": round(neutral_percentage, 2),
-                "total_symbols": total_symbols
-            }
+            "data": data
         }), 200
     except Exception as e:
         logger.error(f"Error fetching market trends: {str(e)}")
-        if 'cursor' in locals() and cursor:
+        if cursor:
             cursor.close()
         if conn:
+            try:
+                conn.rollback()
+            except:
+                pass
             db_manager.release_connection(conn)
         return jsonify({
             "success": False,
@@ -593,6 +591,75 @@ def get_market_trends():
             }
         }), 500 
 
+@market_analysis_bp.route('/api/market-trends/history', methods=['GET'])
+def get_market_trends_history():
+    """
+    Get time-bucketed trend breadth history
+    
+    Query parameters:
+        asset_class: 'all' (default), 'forex', 'index' or 'stock'
+        bucket: 'hour' (default) or 'day'; daily buckets use the last hourly snapshot of each day
+        days: How far back to look (default 7)
+    
+    Buckets are only recorded when breadth changes, so a missing bucket means
+    the breadth was the same as in the previous one.
+    """
+    conn = None
+    cursor = None
+    asset_class = request.args.get('asset_class', 'all')
+    bucket = request.args.get('bucket', 'hour')
+    days = request.args.get('days', default=7, type=int)
+    
+    if bucket not in ('hour', 'day'):
+        return jsonify({"success": False, "error": "bucket must be 'hour' or 'day'", "data": []}), 400
+    if asset_class not in TREND_ASSET_CLASSES + ['all']:
+        return jsonify({
+            "success": False,
+            "error": f"asset_class must be one of: {', '.join(TREND_ASSET_CLASSES + ['all'])}",
+            "data": []
+        }), 400
+    
+    try:
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT DISTINCT ON (date_trunc(%s, bucket))
+                date_trunc(%s, bucket) AS period, bullish_count, bearish_count, neutral_count
+            FROM market_trend_breadth_history
+            WHERE asset_class = %s
+              AND bucket >= NOW() - make_interval(days => %s)
+            ORDER BY date_trunc(%s, bucket), bucket DESC
+        """, (bucket, bucket, asset_class, days, bucket))
+        rows = cursor.fetchall()
+        
+        cursor.close()
+        db_manager.release_connection(conn)
+        
+        history = []
+        for period, bullish_count, bearish_count, neutral_count in rows:
+            entry = summarize_trend_counts(bullish_count, bearish_count, neutral_count)
+            entry["bucket"] = period.isoformat()
+            history.append(entry)
+        
+        return jsonify({
+            "success": True,
+            "asset_class": asset_class,
+            "bucket": bucket,
+            "data": history
+        }), 200
+    except Exception as e:
+        logger.error(f"Error fetching market trends history: {str(e)}")
+        if cursor:
+            cursor.close()
+        if conn:
+            db_manager.release_connection(conn)
+        return jsonify({
+            "success": False,
+            "error": f"Error fetching market trends history: {str(e)}",
+            "data": []
+        }), 500
+
 @market_analysis_bp.route('/api/market-analysis/<symbol>/synthetic', methods=['GET'])
 def get_synthetic_market_analysis(symbol):
     """Get synthetic market analysis data for any symbol"""
@@ -607,9 +674,132 @@ def get_synthetic_market_analysis(symbol):
         logger.error(f"Error generating synthetic data: {str(e)}")
         return jsonify({"error": str(e)}), 500 
 
+# Upper bound on symbols per batch request and on concurrent analyses for misses
+MAX_BATCH_SYMBOLS = int(os.environ.get('MAX_BATCH_SYMBOLS', 500))
+BATCH_ANALYSIS_WORKERS = int(os.environ.get('BATCH_ANALYSIS_WORKERS', 3))
+
+def load_batch_from_db(symbols):
+    """
+    Load stored analysis for many symbols with one set-based query per table
+    
+    Args:
+        symbols (list): Symbols to look up
+        
+    Returns:
+        dict: Analysis responses keyed by symbol, only for symbols found in market_data
+    """
+    results = {}
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT 
+                md.symbol,
+                md.current_price, 
+                md.trend,
+                ti.rsi, 
+                ti.macd, 
+                ti.macd_signal, 
+                ti.macd_hist, 
+                ti.sma20, 
+                ti.sma50, 
+                ti.sma200
+            FROM market_data md
+            LEFT JOIN technical_indicators ti ON md.symbol = ti.symbol
+            WHERE md.symbol = ANY(%s)
+        """, (symbols,))
+        
+        for row in cursor.fetchall():
+            results[row[0]] = {
+                "symbol": row[0],
+                "current_price": float(row[1]) if row[1] else 0.0,
+                "trend": row[2] if row[2] else "Neutral",
+                "technical_indicators": {
+                    "rsi": float(row[3]) if row[3] else 0.0,
+                    "macd": float(row[4]) if row[4] else 0.0,
+                    "macd_signal": float(row[5]) if row[5] else 0.0,
+                    "macd_hist": float(row[6]) if row[6] else 0.0,
+                    "sma20": float(row[7]) if row[7] else 0.0,
+                    "sma50": float(row[8]) if row[8] else 0.0,
+                    "sma200": float(row[9]) if row[9] else 0.0
+                },
+                "support_resistance": {
+                    "support": [],
+                    "resistance": []
+                },
+                "predictions": [],
+                "prediction_dates": []
+            }
+        
+        if results:
+            found_symbols = list(results)
+            
+            # Support and resistance levels for every found symbol
+            cursor.execute("""
+                SELECT symbol, level_type, level_value
+                FROM support_resistance
+                WHERE symbol = ANY(%s)
+            """, (found_symbols,))
+            
+            for symbol, level_type, level_value in cursor.fetchall():
+                if level_type in ('support', 'resistance'):
+                    results[symbol]["support_resistance"][level_type].append(float(level_value))
+            
+            # Price predictions for every found symbol
+            cursor.execute("""
+                SELECT symbol, prediction_date, predicted_price
+                FROM price_predictions
+                WHERE symbol = ANY(%s)
+                ORDER BY symbol, prediction_date ASC
+            """, (found_symbols,))
+            
+            for symbol, date, price in cursor.fetchall():
+                results[symbol]["prediction_dates"].append(date.strftime('%Y-%m-%d'))
+                results[symbol]["predictions"].append(float(price) if price else 0.0)
+    finally:
+        cursor.close()
+        db_manager.release_connection(conn)
+    
+    return results
+
+def iter_analyzed_symbols(symbols):
+    """
+    Analyze symbols on a bounded thread pool, yielding (symbol, data) as each finishes
+    
+    Pending analyses are cancelled if the consumer stops iterating early
+    (for example when a streaming client disconnects).
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_ANALYSIS_WORKERS)
+    try:
+        # Stagger only within each wave of workers to avoid rate limits
+        future_to_symbol = {
+            executor.submit(analyze_with_backoff, symbol, i % BATCH_ANALYSIS_WORKERS): symbol 
+            for i, symbol in enumerate(symbols)
+        }
+        
+        for future in concurrent.futures.as_completed(future_to_symbol):
+            symbol = future_to_symbol[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing symbol {symbol}: {e}")
+                data = None
+            # Use synthetic data as fallback
+            yield symbol, data or generate_synthetic_data(symbol)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 @market_analysis_bp.route('/api/market-analysis/batch', methods=['POST'])
 def batch_market_analysis():
-    """Process multiple symbols in a single request to optimize caching and reduce API calls"""
+    """
+    Process multiple symbols in a single request to optimize caching and reduce API calls
+    
+    Stored results are loaded with one query per table. Symbols missing from the
+    database are analyzed concurrently. By default the response is a single JSON
+    object; with ?stream=true or an Accept: application/x-ndjson header each
+    symbol is streamed as its own NDJSON line as soon as it is ready.
+    """
     try:
         # Get symbols from request
         data = request.get_json()
@@ -619,147 +809,46 @@ def batch_market_analysis():
         symbols = data.get('symbols', [])
         if not symbols or not isinstance(symbols, list):
             return jsonify({"error": "Invalid symbols format"}), 400
-            
-        # Limit number of symbols per batch
-        max_symbols = 10
-        if len(symbols) > max_symbols:
-            logger.warning(f"Too many symbols requested: {len(symbols)}. Limiting to {max_symbols}")
-            symbols = symbols[:max_symbols]
         
-        logger.info(f"Processing batch request for {len(symbols)} symbols")
+        # Drop duplicates while keeping request order
+        symbols = list(dict.fromkeys(s for s in symbols if isinstance(s, str) and s))
+        if len(symbols) > MAX_BATCH_SYMBOLS:
+            logger.warning(f"Too many symbols requested: {len(symbols)}. Limiting to {MAX_BATCH_SYMBOLS}")
+            symbols = symbols[:MAX_BATCH_SYMBOLS]
         
-        # Process symbols
-        results = {}
-        db_loaded = set()  # Keep track of symbols loaded from DB
+        stream = request.args.get('stream', 'false').lower() == 'true' or \
+            'application/x-ndjson' in request.headers.get('Accept', '')
         
-        # First try to get data from database for all symbols
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        logger.info(f"Processing batch request for {len(symbols)} symbols (stream={stream})")
         
+        # First try to get data from database for all symbols
         try:
-            # Create placeholders for SQL query
-            placeholders = ','.join(['%s'] * len(symbols))
-            cursor.execute(f"""
-                SELECT 
-                    md.symbol,
-                    md.current_price, 
-                    md.trend,
-                    ti.rsi, 
-                    ti.macd, 
-                    ti.macd_signal, 
-                    ti.macd_hist, 
-                    ti.sma20, 
-                    ti.sma50, 
-                    ti.sma200
-                FROM market_data md
-                LEFT JOIN technical_indicators ti ON md.symbol = ti.symbol
-                WHERE md.symbol IN ({placeholders})
-            """, symbols)
-            
-            market_rows = cursor.fetchall()
-            
-            # Process database results
-            for row in market_rows:
-                if len(row) < 10:
-                    continue
-                    
-                symbol = row[0]
-                db_loaded.add(symbol)
-                
-                # Extract support and resistance levels for this symbol
-                cursor.execute("""
-                    SELECT level_type, level_value
-                    FROM support_resistance
-                    WHERE symbol = %s
-                """, (symbol,))
-                
-                sr_rows = cursor.fetchall()
-                
-                # Extract price predictions
-                cursor.execute("""
-                    SELECT prediction_date, predicted_price
-                    FROM price_predictions
-                    WHERE symbol = %s
-                    ORDER BY prediction_date ASC
-                """, (symbol,))
-                
-                prediction_rows = cursor.fetchall()
-                
-                # Build response
-                response = {
-                    "symbol": symbol,
-                    "current_price": float(row[1]) if row[1] else 0.0,
-                    "trend": row[2] if row[2] else "Neutral",
-                    "technical_indicators": {
-                        "rsi": float(row[3]) if row[3] else 0.0,
-                        "macd": float(row[4]) if row[4] else 0.0,
-                        "macd_signal": float(row[5]) if row[5] else 0.0,
-                        "macd_hist": float(row[6]) if row[6] else 0.0,
-                        "sma20": float(row[7]) if row[7] else 0.0,
-                        "sma50": float(row[8]) if row[8] else 0.0,
-                        "sma200": float(row[9]) if row[9] else 0.0
-                    },
-                    "support_resistance": {
-                        "support": [],
-                        "resistance": []
-                    },
-                    "predictions": [],
-                    "prediction_dates": []
-                }
-                
-                # Process support and resistance levels
-                for sr_row in sr_rows:
-                    level_type, level_value = sr_row
-                    if level_type == 'support':
-                        response["support_resistance"]["support"].append(float(level_value))
-                    elif level_type == 'resistance':
-                        response["support_resistance"]["resistance"].append(float(level_value))
-                
-                # Process predictions
-                for pred_row in prediction_rows:
-                    date, price = pred_row
-                    response["prediction_dates"].append(date.strftime('%Y-%m-%d'))
-                    response["predictions"].append(float(price) if price else 0.0)
-                
-                # Store in results
-                results[symbol] = response
-            
-            # Close cursor and release connection
-            cursor.close()
-            db_manager.release_connection(conn)
-            
+            db_results = load_batch_from_db(symbols)
         except Exception as db_error:
             logger.error(f"Database error in batch processing: {db_error}")
-            if cursor:
-                cursor.close()
-            if 'conn' in locals() and conn:
-                db_manager.release_connection(conn)
-        
-        # Process symbols not found in database using a thread pool
-        symbols_to_analyze = [s for s in symbols if s not in db_loaded]
+            db_results = {}
         
+        symbols_to_analyze = [s for s in symbols if s not in db_results]
         if symbols_to_analyze:
             logger.info(f"Analyzing {len(symbols_to_analyze)} symbols not found in database")
+        
+        if stream:
+            def generate():
+                for symbol, result in db_results.items():
+                    yield json.dumps({"symbol": symbol, "source": "database", "data": result}) + "\n"
+                for symbol, result in iter_analyzed_symbols(symbols_to_analyze):
+                    yield json.dumps({"symbol": symbol, "source": "analysis", "data": result}) + "\n"
+                yield json.dumps({"done": True, "count": len(symbols)}) + "\n"
             
-            # Process in parallel with a maximum of 3 workers to avoid rate limits
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                # Submit all tasks
-                future_to_symbol = {
-                    executor.submit(analyze_with_backoff, symbol, i): symbol 
-                    for i, symbol in enumerate(symbols_to_analyze)
-                }
-                
-                # Collect results as they complete
-                for future in concurrent.futures.as_completed(future_to_symbol):
-                    symbol = future_to_symbol[future]
-                    try:
-                        data = future.result()
-                        if data:
-                            results[symbol] = data
-                    except Exception as e:
-                        logger.error(f"Error analyzing symbol {symbol}: {e}")
-                        # Use synthetic data as fallback
-                        results[symbol] = generate_synthetic_data(symbol)
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+                # Ask proxies not to buffer so lines reach the client as they are produced
+                'X-Accel-Buffering': 'no',
+                'Cache-Control': 'no-cache'
+            })
+        
+        results = dict(db_results)
+        for symbol, result in iter_analyzed_symbols(symbols_to_analyze):
+            results[symbol] = result
         
         return jsonify({"results": results}), 200
         
@@ -778,4 +867,4 @@ def analyze_with_backoff(symbol, index):
         return analyze_stock(symbol)
     except Exception as e:
         logger.error(f"Error analyzing {symbol}: {e}")
-        return generate_synthetic_data(symbol) 
\ No newline at end of file
+        return generate_synthetic_data(symbol) 
@@ -0,0 +1,289 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+import contextvars
+import pandas as pd
+import threading
+import logging
+import time
+import os
+
+# Configure logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Routing settings (override with environment variables)
+PROVIDER_HEDGE_AFTER = float(os.environ.get('PROVIDER_HEDGE_AFTER_MS', 1500)) / 1000.0  # Start the secondary after this long
+PROVIDER_TIMEOUT = float(os.environ.get('PROVIDER_TIMEOUT_MS', 20000)) / 1000.0  # Give up on all providers after this long
+PROVIDER_WORKERS = int(os.environ.get('PROVIDER_WORKERS', 8))
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class MarketDataProvider:
+    """
+    Base class for historical price sources
+
+    Subclasses implement fetch_history and return a DataFrame indexed by date
+    with the Yahoo Finance column names (Open, High, Low, Close, Volume), or
+    None when the provider has no data for the symbol.
+    """
+    name = 'provider'
+
+    def supports(self, symbol):
+        """Whether this provider can serve the symbol at all"""
+        return True
+
+    def is_cached(self, symbol, start_date_str, end_date_str):
+        """Whether fetch_history would answer from the provider's own cache, with no upstream call"""
+        return False
+
+    def has_capacity(self):
+        """Whether a call can go out now without waiting on the provider's own rate limiter"""
+        return True
+
+    def fetch_history(self, symbol, start_date_str, end_date_str):
+        raise NotImplementedError
+
+class YahooProvider(MarketDataProvider):
+    """Yahoo Finance through market_analysis.get_ticker_data (keeps its caches and rate limiter)"""
+    name = 'yahoo'
+
+    def __init__(self, fetch_fn, rate_limiter=None, cached_fn=None):
+        """
+        Args:
+            fetch_fn (callable): get_ticker_data(symbol, start_date_str, end_date_str)
+            rate_limiter (RateLimiter, optional): Limiter used by fetch_fn, checked without blocking
+            cached_fn (callable, optional): Same arguments as fetch_fn; True when fetch_fn
+                would answer from its cache
+        """
+        self.fetch_fn = fetch_fn
+        self.rate_limiter = rate_limiter
+        self.cached_fn = cached_fn
+
+    def is_cached(self, symbol, start_date_str, end_date_str):
+        return self.cached_fn is not None and self.cached_fn(symbol, start_date_str, end_date_str)
+
+    def has_capacity(self):
+        return self.rate_limiter is None or self.rate_limiter.has_capacity()
+
+    def fetch_history(self, symbol, start_date_str, end_date_str):
+        return self.fetch_fn(symbol, start_date_str, end_date_str)
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Alpha Vantage daily series through the shared AlphaVantageAPI client"""
+    name = 'alpha_vantage'
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client (AlphaVantageAPI, optional): Client to use, defaults to the shared instance
+        """
+        self.client = client
+
+    def _get_client(self):
+        # Imported lazily so the client (and its cache directory) is only set up when used
+        if self.client is None:
+            from alpha_vantage_api import alpha_vantage
+            self.client = alpha_vantage
+        return self.client
+
+    def supports(self, symbol):
+        # Alpha Vantage has no Yahoo-style index (^GSPC) or futures (GC=F) symbols
+        return not symbol.startswith('^') and not symbol.endswith('=F')
+
+    def fetch_history(self, symbol, start_date_str, end_date_str):
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+        days = (datetime.now() - start_date).days + 1
+
+        clean_symbol = symbol.replace('=X', '').replace('-X', '')
+        if symbol.endswith('=X') and len(clean_symbol) == 6:
+            df = self._get_client().get_forex_data(clean_symbol[:3], clean_symbol[3:], days=days)
+        else:
+            df = self._get_client().get_daily_data(clean_symbol, days=days)
+
+        if df is None or df.empty:
+            return None
+
+        # Match the Yahoo Finance frame layout used by analyze_stock
+        df = df.rename(columns={col: col.title() for col in df.columns})
+        if 'Volume' not in df.columns:
+            df['Volume'] = 0.0
+        df = df[PRICE_COLUMNS]
+        df = df[(df.index >= pd.Timestamp(start_date)) & (df.index < pd.Timestamp(end_date + timedelta(days=1)))]
+        return df if not df.empty else None
+
+class ProviderHealth:
+    """
+    Exponentially weighted success rate and latency for one provider
+
+    A provider whose success rate drops below min_success is skipped for
+    cooldown seconds after its last failure, then probed again.
+    """
+    def __init__(self, alpha=0.2, min_success=0.3, cooldown=60.0):
+        self.alpha = alpha
+        self.min_success = min_success
+        self.cooldown = cooldown
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.last_failure = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, ok, elapsed):
+        with self.lock:
+            self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+            self.latency += self.alpha * (elapsed - self.latency)
+            if not ok:
+                self.last_failure = time.monotonic()
+
+    def is_available(self):
+        with self.lock:
+            if self.success_rate >= self.min_success:
+                return True
+            return time.monotonic() - self.last_failure >= self.cooldown
+
+    def score(self, latency_scale):
+        """Higher is better: success rate discounted by latency relative to latency_scale"""
+        with self.lock:
+            return self.success_rate / (1.0 + self.latency / latency_scale)
+
+class ProviderBudget:
+    """Non-blocking sliding window budget: callers skip the provider instead of waiting"""
+    def __init__(self, max_calls, period):
+        self.max_calls = max_calls
+        self.period = period
+        self.call_times = []
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.call_times = [t for t in self.call_times if t > now - self.period]
+            if len(self.call_times) >= self.max_calls:
+                return False
+            self.call_times.append(now)
+            return True
+
+class ProviderRouter:
+    """
+    Routes history requests across providers by health, with budgets and hedging
+
+    Providers are tried in order of health score (ties keep the configured
+    order). The best provider is called first; if it fails, the next one is
+    called right away, and if it is merely slow, the next one is started after
+    hedge_after seconds. The first non-empty result wins. Providers without
+    budget left or with an open circuit are skipped, so a throttled upstream
+    never adds waiting time to the request.
+    """
+    def __init__(self, providers, budgets=None, hedge_after=PROVIDER_HEDGE_AFTER,
+                 timeout=PROVIDER_TIMEOUT, max_workers=PROVIDER_WORKERS):
+        """
+        Args:
+            providers (list): MarketDataProvider instances in priority order
+            budgets (dict, optional): Provider name -> (max_calls, period_seconds)
+            hedge_after (float): Seconds to wait on a provider before hedging to the next
+            timeout (float): Overall deadline in seconds
+            max_workers (int): Threads available for provider calls
+        """
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.health = {p.name: ProviderHealth() for p in self.providers}
+        self.budgets = {name: ProviderBudget(*limits) for name, limits in (budgets or {}).items()}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='market-data')
+
+    def ranked_providers(self, symbol):
+        """Available providers for a symbol, best first"""
+        candidates = [p for p in self.providers if p.supports(symbol) and self.health[p.name].is_available()]
+        scale = max(self.hedge_after, 0.001)
+        return sorted(candidates, key=lambda p: -self.health[p.name].score(scale))
+
+    def _call(self, provider, symbol, start_date_str, end_date_str):
+        started = time.monotonic()
+        try:
+            df = provider.fetch_history(symbol, start_date_str, end_date_str)
+        except Exception as e:
+            logger.error(f"Provider {provider.name} failed for {symbol}: {e}")
+            df = None
+        ok = df is not None and not df.empty
+        self.health[provider.name].record(ok, time.monotonic() - started)
+        return df if ok else None
+
+    def _start_next(self, queue, pending, symbol, start_date_str, end_date_str):
+        """
+        Submit the next provider in queue that has budget left; return False if none
+
+        A provider that can answer from its own cache makes no upstream call,
+        so neither its rate limiter nor its budget is consulted.
+        """
+        while queue:
+            provider = queue.pop(0)
+            if not provider.is_cached(symbol, start_date_str, end_date_str):
+                budget = self.budgets.get(provider.name)
+                if not provider.has_capacity() or (budget is not None and not budget.try_acquire()):
+                    logger.info(f"Provider {provider.name} is out of budget, skipping for {symbol}")
+                    continue
+            # Run in a copy of the caller's context so provider spans join the request trace
+            context = contextvars.copy_context()
+            future = self.executor.submit(context.run, self._call, provider, symbol, start_date_str, end_date_str)
+            pending[future] = provider.name
+            return True
+        return False
+
+    def fetch_history(self, symbol, start_date_str, end_date_str):
+        """
+        Fetch history from the best available provider
+
+        Args:
+            symbol (str): Symbol in Yahoo Finance format
+            start_date_str (str): Start date in YYYY-MM-DD format
+            end_date_str (str): End date in YYYY-MM-DD format
+
+        Returns:
+            tuple: (DataFrame, provider name), or (None, None) if every provider failed
+        """
+        queue = self.ranked_providers(symbol)
+        pending = {}
+        deadline = time.monotonic() + self.timeout
+
+        if not self._start_next(queue, pending, symbol, start_date_str, end_date_str):
+            logger.warning(f"No market data provider available for {symbol}")
+            return None, None
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            # Wait for a result, but only up to the hedge point while a secondary remains
+            wait_for = min(self.hedge_after, remaining) if queue else remaining
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                logger.info(f"Hedging {symbol} after {self.hedge_after:.2f}s to next provider")
+                self._start_next(queue, pending, symbol, start_date_str, end_date_str)
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                df = future.result()
+                if df is not None:
+                    # Slower calls keep running in the background and still update health
+                    return df, name
+
+            # Every finished call failed; fail over immediately if nothing else is running
+            if not pending:
+                self._start_next(queue, pending, symbol, start_date_str, end_date_str)
+
+        logger.warning(f"All market data providers failed for {symbol}")
+        return None, None
+
+    def status(self):
+        """Health snapshot for diagnostics"""
+        return {
+            name: {
+                'success_rate': round(health.success_rate, 3),
+                'latency': round(health.latency, 3),
+                'available': health.is_available()
+            }
+            for name, health in self.health.items()
+        }
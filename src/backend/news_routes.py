@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import logging
 import random
 from dotenv import load_dotenv
+from instrumentation import span, record_cache
 
 # Load environment variables
 load_dotenv()
@@ -36,10 +37,12 @@ def get_from_cache(cache_key):
         cache_entry = news_cache[cache_key]
         # Check if cache is still valid
         if (datetime.now() - cache_entry['timestamp']).total_seconds() < CACHE_EXPIRY:
-            logger.info(f"Using cached data for {cache_key}")
+            logger.debug("Using cached data for %s", cache_key)
+            record_cache('news', 'memory', hit=True)
             return cache_entry['data']
         else:
             logger.info(f"Cache expired for {cache_key}")
+    record_cache('news', 'memory', hit=False)
     return None
 
 def save_to_cache(cache_key, data):
@@ -238,7 +241,7 @@ def get_forex_news():
         page_size = int(request.args.get('pageSize', '5'))
         force_refresh = request.args.get('forceRefresh', 'false').lower() == 'true'
         
-        logger.info(f"Getting forex news with category: {category}, page: {page}")
+        logger.debug("Getting forex news with category: %s, page: %s", category, page)
         
         # Generate cache key
         cache_key = get_cache_key(category, page)
@@ -276,7 +279,8 @@ def get_forex_news():
             "domains": "reuters.com,ft.com,bloomberg.com,cnbc.com,wsj.com,economist.com,investing.com,marketwatch.com"
         }
         
-        response = requests.get(NEWS_API_URL, params=params, timeout=5)
+        with span('upstream', 'newsapi'):
+            response = requests.get(NEWS_API_URL, params=params, timeout=5)
         
         if response.status_code == 200:
             news_data = response.json()
@@ -0,0 +1,124 @@
+"""
+Password hashing on a dedicated, bounded worker pool.
+
+werkzeug's password hashes are deliberately slow. Running them inline lets a
+burst of logins occupy every gunicorn thread, and the analysis endpoints then
+starve. Here hashing runs on a small executor (HASH_WORKERS threads).
+
+The request thread still waits for its result, so what protects the other
+endpoints is the admission limit: at most HASH_MAX_IN_FLIGHT requests per
+process may be hashing or waiting for a hash. It defaults to half of
+WEB_THREADS, the gunicorn --threads value (render.yaml passes the same
+variable to gunicorn), so the rest of the worker's threads stay free during
+an auth burst. Further work is refused at once with HashingBusyError, which
+the app turns into a 503 with Retry-After. With a single request thread no
+share can be reserved, so run gunicorn with at least 2 threads.
+
+    future = hasher.submit_check(stored_hash, password)   # non-blocking
+    ok = check_password(stored_hash, password)             # waits up to HASH_TIMEOUT
+
+Hash before taking a pool connection, or release it first, so a request
+waiting here does not also hold a database connection.
+
+Environment:
+    WEB_THREADS         Request threads per gunicorn worker (default 1)
+    HASH_MAX_IN_FLIGHT  Requests admitted to hashing per process (default WEB_THREADS // 2, at least 1)
+    HASH_WORKERS        Hashing threads per process, at most HASH_MAX_IN_FLIGHT (default 2)
+    HASH_TIMEOUT        Seconds a request waits for its result (default 10)
+    HASH_RETRY_AFTER    Retry-After seconds sent with 503 responses (default 2)
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from instrumentation import Counter, METRICS, span
+from flask import jsonify
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+hash_rejections = Counter('marketpulse_password_hash_rejected_total', 'Password hash jobs refused by admission control', ('reason',))
+METRICS.append(hash_rejections)
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool cannot take or finish a job in time"""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """
+    Bounded executor for password hashing with admission control
+
+    Args:
+        workers (int): Threads doing the hashing
+        max_in_flight (int): Jobs admitted at once, running or waiting for a
+            worker; each one normally has a request thread blocked on it
+        timeout (float): Seconds the blocking helpers wait for a result
+        retry_after (int): Seconds clients are told to wait when refused
+    """
+    def __init__(self, workers=2, max_in_flight=1, timeout=10.0, retry_after=2):
+        self.max_in_flight = max(1, max_in_flight)
+        self.workers = max(1, min(workers, self.max_in_flight))
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) on the pool, or raise HashingBusyError when it is full"""
+        if not self.slots.acquire(blocking=False):
+            hash_rejections.inc('queue_full')
+            logger.warning("Password hashing pool is full, refusing job")
+            raise HashingBusyError("Too many authentication requests, please retry shortly", self.retry_after)
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def submit_hash(self, password):
+        return self.submit(generate_password_hash, password)
+
+    def submit_check(self, password_hash, password):
+        return self.submit(check_password_hash, password_hash, password)
+
+    def result(self, future):
+        """Wait for a submitted job, raising HashingBusyError on timeout"""
+        with span('stage', 'auth.password_hash'):
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                hash_rejections.inc('timeout')
+                logger.warning(f"Password hashing did not finish within {self.timeout}s")
+                raise HashingBusyError("Authentication is taking too long, please retry shortly", self.retry_after)
+
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 1))
+
+hasher = PasswordHasher(
+    workers=int(os.environ.get('HASH_WORKERS', 2)),
+    max_in_flight=int(os.environ.get('HASH_MAX_IN_FLIGHT', max(1, WEB_THREADS // 2))),
+    timeout=float(os.environ.get('HASH_TIMEOUT', 10)),
+    retry_after=int(os.environ.get('HASH_RETRY_AFTER', 2))
+)
+
+def hash_password(password):
+    """Hash a password on the pool and wait for the result"""
+    return hasher.result(hasher.submit_hash(password))
+
+def check_password(password_hash, password):
+    """Verify a password against a stored hash on the pool and wait for the result"""
+    return hasher.result(hasher.submit_check(password_hash, password))
+
+def busy_response(error):
+    """503 response for a refused hashing job"""
+    response = jsonify({'status': 'error', 'message': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def init_app(app):
+    """Map HashingBusyError raised outside a route's own handling to a 503"""
+    app.register_error_handler(HashingBusyError, busy_response)
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
 import secrets
 import datetime
-from werkzeug.security import generate_password_hash
-from .database import db_manager
-from .email_service import send_email, get_password_reset_template
+from db_connection import db_manager
+from email_templates import render_template
+from email_outbox import enqueue_email, wake_sender
+from password_hashing import hash_password, HashingBusyError, busy_response
 
 password_reset_bp = Blueprint('password_reset', __name__)
 
@@ -68,19 +69,18 @@ def forgot_password():
             (user[0], token, expiration)
         )
         
-        conn.commit()
-        
         # Create reset URL
         reset_url = f"{request.host_url.rstrip('/')}/#/reset-password?token={token}"
         
-        # Prepare email content
-        email_subject = "MarketPulse Password Reset"
+        # Render subject, HTML and plain-text parts from the compiled template
+        rendered = render_template('password_reset', username=user[1], reset_url=reset_url)
         
-        # Use HTML template for email
-        email_body = get_password_reset_template(user[1], reset_url)
+        # Queue the email in the same transaction as the token; the outbox
+        # sender delivers it in the background
+        enqueue_email(email, rendered.subject, rendered.html, text_body=rendered.text, cursor=cursor)
         
-        # Send email
-        send_email(email, email_subject, email_body, is_html=True)
+        conn.commit()
+        wake_sender()
         
         return jsonify({
             'status': 'success',
@@ -96,6 +96,8 @@ def forgot_password():
     finally:
         if 'cursor' in locals():
             cursor.close()
+        if 'conn' in locals():
+            db_manager.release_connection(conn)
 
 @password_reset_bp.route('/api/auth/reset-password', methods=['POST'])
 def reset_password():
@@ -116,11 +118,13 @@ def reset_password():
             'message': 'New password must be at least 8 characters long'
         }), 400
     
+    conn = None
+    cursor = None
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Find the token
+        # Check the token before spending any hashing work on the request
         current_time = datetime.datetime.now()
         cursor.execute(
             """
@@ -135,22 +139,48 @@ def reset_password():
         
         result = cursor.fetchone()
         
+        # Do not hold a pool connection while waiting for the hashing pool
+        cursor.close()
+        db_manager.release_connection(conn)
+        cursor = None
+        conn = None
+        
         if not result:
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid or expired token'
             }), 400
         
-        user_id = result[0]
+        hashed_password = hash_password(new_password)
         
-        # Mark token as used
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        # Mark token as used; only one request can claim it, and it may have
+        # expired while hashing
         cursor.execute(
-            "UPDATE password_reset_tokens SET used = TRUE WHERE token = %s",
-            (token,)
+            """
+            UPDATE password_reset_tokens SET used = TRUE
+            WHERE token = %s
+              AND expires_at > %s
+              AND used = FALSE
+            RETURNING user_id
+            """,
+            (token, datetime.datetime.now())
         )
         
+        result = cursor.fetchone()
+        
+        if not result:
+            conn.rollback()
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid or expired token'
+            }), 400
+        
+        user_id = result[0]
+        
         # Update password
-        hashed_password = generate_password_hash(new_password)
         cursor.execute(
             "UPDATE login SET pass = %s WHERE user_id = %s",
             (hashed_password, user_id)
@@ -163,6 +193,8 @@ def reset_password():
             'message': 'Password has been reset successfully'
         }), 200
         
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"Error in reset password: {e}")
         return jsonify({
@@ -170,5 +202,7 @@ def reset_password():
             'message': 'An error occurred while resetting your password'
         }), 500
     finally:
-        if 'cursor' in locals():
-            cursor.close() 
\ No newline at end of file
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            db_manager.release_connection(conn) 
\ No newline at end of file
@@ -2,6 +2,7 @@ import requests
 from datetime import datetime, timedelta
 import numpy as np
 from textblob import TextBlob
+from instrumentation import span
 
 def analyze_sentiment(symbol):
     try:
@@ -24,7 +25,8 @@ def analyze_sentiment(symbol):
         }
         
         # Get news from NewsAPI
-        response = requests.get(base_url, params=params)
+        with span('upstream', 'newsapi'):
+            response = requests.get(base_url, params=params)
         news_data = response.json()
         
         # Get recent tweets (simulated since we don't have Twitter API)
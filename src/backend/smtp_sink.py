@@ -0,0 +1,160 @@
+"""
+Local SMTP sink for development and tests.
+
+Accepts every message (and any AUTH credentials) without delivering it. It
+keeps the messages in memory and optionally writes each one to a directory as
+an .eml file. STARTTLS is not offered, so run the app with SMTP_STARTTLS=false.
+
+Usage:
+    python smtp_sink.py --port 1025 --dir sink_mail
+    SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_STARTTLS=false python main.py
+
+In-process:
+    sink = SMTPSink(port=0).start()
+    ... send to ('127.0.0.1', sink.port) ...
+    sink.messages      # list of email.message.Message
+    sink.stop()
+"""
+from email import message_from_bytes
+import socketserver
+import threading
+import argparse
+import time
+import sys
+import os
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def readline(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("client disconnected")
+        return line.rstrip(b'\r\n').decode('utf-8', 'replace')
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply('220 smtp-sink ready')
+        mail_from, recipients = None, []
+        while True:
+            try:
+                line = self.readline()
+            except ConnectionError:
+                return
+            command, _, arg = line.partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.reply('250-smtp-sink')
+                self.reply('250-AUTH PLAIN LOGIN')
+                self.reply('250 8BITMIME')
+            elif command == 'HELO':
+                self.reply('250 smtp-sink')
+            elif command == 'AUTH':
+                mechanism, _, initial = arg.partition(' ')
+                if mechanism.upper() == 'LOGIN':
+                    if not initial:
+                        self.reply('334 VXNlcm5hbWU6')
+                        self.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.readline()
+                elif not initial:
+                    self.reply('334 ')
+                    self.readline()
+                self.reply('235 Authentication successful')
+            elif command == 'MAIL':
+                mail_from, recipients = arg.split(':', 1)[-1].strip(), []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(arg.split(':', 1)[-1].strip())
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw or raw in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(raw[1:] if raw.startswith(b'..') else raw)
+                sink.store(mail_from, recipients, b''.join(lines))
+                mail_from, recipients = None, []
+                self.reply('250 OK: queued')
+            elif command == 'RSET':
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class SMTPSink:
+    """
+    SMTP server that records messages instead of delivering them
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free port (see .port)
+        directory (str, optional): Also write each message here as an .eml file
+    """
+    def __init__(self, host='127.0.0.1', port=1025, directory=None):
+        self.server = _ThreadingServer((host, port), _SMTPHandler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.directory = directory
+        self.messages = []
+        self.envelopes = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def store(self, mail_from, recipients, data):
+        message = message_from_bytes(data)
+        with self.lock:
+            self.messages.append(message)
+            self.envelopes.append((mail_from, list(recipients)))
+            count = len(self.messages)
+        if self.directory:
+            path = os.path.join(self.directory, f"{int(time.time() * 1000)}-{count}.eml")
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='smtp-sink', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--dir', help="Write received messages here as .eml files")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.dir)
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.server.server_close()
+        print(f"Received {len(sink.messages)} messages over {sink.connections} connections")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+File responses for uploaded content that keep work out of Python.
+
+By default files go through werkzeug's send_file with conditional=True:
+ETag/Last-Modified validators, 304s, and single Range requests (206). The body
+is handed to the server as a wsgi.file_wrapper, which gunicorn writes with
+sendfile(2), so no bytes pass through the worker.
+
+Behind a proxy that can serve files itself, set UPLOADS_SENDFILE so the worker
+only returns headers:
+
+    UPLOADS_SENDFILE=x-accel-redirect   nginx; UPLOADS_ACCEL_PREFIX maps to the
+                                        upload folder in an `internal` location
+    UPLOADS_SENDFILE=x-sendfile         Apache mod_xsendfile / lighttpd
+
+    location /protected-uploads/ {
+        internal;
+        alias /srv/marketpulse/public/uploads/;
+    }
+"""
+from flask import request, send_from_directory, Response
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+import mimetypes
+import os
+
+UPLOADS_SENDFILE = os.environ.get('UPLOADS_SENDFILE', '').lower()
+UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SHORT_CACHE_CONTROL = 'public, max-age=60'
+
+def send_upload(folder, filename, etag, immutable, accel_path=None):
+    """
+    Respond with a stored file
+
+    Args:
+        folder (str): Directory holding the file
+        filename (str): File name inside folder
+        etag (str): Strong ETag, e.g. the content hash
+        immutable (bool): Cache for a year when the name is content-addressed
+        accel_path (str, optional): Path of the file below UPLOADS_ACCEL_PREFIX
+
+    Returns:
+        Response
+    """
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    if UPLOADS_SENDFILE in ('x-accel-redirect', 'x-sendfile'):
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if UPLOADS_SENDFILE == 'x-accel-redirect':
+            response.headers['X-Accel-Redirect'] = UPLOADS_ACCEL_PREFIX.rstrip('/') + '/' + (accel_path or filename)
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        response.set_etag(etag)
+        response.last_modified = os.path.getmtime(path)
+        # The proxy fills in the body, Content-Length and ranges itself
+        response.headers.pop('Content-Length', None)
+        response = response.make_conditional(request)
+    else:
+        response = send_from_directory(folder, filename, etag=etag, conditional=True, max_age=None)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else SHORT_CACHE_CONTROL
+    return response
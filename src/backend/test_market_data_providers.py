@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Test script for market data provider routing.
+Runs ProviderRouter against local stub providers that are slow, fail or
+return nothing; no network access is needed:
+   python test_market_data_providers.py
+or with pytest:
+   python -m pytest test_market_data_providers.py
+"""
+
+import sys
+import time
+import logging
+import threading
+import pandas as pd
+from market_data_providers import MarketDataProvider, ProviderRouter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HEDGE_AFTER = 0.2
+# Scheduling slack allowed on top of the expected wait
+SLACK = 0.15
+
+def make_frame():
+    index = pd.date_range('2024-01-01', periods=3, freq='D')
+    return pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0, 'Volume': 0.0}, index=index)
+
+class StubProvider(MarketDataProvider):
+    """Provider answering after delay seconds with data, nothing, or an error"""
+    def __init__(self, name, delay=0.0, result='data', cached=False, capacity=True, futures=True):
+        self.name = name
+        self.futures = futures
+        self.delay = delay
+        self.result = result
+        self.cached = cached
+        self.capacity = capacity
+        self.calls = 0
+        self.released = threading.Event()
+
+    def supports(self, symbol):
+        return self.futures or not symbol.endswith('=F')
+
+    def is_cached(self, symbol, start_date_str, end_date_str):
+        return self.cached
+
+    def has_capacity(self):
+        return self.capacity
+
+    def fetch_history(self, symbol, start_date_str, end_date_str):
+        self.calls += 1
+        # Slow calls end early once the test is done with them
+        self.released.wait(self.delay)
+        if self.result == 'error':
+            raise ConnectionError(f"{self.name} unavailable")
+        if self.result == 'empty':
+            return pd.DataFrame()
+        return make_frame()
+
+def route(providers, **kwargs):
+    """Fetch once through a new router; returns (provider name, elapsed seconds, router)"""
+    router = ProviderRouter(providers, hedge_after=kwargs.pop('hedge_after', HEDGE_AFTER),
+                            timeout=kwargs.pop('timeout', 5.0), **kwargs)
+    started = time.monotonic()
+    df, name = router.fetch_history('AAPL', '2024-01-01', '2024-01-03')
+    elapsed = time.monotonic() - started
+    if name is not None:
+        assert df is not None and not df.empty
+    for provider in providers:
+        provider.released.set()
+    return name, elapsed, router
+
+def test_fast_primary_wins_without_hedging():
+    primary, secondary = StubProvider('primary'), StubProvider('secondary')
+    name, elapsed, _ = route([primary, secondary])
+    assert name == 'primary'
+    assert elapsed < HEDGE_AFTER
+    assert secondary.calls == 0
+
+def test_slow_primary_is_hedged():
+    primary, secondary = StubProvider('primary', delay=5.0), StubProvider('secondary')
+    name, elapsed, _ = route([primary, secondary])
+    assert name == 'secondary'
+    # The secondary starts at hedge_after, not when the primary gives up
+    assert HEDGE_AFTER <= elapsed < HEDGE_AFTER + SLACK, elapsed
+    assert primary.calls == 1
+
+def test_failing_primary_fails_over_immediately():
+    for result in ('error', 'empty'):
+        primary, secondary = StubProvider('primary', result=result), StubProvider('secondary')
+        name, elapsed, router = route([primary, secondary], hedge_after=1.0)
+        assert name == 'secondary', result
+        # No hedge wait when the primary has already failed
+        assert elapsed < SLACK, (result, elapsed)
+        assert router.status()['primary']['success_rate'] < 1.0
+
+def test_all_providers_failing_returns_nothing():
+    providers = [StubProvider('primary', result='error'), StubProvider('secondary', result='empty')]
+    name, elapsed, _ = route(providers)
+    assert name is None
+    assert elapsed < HEDGE_AFTER
+
+def test_provider_out_of_budget_is_skipped():
+    primary, secondary = StubProvider('primary'), StubProvider('secondary')
+    router = ProviderRouter([primary, secondary], budgets={'primary': (1, 60)},
+                            hedge_after=HEDGE_AFTER, timeout=5.0)
+    assert router.fetch_history('AAPL', '2024-01-01', '2024-01-03')[1] == 'primary'
+    started = time.monotonic()
+    assert router.fetch_history('AAPL', '2024-01-01', '2024-01-03')[1] == 'secondary'
+    # Skipping costs no waiting on the exhausted provider
+    assert time.monotonic() - started < SLACK
+    assert primary.calls == 1
+
+def test_provider_without_capacity_is_skipped_unless_cached():
+    primary, secondary = StubProvider('primary', capacity=False), StubProvider('secondary')
+    name, elapsed, _ = route([primary, secondary])
+    assert name == 'secondary'
+    assert elapsed < SLACK
+    assert primary.calls == 0
+
+    # A cached answer makes no upstream call, so capacity and budget don't apply
+    primary, secondary = StubProvider('primary', capacity=False, cached=True), StubProvider('secondary')
+    name, _, _ = route([primary, secondary], budgets={'primary': (0, 60)})
+    assert name == 'primary'
+    assert secondary.calls == 0
+
+def test_unhealthy_provider_cools_down():
+    # Only the primary serves futures, so its failures are not masked by the secondary
+    primary, secondary = StubProvider('primary', result='error'), StubProvider('secondary', futures=False)
+    router = ProviderRouter([primary, secondary], hedge_after=HEDGE_AFTER, timeout=5.0)
+    router.health['primary'].cooldown = 0.3
+    # Failures push the primary's success rate under the threshold
+    while router.health['primary'].is_available():
+        assert router.fetch_history('GC=F', '2024-01-01', '2024-01-03') == (None, None)
+    failures = primary.calls
+
+    # Inside the cooldown the primary is not called at all
+    assert router.status()['primary']['available'] is False
+    assert router.fetch_history('GC=F', '2024-01-01', '2024-01-03') == (None, None)
+    assert router.fetch_history('AAPL', '2024-01-01', '2024-01-03')[1] == 'secondary'
+    assert primary.calls == failures
+
+    # After the cooldown it is probed again and can recover
+    time.sleep(0.3)
+    primary.result = 'data'
+    assert router.fetch_history('GC=F', '2024-01-01', '2024-01-03')[1] == 'primary'
+    assert primary.calls == failures + 1
+    assert router.status()['primary']['available'] is True
+
+def main():
+    """Main function to run the router tests"""
+    tests = [
+        test_fast_primary_wins_without_hedging,
+        test_slow_primary_is_hedged,
+        test_failing_primary_fails_over_immediately,
+        test_all_providers_failing_returns_nothing,
+        test_provider_out_of_budget_is_skipped,
+        test_provider_without_capacity_is_skipped_unless_cached,
+        test_unhealthy_provider_cools_down,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            logger.info(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__}: {e}")
+    return failed == 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
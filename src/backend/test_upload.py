@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Test script for streamed profile image uploads.
+Runs stream_multipart_upload against realistic multi-MB JPEG bodies through
+the Flask test client; no database or running server is needed:
+   python test_upload.py
+or with pytest:
+   python -m pytest test_upload.py
+"""
+
+import io
+import os
+import sys
+import hashlib
+import logging
+import tempfile
+from flask import Flask, request, jsonify
+from image_pipeline import (stream_multipart_upload, UploadRejected, PIL_AVAILABLE, IMAGE_MAX_PIXELS,
+                            THUMBNAIL_SIZES, thumbnail_name, resolve_stored_file, process_image)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 5 * 1024 * 1024
+
+def make_jpeg(size):
+    """JPEG of roughly size bytes whose body is incompressible, like a real photo"""
+    if PIL_AVAILABLE:
+        from PIL import Image
+        # Noise compresses badly, so a modest resolution already gives several MB
+        edge = int((size / 1.5) ** 0.5)
+        while True:
+            image = Image.frombytes('RGB', (edge, edge), os.urandom(edge * edge * 3))
+            out = io.BytesIO()
+            image.save(out, format='JPEG', quality=95)
+            if out.tell() >= size:
+                return out.getvalue()
+            edge = int(edge * (size / out.tell()) ** 0.5) + 1
+    # JFIF header, random entropy-coded data, end of image marker
+    header = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    return header + os.urandom(size - len(header) - 2) + b'\xff\xd9'
+
+def make_app(folder):
+    app = Flask(__name__)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        try:
+            digest, stored_name, ext, created = stream_multipart_upload(request, 'profileImage', folder, MAX_BYTES)
+        except UploadRejected as e:
+            return jsonify({'message': str(e)}), e.status
+        return jsonify({'digest': digest, 'filename': stored_name, 'ext': ext, 'created': created})
+
+    return app
+
+def post_image(client, data, extra_fields=None):
+    form = dict(extra_fields or {})
+    form['profileImage'] = (io.BytesIO(data), 'photo.jpg', 'image/jpeg')
+    return client.post('/upload', data=form, content_type='multipart/form-data')
+
+def test_realistic_jpegs_are_accepted():
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        for size in (200 * 1024, 500 * 1024, 1024 * 1024, 3 * 1024 * 1024, 4 * 1024 * 1024):
+            for _ in range(3):
+                data = make_jpeg(size)
+                response = post_image(client, data, {'caption': 'x' * 1000})
+                assert response.status_code == 200, (len(data), response.get_json())
+                result = response.get_json()
+                with open(os.path.join(folder, result['filename']), 'rb') as f:
+                    stored = f.read()
+                # The name is the hash of the stored bytes, which are the upload
+                # itself unless Pillow re-encoded it without metadata
+                assert hashlib.sha256(stored).hexdigest() == result['digest']
+                if not PIL_AVAILABLE:
+                    assert stored == data
+
+def test_metadata_is_stripped_before_naming():
+    if not PIL_AVAILABLE:
+        logger.info("Pillow not installed, skipping metadata check")
+        return
+    from PIL import Image
+    image = Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'  # Make
+    out = io.BytesIO()
+    image.save(out, format='JPEG', exif=exif)
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        response = post_image(client, out.getvalue())
+        assert response.status_code == 200
+        with Image.open(os.path.join(folder, response.get_json()['filename'])) as stored:
+            assert not stored.getexif()
+
+def test_oversized_upload_is_rejected():
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        response = post_image(client, make_jpeg(MAX_BYTES + 256 * 1024))
+        assert response.status_code == 413
+        # Nothing is left behind from the abandoned upload
+        assert os.listdir(folder) == []
+
+def test_non_image_is_rejected():
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        response = post_image(client, b'%PDF-1.7' + os.urandom(300 * 1024))
+        assert response.status_code == 415
+
+def test_large_form_fields_are_rejected():
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        response = post_image(client, make_jpeg(100 * 1024), {'caption': 'x' * (128 * 1024)})
+        assert response.status_code == 413
+
+def test_unconfigured_thumbnail_size_is_unknown():
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        response = post_image(client, make_jpeg(100 * 1024))
+        assert response.status_code == 200
+        digest = response.get_json()['digest']
+        unused = max(THUMBNAIL_SIZES) + 1
+        # Only configured sizes fall back to the original (and queue thumbnail work)
+        assert resolve_stored_file(folder, thumbnail_name(digest, unused)) == (None, False)
+        assert resolve_stored_file(folder, thumbnail_name(digest, THUMBNAIL_SIZES[0]))[0] == response.get_json()['filename']
+
+def test_existing_thumbnails_skip_decoding():
+    if not PIL_AVAILABLE:
+        logger.info("Pillow not installed, skipping thumbnail check")
+        return
+    from PIL import Image
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        result = post_image(client, make_jpeg(100 * 1024)).get_json()
+        process_image(folder, result['digest'], result['ext'])
+        for size in THUMBNAIL_SIZES:
+            assert os.path.exists(os.path.join(folder, thumbnail_name(result['digest'], size)))
+        # With every thumbnail present the original is never opened
+        opened = []
+        original_open = Image.open
+        Image.open = lambda *args, **kwargs: opened.append(args) or original_open(*args, **kwargs)
+        try:
+            process_image(folder, result['digest'], result['ext'])
+        finally:
+            Image.open = original_open
+        assert opened == []
+
+def test_decompression_bomb_is_rejected():
+    if not PIL_AVAILABLE:
+        logger.info("Pillow not installed, skipping pixel limit check")
+        return
+    from PIL import Image
+    # A blank image just over the pixel limit compresses to a few hundred KB
+    edge = int(IMAGE_MAX_PIXELS ** 0.5) + 1
+    out = io.BytesIO()
+    Image.new('1', (edge, edge)).save(out, format='PNG', optimize=True)
+    assert out.tell() < MAX_BYTES
+    with tempfile.TemporaryDirectory() as folder:
+        client = make_app(folder).test_client()
+        form = {'profileImage': (io.BytesIO(out.getvalue()), 'bomb.png', 'image/png')}
+        response = client.post('/upload', data=form, content_type='multipart/form-data')
+        assert response.status_code == 413
+        assert os.listdir(folder) == []
+
+def main():
+    """Main function to run the upload tests"""
+    tests = [
+        test_realistic_jpegs_are_accepted,
+        test_metadata_is_stripped_before_naming,
+        test_oversized_upload_is_rejected,
+        test_non_image_is_rejected,
+        test_large_form_fields_are_rejected,
+        test_unconfigured_thumbnail_size_is_unknown,
+        test_existing_thumbnails_skip_decoding,
+        test_decompression_bomb_is_rejected,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            logger.info(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__}: {e}")
+    return failed == 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -1,10 +1,11 @@
 # upload_profile_image.py
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, url_for, abort
 import os
-import uuid
-from werkzeug.utils import secure_filename
-from auth import token_required
+from auth import token_required, invalidate_principal
 from db_connection import db_manager
+from werkzeug.exceptions import RequestEntityTooLarge
+from static_delivery import send_upload
+from image_pipeline import stream_multipart_upload, UploadRejected, avatar_name, image_worker, resolve_stored_file
 
 upload_bp = Blueprint('upload', __name__, url_prefix='/api/settings')
 
@@ -12,95 +13,89 @@ upload_bp = Blueprint('upload', __name__, url_prefix='/api/settings')
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'public', 'uploads', 'profile-images')
 # Create directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Largest accepted image; the body is abandoned as soon as it goes past this
+PROFILE_IMAGE_MAX_BYTES = int(os.environ.get('PROFILE_IMAGE_MAX_BYTES', 5 * 1024 * 1024))
 
 @upload_bp.route('/upload-profile-image', methods=['POST'])
 @token_required
 def upload_profile_image(current_user):
     """Upload a profile image for the current user"""
-    if 'profileImage' not in request.files:
+    user_id = current_user.user_id
+    
+    # Stream the profileImage part to disk, checking size and magic bytes as it arrives.
+    # request.files is never touched, so werkzeug does not buffer the body.
+    try:
+        digest, stored_name, ext, created = stream_multipart_upload(
+            request, 'profileImage', UPLOAD_FOLDER, PROFILE_IMAGE_MAX_BYTES
+        )
+    except UploadRejected as e:
         return jsonify({
             'status': 'error',
-            'message': 'No file part'
-        }), 400
-    
-    file = request.files['profileImage']
-    # If user does not select file, browser also
-    # submit an empty part without filename
-    if file.filename == '':
+            'message': str(e)
+        }), e.status
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error saving file: {e}")
         return jsonify({
             'status': 'error',
-            'message': 'No selected file'
-        }), 400
+            'message': 'Failed to save file'
+        }), 500
     
-    if file and allowed_file(file.filename):
-        # Get user_id from the tuple
-        user_id = current_user[0]
-        
-        # Create a unique filename to prevent conflicts
-        original_filename = secure_filename(file.filename)
-        filename = f"user_{user_id}_{uuid.uuid4()}_{original_filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        # Save the file
-        try:
-            file.save(file_path)
-        except Exception as e:
-            current_app.logger.error(f"Error saving file: {e}")
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to save file'
-            }), 500
+    # Metadata was stripped before the file was named; thumbnails happen in the background
+    if created:
+        image_worker.submit(UPLOAD_FOLDER, digest, ext)
+    
+    # Generate URL for the image (the avatar thumbnail when thumbnails are enabled)
+    image_url = url_for('upload.uploaded_file', filename=avatar_name(digest, ext), _external=True)
+    
+    # Update user profile in database
+    conn = None
+    cursor = None
+    try:
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
         
-        # Generate URL for the image
-        host = request.host_url.rstrip('/')
-        relative_path = f"/uploads/profile-images/{filename}"
-        image_url = f"{host}{relative_path}"
+        # Update the profile_image field
+        cursor.execute("UPDATE login SET profile_image = %s WHERE user_id = %s", 
+                     (image_url, user_id))
+        conn.commit()
+        invalidate_principal(user_id)
         
-        # Update user profile in database
-        conn = None
-        cursor = None
-        try:
-            conn = db_manager.get_connection()
-            cursor = conn.cursor()
-            
-            # Update the profile_image field
-            cursor.execute("UPDATE login SET profile_image = %s WHERE user_id = %s", 
-                         (image_url, user_id))
-            conn.commit()
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Profile image uploaded successfully',
-                'profile_image': image_url
-            })
-        except Exception as e:
-            current_app.logger.error(f"Error updating profile image in database: {e}")
-            if conn:
-                conn.rollback()
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to update profile image in database'
-            }), 500
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                db_manager.release_connection(conn)
-    else:
+        return jsonify({
+            'status': 'success',
+            'message': 'Profile image uploaded successfully',
+            'profile_image': image_url
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error updating profile image in database: {e}")
+        if conn:
+            conn.rollback()
         return jsonify({
             'status': 'error',
-            'message': 'File type not allowed'
-        }), 400
+            'message': 'Failed to update profile image in database'
+        }), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            db_manager.release_connection(conn)
 
-# Add a function to serve files from the upload folder if needed
+# Serve stored images; content-hashed names never change, so they are cached for a year.
+# Validators, Range requests and sendfile/X-Accel-Redirect are handled by static_delivery.
 @upload_bp.route('/uploads/profile-images/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    stored_name, immutable = resolve_stored_file(UPLOAD_FOLDER, filename)
+    if stored_name is None:
+        abort(404)
+    
+    # A thumbnail not generated yet is answered with its original and a short max-age.
+    # Queue it again in case the job was lost with a restarted or different worker.
+    if stored_name != filename:
+        digest, ext = stored_name.split('.')
+        image_worker.submit(UPLOAD_FOLDER, digest, ext)
+    return send_upload(UPLOAD_FOLDER, stored_name, etag=stored_name.split('.')[0], immutable=immutable,
+                       accel_path=f"profile-images/{stored_name}")
 
 # Function to register the blueprint with the Flask app
 def register_upload_routes(app):
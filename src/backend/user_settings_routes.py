@@ -1,28 +1,21 @@
 # user_settings_routes.py
 from flask import Blueprint, request, jsonify, current_app
 import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, check_password, HashingBusyError, busy_response
 from functools import wraps
 from db_connection import db_manager
-from auth import token_required
+from auth import token_required, invalidate_principal, fetch_password_hash
+import logging
 
 settings_bp = Blueprint('settings', __name__, url_prefix='/api/settings')
+logger = logging.getLogger(__name__)
 
 @settings_bp.route('/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
     """Get the current user's profile information"""
     try:
-        # Convert current_user tuple to dictionary
-        user_data = {
-            'user_id': current_user[0],
-            'username': current_user[1],
-            'email': current_user[2],
-            'role': current_user[4],
-            'account_status': current_user[6],
-            'last_login': current_user[5].isoformat() if current_user[5] else None,
-            'created_at': current_user[7].isoformat() if current_user[7] else None
-        }
+        user_data = current_user.to_dict()
         
         return jsonify({
             'status': 'success',
@@ -40,13 +33,13 @@ def get_profile(current_user):
 def update_email(current_user):
     """Update the user's email address"""
     data = request.get_json()
-    print(f"Received email update request: {data}")  # Debug log
+    logger.debug("Received email update request for user_id %s", current_user.user_id)
     
     new_email = data.get('email')
     password = data.get('password')
     
     if not new_email or not password:
-        print(f"Missing required fields: email={bool(new_email)}, password={bool(password)}")
+        logger.debug("Missing required fields: email=%s, password=%s", bool(new_email), bool(password))
         return jsonify({
             'status': 'error',
             'message': 'Email and password are required'
@@ -55,59 +48,58 @@ def update_email(current_user):
     conn = None
     cursor = None
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        # Get user_id from the tuple
-        user_id = current_user[0]
+        user_id = current_user.user_id
         
-        # Verify current password
-        print(f"Verifying password for user_id: {user_id}")
-        cursor.execute("SELECT pass FROM login WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
+        # Verify current password without holding a pool connection
+        logger.debug("Verifying password for user_id %s", user_id)
+        stored_hash = fetch_password_hash(user_id)
         
-        if not user:
-            print(f"User not found with ID: {user_id}")
+        if not stored_hash:
+            logger.debug("User not found with ID %s", user_id)
             return jsonify({
                 'status': 'error', 
                 'message': 'User not found'
             }), 404
-            
-        print(f"Stored password hash: {user[0][:20]}...") # Access first element of tuple
         
-        if not check_password_hash(user[0], password): # Access first element of tuple
-            print(f"Password verification failed for user: {user_id}")
+        if not check_password(stored_hash, password):
+            logger.debug("Password verification failed for user_id %s", user_id)
             return jsonify({
                 'status': 'error',
                 'message': 'Current password is incorrect'
             }), 401
         
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
         # Password verified, check if email is already in use
-        print(f"Checking if email {new_email} is already in use")
+        logger.debug("Checking if the new email is already in use")
         cursor.execute("SELECT user_id FROM login WHERE email = %s AND user_id != %s", 
                       (new_email, user_id))
         existing_user = cursor.fetchone()
         
         if existing_user:
-            print(f"Email {new_email} is already in use by user_id: {existing_user[0]}")
+            logger.debug("Email is already in use by user_id %s", existing_user[0])
             return jsonify({
                 'status': 'error',
                 'message': 'Email is already in use'
             }), 400
         
         # Update email
-        print(f"Updating email to {new_email} for user_id: {user_id}")
+        logger.debug("Updating email for user_id %s", user_id)
         cursor.execute("UPDATE login SET email = %s WHERE user_id = %s", 
                       (new_email, user_id))
         conn.commit()
-        print(f"Email update successful")
+        invalidate_principal(user_id)
+        logger.debug("Email update successful for user_id %s", user_id)
         
         return jsonify({
             'status': 'success',
             'message': 'Email updated successfully'
         })
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"Error updating email: {e}")
+        logger.error(f"Error updating email: {e}")
         if conn:
             try:
                 conn.rollback()
@@ -148,42 +140,44 @@ def update_password(current_user):
     conn = None
     cursor = None
     try:
-        user_id = current_user[0]  # Get user_id from tuple
+        user_id = current_user.user_id
         print(f"Processing password update for user_id: {user_id}")
         
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        # Verify current password and hash the new one without holding a pool connection
+        stored_hash = fetch_password_hash(user_id)
         
-        # Verify current password
-        cursor.execute("SELECT pass FROM login WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user:
+        if not stored_hash:
             print(f"User not found with ID: {user_id}")
             return jsonify({
                 'status': 'error',
                 'message': 'User not found'
             }), 404
             
-        if not check_password_hash(user[0], current_password):
+        if not check_password(stored_hash, current_password):
             print(f"Password verification failed for user: {user_id}")
             return jsonify({
                 'status': 'error',
                 'message': 'Current password is incorrect'
             }), 401
         
-        # Hash and update new password
+        hashed_password = hash_password(new_password)
+        
+        # Update new password
         print(f"Updating password for user_id: {user_id}")
-        hashed_password = generate_password_hash(new_password)
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
         cursor.execute("UPDATE login SET pass = %s WHERE user_id = %s", 
                       (hashed_password, user_id))
         conn.commit()
+        invalidate_principal(user_id)
         print(f"Password update successful for user_id: {user_id}")
         
         return jsonify({
             'status': 'success',
             'message': 'Password updated successfully'
         })
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"Error updating password: {e}")
         if conn:
@@ -219,21 +213,20 @@ def delete_account(current_user):
     conn = None
     cursor = None
     try:
-        user_id = current_user[0]  # Get user_id from tuple
-        
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        user_id = current_user.user_id
         
-        # Verify password
-        cursor.execute("SELECT pass FROM login WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
+        # Verify password without holding a pool connection
+        stored_hash = fetch_password_hash(user_id)
         
-        if not user or not check_password_hash(user[0], password):
+        if not stored_hash or not check_password(stored_hash, password):
             return jsonify({
                 'status': 'error',
                 'message': 'Password is incorrect'
             }), 401
         
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
         # Begin transaction to delete all user data
         conn.start_transaction()
         
@@ -250,11 +243,14 @@ def delete_account(current_user):
         cursor.execute("DELETE FROM login WHERE user_id = %s", (user_id,))
         
         conn.commit()
+        invalidate_principal(user_id)
         
         return jsonify({
             'status': 'success',
             'message': 'Account deleted successfully'
         })
+    except HashingBusyError as e:
+        return busy_response(e)
     except Exception as e:
         if conn:
             try:
@@ -0,0 +1,30 @@
+-- Rollups behind GET /api/admin/summary, refreshed by the background job in
+-- admin_rollups.py. Trend breadth comes from market_trend_breadth, which
+-- store_market_data already keeps current.
+CREATE TABLE IF NOT EXISTS admin_user_counts (
+  account_status VARCHAR(10) NOT NULL,
+  role VARCHAR(20) NOT NULL,
+  users INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (account_status, role)
+);
+
+CREATE TABLE IF NOT EXISTS admin_signups_daily (
+  day DATE PRIMARY KEY,
+  signups INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS admin_favorite_counts (
+  symbol VARCHAR(20) NOT NULL,
+  pair_name VARCHAR(50) NOT NULL,
+  favorites INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (symbol, pair_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_admin_favorite_counts_favorites
+  ON admin_favorite_counts(favorites DESC);
+
+-- When each rollup was last rebuilt
+CREATE TABLE IF NOT EXISTS admin_rollup_state (
+  name VARCHAR(50) PRIMARY KEY,
+  refreshed_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,33 @@
+-- Outbound email queue written by request handlers and drained by the
+-- background sender in email_outbox.py. Rows stay after delivery for auditing;
+-- delete old 'sent' rows periodically if the table grows.
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  to_email VARCHAR(255) NOT NULL,
+  from_email VARCHAR(255),
+  subject VARCHAR(255) NOT NULL,
+  html_body TEXT,
+  text_body TEXT,
+  status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending, sending, sent, failed
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  claimed_at TIMESTAMP,
+  last_error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  sent_at TIMESTAMP
+);
+
+-- Only undelivered rows are scanned by the sender
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+  ON email_outbox(next_attempt_at)
+  WHERE status IN ('pending', 'sending');
+
+-- Reset tokens used by password_reset_routes
+CREATE TABLE IF NOT EXISTS password_reset_tokens (
+  id SERIAL PRIMARY KEY,
+  user_id INTEGER NOT NULL REFERENCES login(user_id),
+  token VARCHAR(100) NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  expires_at TIMESTAMP NOT NULL,
+  used BOOLEAN NOT NULL DEFAULT FALSE
+);
@@ -0,0 +1,30 @@
+-- Indexes for the paginated admin user listing (GET /api/admin/users).
+-- Substring search on username/email uses trigram GIN indexes.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_login_username_trgm
+  ON login USING gin (username gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_login_email_trgm
+  ON login USING gin (email gin_trgm_ops);
+
+-- Keyset pagination orders by (sort expression, user_id). The created_at index
+-- also serves the signup range scans in admin_analytics.py and admin_rollups.py,
+-- so the single-column index it replaces is dropped.
+CREATE INDEX IF NOT EXISTS idx_login_created_at_user_id
+  ON login(created_at, user_id);
+
+DROP INDEX IF EXISTS idx_login_created_at;
+
+CREATE INDEX IF NOT EXISTS idx_login_last_login_user_id
+  ON login((COALESCE(last_login, TIMESTAMP '1970-01-01')), user_id);
+
+CREATE INDEX IF NOT EXISTS idx_login_username_user_id
+  ON login(username, user_id);
+
+CREATE INDEX IF NOT EXISTS idx_login_email_user_id
+  ON login(email, user_id);
+
+-- Status/role filters combined with the default user_id order
+CREATE INDEX IF NOT EXISTS idx_login_status_role_user_id
+  ON login(account_status, role, user_id);
@@ -0,0 +1,23 @@
+-- Trend breadth aggregate maintained by store_market_data on every trend change.
+-- One row per asset class ('forex', 'index', 'stock') plus an 'all' total.
+-- The first /api/market-trends request after deployment fills it from market_data.
+CREATE TABLE IF NOT EXISTS market_trend_breadth (
+  asset_class VARCHAR(20) PRIMARY KEY,
+  bullish_count INTEGER NOT NULL DEFAULT 0,
+  bearish_count INTEGER NOT NULL DEFAULT 0,
+  neutral_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Hourly snapshots of the aggregate, written whenever breadth changes
+CREATE TABLE IF NOT EXISTS market_trend_breadth_history (
+  bucket TIMESTAMP NOT NULL,
+  asset_class VARCHAR(20) NOT NULL,
+  bullish_count INTEGER NOT NULL DEFAULT 0,
+  bearish_count INTEGER NOT NULL DEFAULT 0,
+  neutral_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (bucket, asset_class)
+);
+
+CREATE INDEX IF NOT EXISTS idx_trend_breadth_history_class_bucket
+  ON market_trend_breadth_history(asset_class, bucket);
@@ -0,0 +1,10 @@
+-- Unique key on price_history used by the ON CONFLICT (symbol, timestamp) upserts
+-- in store_price_data. Remove duplicate bars first, keeping the newest row.
+DELETE FROM price_history a
+USING price_history b
+WHERE a.symbol = b.symbol
+  AND a.timestamp = b.timestamp
+  AND a.price_id < b.price_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_price_history_symbol_timestamp
+  ON price_history(symbol, timestamp);